@@ -0,0 +1,47 @@
+""" Benchmark for the rule argument access in sly.
+    Symbol names like p.expression are properties of a YaccProduction class made for each
+    production. We parse the same cpl program with those classes and with the plain
+    YaccProduction, where every p.name goes through __getattr__ and the name map
+"""
+
+import common  # sets up the path
+from sly.yacc import YaccProduction, YaccSymbol
+
+
+def main(statements=2000, rounds=5):
+    from cpq_lexer import CpqLexer
+    from cpq_parser import CpqParser
+    from symbol_table import SymbolTable
+
+    tokens = list(CpqLexer(SymbolTable()).tokenize(common.generate_cpl(statements)))
+    productions = CpqParser._grammar.Productions
+    accessors = [p.accessor for p in productions]
+
+    def run():
+        parser = CpqParser(SymbolTable())
+        # the lexer normally adds the variables to the symbol table
+        for name in ("a", "b", "c"):
+            parser.symbol_table.add_variable(name)
+        parser.parse(iter(tokens))
+
+    print(f"cpl parse of {len(tokens)} tokens")
+    for label, classes in (("__getattr__", [YaccProduction] * len(productions)), ("properties", accessors)):
+        for p, cls in zip(productions, classes):
+            p.accessor = cls
+        elapsed = common.best_time(run, 1, rounds)
+        print(f"  {label:<12s} {elapsed * 1000:8.2f} ms  {len(tokens) / elapsed:10.0f} tokens/s")
+
+    # a single p.expression access on the production 'boolfactor -> expression RELOP expression'
+    p = next(p for p in productions if p.name == "boolfactor" and p.len == 3)
+    symbols = [YaccSymbol() for _ in range(3)]
+    for sym in symbols:
+        sym.value = 1
+    print("p.expression0 access")
+    for label, cls in (("__getattr__", YaccProduction), ("properties", p.accessor)):
+        pslice = cls(symbols, None, p.namemap)
+        elapsed = common.best_time(lambda: [pslice.expression0 for _ in range(100000)], 1, rounds)
+        print(f"  {label:<12s} {elapsed * 1e4:8.1f} ns per access")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+""" Benchmark for the C backend (c_backend.py).
+    We compile the loop heavy cpl program of bench_quad into an executable with the system's C compiler,
+    and compare the time it runs with the time of the transpiled Python function on the same input. The
+    executable's time includes starting its process. We also time compiling the C program
+"""
+
+import io
+import os
+import subprocess
+import tempfile
+import time
+
+import common  # sets up the path
+from bench_quad import LOOPS_PROGRAM
+from c_backend import c_compiler, compile_c, generate_c
+from compiler import Compiler
+from quad import load_quad
+from quad_transpiler import TranspiledQuadMachine, transpile
+
+
+def run_transpiled(transpiled, stdin):
+    machine = TranspiledQuadMachine(transpiled, io.StringIO(stdin), io.StringIO())
+    start = time.perf_counter()
+    machine.run()
+    return time.perf_counter() - start, machine.stdout.getvalue()
+
+
+def run_executable(executable, stdin):
+    start = time.perf_counter()
+    result = subprocess.run([executable], input=stdin, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def main(outer=1000, rounds=5):
+    if c_compiler() is None:
+        print("no C compiler, skipping")
+        return
+    program = load_quad(Compiler().compile(LOOPS_PROGRAM))
+    transpiled = transpile(program)
+    with tempfile.TemporaryDirectory() as directory:
+        c_filename = os.path.join(directory, "loops.c")
+        executable = os.path.join(directory, "loops")
+        with open(c_filename, "w") as file:
+            file.write(generate_c(program, "loops.qud"))
+        start = time.perf_counter()
+        errors = compile_c(c_filename, executable)
+        print(f"compile C: {(time.perf_counter() - start) * 1000:8.2f} ms")
+        assert errors is None, errors
+
+        for n in (outer, outer * 100):
+            times = {"transpiled": [], "C": []}
+            for _ in range(rounds):
+                elapsed, output = run_transpiled(transpiled, str(n))
+                times["transpiled"].append(elapsed)
+                elapsed, c_output = run_executable(executable, str(n))
+                times["C"].append(elapsed)
+                assert output == c_output
+                if n > outer:
+                    # the transpiled function runs the large input only once
+                    break
+            print(f"loops {n}: output {output.split()}")
+            for name, elapsed in times.items():
+                print(f"  {name:10} {min(elapsed) * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
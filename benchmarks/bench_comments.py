@@ -0,0 +1,63 @@
+""" Benchmark for skipping comments and strings in CpqLexer.
+    The COMMENT token function finds the end of a comment or a string with str.find, where it used to
+    be matched with lazy regular expressions. We lex programs with long comments, a program with long
+    strings that are followed by a backslash (an error at every one of them) and a large program in
+    an unterminated comment, at two sizes to see that the time grows linearly, with CpqLexer and a copy
+    of it with the old regular expressions
+"""
+
+import common  # sets up the path
+import cpq_lexer
+import utils
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+# the CpqLexer with the comments and strings matched by regular expressions, like before
+class RegexLexer(CpqLexer):
+    tokens = CpqLexer.tokens
+    ignore_comment = r"(\"[^\"]*\"(?!\\))|(//[^\n]*$|/(?!\\)\*[\s\S]*?\*(?!\\)/)"
+    del COMMENT
+
+    @_(r"/\*[\s\S]*|\"[^\"]*\Z")
+    def UNTERMINATED_COMMENT(self, t):
+        utils.error_print(f"Error in lexical analysis on line {t.lineno}: Unterminated comment")
+        self.errors_detected = True
+
+
+def long_comments(statements):
+    comment = "    /* " + "a long comment " * 20 + "\n" + "and its second line " * 20 + "*/"
+    lines = common.generate_cpl(statements).split("\n")
+    for n in range(len(lines) - 2, 4, -2):
+        lines.insert(n, comment)
+    return "\n".join(lines)
+
+
+def backslash_strings(statements):
+    return "{\n" + ('    "' + "x" * 200 + '"\\ a = 1;\n') * statements + "}\n"
+
+
+def unterminated(statements):
+    return common.generate_cpl(statements).replace("*/", "", 1)
+
+
+def main(statements=2000, rounds=5):
+    # the error messages of the malformed programs aren't part of the benchmark
+    utils.error_print = cpq_lexer.error_print = lambda *args: None
+    lexers = [("find", CpqLexer), ("regex", RegexLexer)]
+    for name, make_text in [("long comments", long_comments), ("strings + backslash", backslash_strings),
+                            ("unterminated", unterminated)]:
+        for size in (statements, statements * 4):
+            text = make_text(size)
+            times = {}
+            # the rounds of the lexers are interleaved, so that a slower period of the machine affects both
+            for _ in range(rounds):
+                for lexer_name, lexer_class in lexers:
+                    elapsed = common.best_time(lambda: list(lexer_class(SymbolTable()).tokenize(text)), 1, 1)
+                    times[lexer_name] = min(times.get(lexer_name, elapsed), elapsed)
+            print(f"  {name:<20s} {len(text):9d} chars  " +
+                  "  ".join(f"{lexer_name} {times[lexer_name] * 1000:8.2f} ms" for lexer_name, _ in lexers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+""" Benchmark for sly's DFA lexer engine (regex_module = sly.dfa).
+    We lex the generated cpl program with re and with the DFA, and then time a rule that
+    makes re backtrack, r'(x|xx)*y', on growing runs of 'x' that don't end with 'y'
+"""
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from sly import Lexer, dfa
+from symbol_table import SymbolTable
+
+
+class DFACpqLexer(CpqLexer):
+    tokens = CpqLexer.tokens
+    regex_module = dfa
+
+
+class BacktrackLexer(Lexer):
+    tokens = {REPEAT, X}
+    REPEAT = r"(x|xx)*y"
+    X = r"x"
+
+
+class DFABacktrackLexer(BacktrackLexer):
+    tokens = BacktrackLexer.tokens
+    regex_module = dfa
+
+
+def cpl(statements=2000, rounds=9):
+    text = common.generate_cpl(statements)
+    count = sum(1 for _ in CpqLexer(SymbolTable()).tokenize(text))
+    print(f"cpl lexing of {count} tokens, rules in the DFA: {len(DFACpqLexer._master_re.dfa_rules)}, "
+          f"left to re: {DFACpqLexer._master_re.re_rules}")
+    best = {}
+    # interleaved, so that a slow period of the machine hits both
+    for _ in range(rounds):
+        for label, lexer_class in (("re", CpqLexer), ("dfa", DFACpqLexer)):
+            elapsed = common.best_time(lambda: list(lexer_class(SymbolTable()).tokenize(text)), 1, 1)
+            best[label] = min(best.get(label, elapsed), elapsed)
+    for label, elapsed in best.items():
+        print(f"  {label:<4s} {elapsed * 1000:8.2f} ms  {count / elapsed:10.0f} tokens/s")
+
+
+def backtracking(sizes=(16, 20, 24), rounds=3):
+    print("r'(x|xx)*y' on 'x' * n")
+    for n in sizes:
+        text = "x" * n
+        times = []
+        for lexer_class in (BacktrackLexer, DFABacktrackLexer):
+            times.append(common.best_time(lambda: list(lexer_class().tokenize(text)), 1, rounds))
+        print(f"  n={n:<4d} re {times[0] * 1000:10.2f} ms   dfa {times[1] * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    cpl()
+    backtracking()
@@ -0,0 +1,56 @@
+""" Benchmark comparing sly's generic parse loop with the parse function generated for a grammar
+    (Parser.generate_parse). We parse a large cpl program and a long calc assignment with both,
+    with and without position tracking, and print the tokens per second
+"""
+
+import common  # sets up the path
+
+
+def cpl_run(statements):
+    from cpq_lexer import CpqLexer
+    from cpq_parser import CpqParser
+    from symbol_table import SymbolTable
+
+    tokens = list(CpqLexer(SymbolTable()).tokenize(common.generate_cpl(statements)))
+
+    def run(generate, track):
+        parser = CpqParser(SymbolTable())
+        parser.generate_parse = generate
+        parser.track_positions = track
+        # the lexer normally adds the variables to the symbol table
+        for name in ("a", "b", "c"):
+            parser.symbol_table.add_variable(name)
+        parser.parse(iter(tokens))
+
+    return tokens, run
+
+
+def calc_run(terms):
+    module = common.load_example("calc", common.EXAMPLE_GRAMMARS[0][1])
+    parts = ["x = 1"]
+    for n in range(terms):
+        parts.append(("+ (2 * 3 - 4)", "- -5", "* (7 - a)", "+ 9 / 3")[n % 4])
+    tokens = list(module.CalcLexer().tokenize(" ".join(parts)))
+
+    def run(generate, track):
+        parser = module.CalcParser()
+        parser.generate_parse = generate
+        parser.track_positions = track
+        parser.names["a"] = 6
+        parser.parse(iter(tokens))
+
+    return tokens, run
+
+
+def main(statements=2000, terms=5000, rounds=5):
+    for name, (tokens, run) in (("cpl", cpl_run(statements)), ("calc", calc_run(terms))):
+        print(f"{name} parse of {len(tokens)} tokens")
+        for track in (True, False):
+            for generate in (False, True):
+                elapsed = common.best_time(lambda: run(generate, track), 1, rounds)
+                label = ("generated" if generate else "generic") + (" +positions" if track else "")
+                print(f"  {label:<22s} {elapsed * 1000:8.2f} ms  {len(tokens) / elapsed:10.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
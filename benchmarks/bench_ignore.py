@@ -0,0 +1,37 @@
+""" Benchmark for skipping the ignored characters in sly's Lexer.tokenize.
+    After an ignored character, a longer run of ignored characters (such as indentation) is skipped
+    with one match of a precompiled pattern instead of one character per loop iteration.
+    We lex the generated cpl program with 0 to 32 more spaces or 4 tabs in front of its lines, and print
+    the time and the time per added character of indentation
+"""
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+def indented(text, indent):
+    return "\n".join(indent + line for line in text.split("\n"))
+
+
+def main(statements=5000, rounds=25):
+    text = common.generate_cpl(statements)
+    texts = [(f"+{n} spaces", indented(text, " " * n)) for n in (0, 4, 8, 16, 32)]
+    texts.append(("+4 tabs", indented(text, "\t" * 4)))
+    lex = lambda text: sum(1 for _ in CpqLexer(SymbolTable()).tokenize(text))
+    times = {name: None for name, _ in texts}
+    # the rounds of the texts are interleaved, so that a slower period of the machine affects all of them
+    for _ in range(rounds):
+        for name, text in texts:
+            elapsed = common.best_time(lambda: lex(text), 1, 1)
+            if times[name] is None or elapsed < times[name]:
+                times[name] = elapsed
+    base = times["+0 spaces"]
+    for name, text in texts:
+        extra = len(text) - len(texts[0][1])
+        per_char = (times[name] - base) / extra * 1e9 if extra else 0.0
+        print(f"  {name:<10s} {len(text):9d} chars  {times[name] * 1000:8.2f} ms  {per_char:6.1f} ns per indent char")
+
+
+if __name__ == "__main__":
+    main()
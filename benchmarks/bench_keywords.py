@@ -0,0 +1,60 @@
+""" Benchmark for keyword recognition in the cpl lexer.
+    CpqLexer matches keywords as an ID and remaps them by value. Here we compare it with a lexer
+    that has a regex alternative for every keyword before the other tokens (the way CpqLexer
+    used to work), on an identifier heavy program and on the generated benchmark program
+"""
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+# the old lexer, every keyword is its own alternative in the master regex
+class KeywordPatternLexer(CpqLexer):
+    tokens = CpqLexer.tokens
+
+    BREAK = before(LBRACES, r"break")
+    CASE = before(LBRACES, r"case")
+    DEFAULT = before(LBRACES, r"default")
+    ELSE = before(LBRACES, r"else")
+    FLOAT = before(LBRACES, r"float")
+    IF = before(LBRACES, r"if")
+    INPUT = before(LBRACES, r"input")
+    INT = before(LBRACES, r"int")
+    OUTPUT = before(LBRACES, r"output")
+    SWITCH = before(LBRACES, r"switch")
+    WHILE = before(LBRACES, r"while")
+
+
+# and ID is not remapped
+KeywordPatternLexer._remapping = {}
+
+
+# builds a program that is mostly long identifiers
+def identifier_program(statements=2000):
+    names = [f"{prefix}Value{n}" for prefix in ("total", "index", "count", "width", "height") for n in range(20)]
+    lines = [", ".join(names) + ": float;", "{"]
+    for n in range(statements):
+        target, left, right = names[n % 100], names[(n * 7) % 100], names[(n * 13) % 100]
+        lines.append(f"    {target} = {left} * {right} + {names[(n * 3) % 100]} / {names[(n * 11) % 100]};")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def main(statements=2000, rounds=9):
+    lexers = (("keyword patterns", KeywordPatternLexer), ("remapped ID", CpqLexer))
+    for name, text in (("identifiers", identifier_program(statements)), ("generated", common.generate_cpl(statements))):
+        count = sum(1 for _ in CpqLexer(SymbolTable()).tokenize(text))
+        print(f"{name} program, {len(text)} characters, {count} tokens")
+        # the rounds of both lexers are interleaved, so that a slow period of the machine hits both
+        best = {}
+        for _ in range(rounds):
+            for label, lexer_class in lexers:
+                elapsed = common.best_time(lambda: list(lexer_class(SymbolTable()).tokenize(text)), 1, 1)
+                best[label] = min(best.get(label, elapsed), elapsed)
+        for label, _ in lexers:
+            print(f"  {label:<17s} {best[label] * 1000:8.2f} ms  {count / best[label]:10.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+""" Benchmark for the lazy line numbers of sly's Lexer (lazy_lineno).
+    CpqLexer ignores the newlines like spaces and sly computes the line number of a token from its
+    index with a newline index of the text, only when it's read. We lex the generated cpl program with
+    a multi line comment every few lines, with CpqLexer and with a copy of it that counts the newlines
+    in Python functions, and time reading the line number of the last token, which builds the index
+"""
+
+import time
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+# the CpqLexer with the line numbers counted while lexing, like before lazy_lineno
+class CountingLexer(CpqLexer):
+    tokens = CpqLexer.tokens
+    lazy_lineno = False
+    ignore = " \t\r"
+
+    @_(r"(\"[^\"]*\"(?!\\))|(//[^\n]*$|/(?!\\)\*[\s\S]*?\*(?!\\)/)")
+    def ignore_comment(self, t):
+        self.lineno += t.value.count("\n")
+
+    @_(r"\n+")
+    def ignore_newline(self, t):
+        self.lineno += t.value.count("\n")
+
+
+def commented_program(statements):
+    lines = common.generate_cpl(statements).split("\n")
+    for n in range(len(lines) - 2, 4, -8):
+        lines.insert(n, "    /* a comment\n       over two lines */")
+    return "\n".join(lines)
+
+
+def main(statements=3000, rounds=25):
+    text = commented_program(statements)
+    lexers = [("lazy lineno", CpqLexer), ("counted lineno", CountingLexer)]
+    times = {name: None for name, _ in lexers}
+    # the rounds of the lexers are interleaved, so that a slower period of the machine affects both of them
+    for _ in range(rounds):
+        for name, lexer_class in lexers:
+            elapsed = common.best_time(lambda: list(lexer_class(SymbolTable()).tokenize(text)), 1, 1)
+            if times[name] is None or elapsed < times[name]:
+                times[name] = elapsed
+    print(f"{text.count(chr(10)) + 1} lines, {len(text)} chars")
+    for name, lexer_class in lexers:
+        tokens = list(lexer_class(SymbolTable()).tokenize(text))
+        start = time.perf_counter()
+        lineno = tokens[-1].lineno
+        first = time.perf_counter() - start
+        print(f"  {name:<15s} {times[name] * 1000:8.2f} ms   first lineno {first * 1000:6.2f} ms (line {lineno})")
+
+
+if __name__ == "__main__":
+    main()
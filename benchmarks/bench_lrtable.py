@@ -0,0 +1,22 @@
+""" Benchmark for sly's LALR(1) table construction.
+    We rebuild the LR tables of every bundled example grammar and of the cpl grammar
+    and print the best time per build
+"""
+
+import common  # sets up the path
+from sly.yacc import LRTable
+
+
+def main(rounds=5, repeat=20):
+    total = 0.0
+    for name, parser_class in common.load_parsers():
+        grammar = parser_class._grammar
+        elapsed = common.best_time(lambda: LRTable(grammar), repeat, rounds) / repeat
+        total += elapsed
+        states = len(parser_class._lrtable.lr_action)
+        print(f"{name:<12s} {states:5d} states  {elapsed * 1000:8.3f} ms per build")
+    print(f"{'total':<12s} {'':12s} {total * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
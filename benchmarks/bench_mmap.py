@@ -0,0 +1,61 @@
+""" Benchmark for lexing a memory mapped cpl file.
+    We write the generated cpl program to a temporary file and lex it once read into a str and
+    once as an mmap of the file, and compare the time and the peak memory of the two.
+    The tokens are counted and dropped, like the parser does with them
+"""
+
+import mmap
+import os
+import tempfile
+import tracemalloc
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+def read_text(file):
+    return file.read()
+
+
+def map_text(file):
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def lex_file(filename, get_text):
+    with open(filename, "r") as file:
+        return sum(1 for _ in CpqLexer(SymbolTable()).tokenize(get_text(file)))
+
+
+# peak memory that lexing the file takes
+def peak_memory(filename, get_text):
+    tracemalloc.start()
+    lex_file(filename, get_text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(statements=64000, rounds=5):
+    with tempfile.NamedTemporaryFile("w", suffix=".ou", delete=False) as file:
+        file.write(common.generate_cpl(statements))
+    try:
+        count = lex_file(file.name, read_text)
+        print(f"{os.path.getsize(file.name) / 1e6:.1f} MB of cpl, {count} tokens")
+        readers = (("read", read_text), ("mmap", map_text))
+        best = {}
+        # interleaved, so that a slow period of the machine hits both
+        for _ in range(rounds):
+            for label, get_text in readers:
+                elapsed = common.best_time(lambda: lex_file(file.name, get_text), 1, 1)
+                best[label] = min(best.get(label, elapsed), elapsed)
+        for label, get_text in readers:
+            peak = peak_memory(file.name, get_text)
+            print(f"  {label:<4s} {best[label] * 1000:8.1f} ms  {count / best[label]:10.0f} tokens/s  "
+                  f"peak {peak / 1e3:8.1f} kB")
+    finally:
+        os.remove(file.name)
+
+
+if __name__ == "__main__":
+    main()
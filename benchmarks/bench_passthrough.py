@@ -0,0 +1,52 @@
+""" Benchmark for pass-through (unit) rules in sly.
+    We parse the same cpl program with the cpl parser as it is and with its unit rules
+    (stmt, boolexpr, boolterm, expression, term) reduced through their functions again,
+    and count the rule function calls in both cases
+"""
+
+import common  # sets up the path
+
+
+def main(statements=2000, rounds=5):
+    from cpq_lexer import CpqLexer
+    from cpq_parser import CpqParser
+    from symbol_table import SymbolTable
+
+    tokens = list(CpqLexer(SymbolTable()).tokenize(common.generate_cpl(statements)))
+    productions = CpqParser._grammar.Productions
+    unit_rules = [p for p in productions[1:] if p.passthrough]
+
+    def run():
+        parser = CpqParser(SymbolTable())
+        for name in ("a", "b", "c"):
+            parser.symbol_table.add_variable(name)
+        parser.parse(iter(tokens))
+
+    # count calls by wrapping every rule function once
+    calls = {"count": 0}
+    originals = {p: p.func for p in productions[1:]}
+
+    def counting(func):
+        def wrapper(self, p):
+            calls["count"] += 1
+            return func(self, p)
+
+        return wrapper
+
+    print(f"cpl parse of {len(tokens)} tokens, {len(unit_rules)} pass-through rules")
+    for enabled in (False, True):
+        for p in unit_rules:
+            p.passthrough = enabled
+        elapsed = common.best_time(run, 1, rounds)
+        for p in productions[1:]:
+            p.func = counting(originals[p])
+        calls["count"] = 0
+        run()
+        for p in productions[1:]:
+            p.func = originals[p]
+        label = "pass-through" if enabled else "function calls"
+        print(f"  {label:<15s} {elapsed * 1000:8.2f} ms  {calls['count']:8d} rule calls")
+
+
+if __name__ == "__main__":
+    main()
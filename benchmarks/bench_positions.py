@@ -0,0 +1,54 @@
+""" Memory benchmark for sly's position tracking.
+    A single parser object parses 10k different expressions in a row and keeps the results,
+    the way a long-lived compiler would. We report how much memory is still held afterwards
+    with and without position tracking. We also time the cpl parser in both modes
+"""
+
+import gc
+import tracemalloc
+
+import common  # sets up the path
+
+
+def memory(parses=10000):
+    calc = common.load_example("calc", "calc/calc.py")
+    lexer = calc.CalcLexer()
+    for track in (True, False):
+        parser = calc.CalcParser()
+        parser.track_positions = track
+        parser.parse(lexer.tokenize("1"))  # warm up
+        results = []
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for n in range(parses):
+            results.append(parser.parse(lexer.tokenize(f"({n} + 100000) * 3")))
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"calc, {parses} parses, track_positions={track!s:<6s} {(after - before) / 1024:8.1f} KiB still held")
+
+
+def speed(statements=2000, rounds=5):
+    from cpq_lexer import CpqLexer
+    from cpq_parser import CpqParser
+    from symbol_table import SymbolTable
+
+    tokens = list(CpqLexer(SymbolTable()).tokenize(common.generate_cpl(statements)))
+
+    def run(track):
+        parser = CpqParser(SymbolTable())
+        parser.track_positions = track
+        for name in ("a", "b", "c"):
+            parser.symbol_table.add_variable(name)
+        parser.parse(iter(tokens))
+
+    print(f"cpl parse of {len(tokens)} tokens")
+    for track in (True, False):
+        elapsed = common.best_time(lambda: run(track), 1, rounds)
+        print(f"  track_positions={track!s:<6s} {elapsed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    memory()
+    speed()
@@ -0,0 +1,91 @@
+""" Benchmark for the QUAD runtime (quad.py).
+    We compile a loop heavy cpl program and run its QUAD code with the pre-decoded interpreter, with the
+    closure threaded machine, with the tracing machine (quad_jit.py), which compiles the hot loops while
+    it runs, and as the python function of the transpiler (quad_transpiler.py), and print the number of
+    instructions that ran per second. The rounds of the machines are interleaved so that a slower period
+    of the machine affects all of them. We also time loading (decoding) the QUAD code of the
+    generated cpl program, loading its QUAD bytecode file, and transpiling it and loading it from the
+    transpiler's cache
+"""
+
+import io
+import os
+import tempfile
+import time
+
+import common  # sets up the path
+from compiler import Compiler
+from quad import QuadMachine, ThreadedQuadMachine, dump_bytecode_file, load_bytecode_file, load_quad
+from quad_jit import TracingQuadMachine
+from quad_transpiler import TranspiledQuad, TranspiledQuadMachine, transpile
+
+LOOPS_PROGRAM = """
+i, j, n, s: int;
+x: float;
+{
+    input(n);
+    while (i < n) {
+        j = 0;
+        while (j < 100) {
+            s = s + i * j / 7 - j;
+            if (s > 1000000) s = s / 2; else s = s + 1;
+            x = x + j / 2.0;
+            j = j + 1;
+        }
+        i = i + 1;
+    }
+    output(s);
+    output(x);
+}
+"""
+
+
+def run(machine_class, program, stdin):
+    machine = machine_class(program, io.StringIO(stdin), io.StringIO())
+    start = time.perf_counter()
+    machine.run()
+    return time.perf_counter() - start, machine
+
+
+def main(outer=1000, rounds=5):
+    program = load_quad(Compiler().compile(LOOPS_PROGRAM))
+    # the machines and the programs they run. the transpiled program doesn't count its steps
+    machines = {
+        QuadMachine: program,
+        ThreadedQuadMachine: program,
+        TracingQuadMachine: program,
+        TranspiledQuadMachine: transpile(program),
+    }
+    times = {machine_class: [] for machine_class in machines}
+    for _ in range(rounds):
+        for machine_class, machine_program in machines.items():
+            elapsed, machine = run(machine_class, machine_program, str(outer))
+            times[machine_class].append(elapsed)
+            if machine.steps:
+                steps = machine.steps
+    print(f"loops: {len(program.code)} instructions, output {machine.stdout.getvalue().split()}")
+    for machine_class in machines:
+        elapsed = min(times[machine_class])
+        print(f"  {machine_class.__name__:22} {steps} instructions ran in {elapsed * 1000:8.2f} ms"
+              f"  {steps / elapsed / 1e6:6.2f} M instructions/s")
+
+    code = Compiler().compile(common.generate_cpl(20000))
+    elapsed = common.best_time(lambda: load_quad(code), 1, rounds)
+    count = len(load_quad(code).code)
+    print(f"load: {count} instructions in {elapsed * 1000:8.2f} ms  {count / elapsed / 1e6:6.2f} M instructions/s")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "generated.qbc")
+        dump_bytecode_file(load_quad(code), filename)
+        elapsed = common.best_time(lambda: load_bytecode_file(filename), 1, rounds)
+    print(f"load bytecode: {count} instructions in {elapsed * 1000:8.2f} ms  {count / elapsed / 1e6:6.2f} M instructions/s")
+
+    # transpiling the program, and loading the transpiled program like it's loaded from its cache
+    program = load_quad(code)
+    elapsed = common.best_time(lambda: transpile(program), 1, 1)
+    data = transpile(program).dumps()
+    cached = common.best_time(lambda: TranspiledQuad.loads(data), 1, rounds)
+    print(f"transpile: {elapsed * 1000:8.2f} ms, load from the cache: {cached * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+""" Benchmark for the batch QUAD machine (quad_batch.py).
+    We run a cpl program with a data dependent loop (the steps of the Collatz sequence of its input) on
+    many input records, once with the batch machine and on a sample of the records with QuadMachine, one
+    record at a time, and print the number of records that each one runs per second. Needs NumPy
+"""
+
+import io
+import time
+
+import common  # sets up the path
+from compiler import Compiler
+from quad import QuadMachine, load_quad
+
+COLLATZ_PROGRAM = """
+n, steps: int;
+{
+    input(n);
+    while (n != 1) {
+        if (n / 2 * 2 == n)
+            n = n / 2;
+        else
+            n = 3 * n + 1;
+        steps = steps + 1;
+    }
+    output(steps);
+}
+"""
+
+
+def main(records=100000, scalar_records=2000):
+    try:
+        import numpy as np
+        from quad_batch import BatchQuadMachine
+    except ImportError:
+        print("NumPy isn't installed, skipping")
+        return
+    program = load_quad(Compiler().compile(COLLATZ_PROGRAM))
+    inputs = np.arange(1, records + 1, dtype=np.int64).reshape(records, 1)
+
+    start = time.perf_counter()
+    machine = BatchQuadMachine(program, inputs)
+    machine.run()
+    batch = time.perf_counter() - start
+
+    # records from all over the batch, since the larger numbers have longer sequences
+    sample = range(0, records, records // scalar_records)
+    start = time.perf_counter()
+    for lane in sample:
+        scalar_machine = QuadMachine(program, io.StringIO(str(inputs[lane, 0])), io.StringIO())
+        scalar_machine.run()
+        assert scalar_machine.stdout.getvalue() == machine.output(lane)
+    scalar = time.perf_counter() - start
+
+    print(f"collatz: {int(machine.steps.sum())} instructions in {records} records")
+    print(f"  batch        {batch * 1000:10.2f} ms  {records / batch:12.0f} records/s")
+    print(f"  QuadMachine  {scalar * 1000:10.2f} ms  {len(sample) / scalar:12.0f} records/s"
+          f" ({len(sample)} of the records)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+""" Benchmark for the I/O of the QUAD runtime (QuadInput and QuadOutput in quad.py).
+    A cpl program reads a million numbers, half ints and half floats, and writes a million numbers.
+    We run it with its input in a file and its output to a file, with the default chunked input and
+    buffered output and with the input read a line at a time and each output line written and flushed
+    when it's written (the policy for a terminal, without the flush on input). We also run it with an
+    in-memory NumberSource and NumberSink, and run the transpiled program the same ways. The rounds are
+    interleaved
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import common  # sets up the path
+from compiler import Compiler
+from quad import NumberSink, NumberSource, QuadMachine, load_quad
+from quad_transpiler import TranspiledQuadMachine, transpile
+
+ECHO_PROGRAM = """
+n, i, k: int;
+x: float;
+{
+    input(n);
+    while (i < n) {
+        input(k);
+        input(x);
+        output(k + 1);
+        output(x * 2);
+        i = i + 1;
+    }
+}
+"""
+
+
+def run_files(machine_class, program, input_filename, output_filename, **options):
+    with open(input_filename, "r") as stdin, open(output_filename, "w") as stdout:
+        start = time.perf_counter()
+        machine_class(program, stdin, stdout, **options).run()
+        return time.perf_counter() - start
+
+
+def run_memory(machine_class, program, numbers):
+    sink = NumberSink()
+    start = time.perf_counter()
+    machine_class(program, NumberSource(numbers), sink).run()
+    return time.perf_counter() - start
+
+
+def main(pairs=500000, rounds=3):
+    rnd = random.Random(1)
+    numbers = [pairs]
+    for _ in range(pairs):
+        numbers += [rnd.randint(-(10**6), 10**6), round(rnd.random() * 100, 6)]
+    program = load_quad(Compiler().compile(ECHO_PROGRAM))
+    machines = {QuadMachine: program, TranspiledQuadMachine: transpile(program)}
+    with tempfile.TemporaryDirectory() as directory:
+        input_filename = os.path.join(directory, "input.txt")
+        output_filename = os.path.join(directory, "output.txt")
+        with open(input_filename, "w") as file:
+            file.write("".join(f"{number}\n" for number in numbers))
+        runs = {}
+        for machine_class, machine_program in machines.items():
+            name = machine_class.__name__
+            runs[f"{name} buffered"] = lambda c=machine_class, p=machine_program: run_files(
+                c, p, input_filename, output_filename
+            )
+            runs[f"{name} unbuffered"] = lambda c=machine_class, p=machine_program: run_files(
+                c, p, input_filename, output_filename, chunk_size=0, buffer_size=0
+            )
+            runs[f"{name} in memory"] = lambda c=machine_class, p=machine_program: run_memory(c, p, numbers)
+        times = {name: [] for name in runs}
+        for _ in range(rounds):
+            for name, run in runs.items():
+                times[name].append(run())
+    print(f"{len(numbers)} numbers in, {2 * pairs} numbers out")
+    for name, elapsed in times.items():
+        best = min(elapsed)
+        print(f"  {name:36} {best * 1000:8.1f} ms  {(len(numbers) + 2 * pairs) / best / 1e6:6.2f} M numbers/s")
+
+
+if __name__ == "__main__":
+    main()
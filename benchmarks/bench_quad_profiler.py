@@ -0,0 +1,32 @@
+""" Benchmark for the QUAD profiler (quad_profiler.py).
+    We run the loop heavy cpl program of bench_quad with the closure threaded machine and with the
+    profiling machine, which runs the same closures and counts and times each block, and print the cost
+    of the profiling. The rounds of the machines are interleaved. We also print the profile's report,
+    with the cpl lines of the source map
+"""
+
+import common  # sets up the path
+from bench_quad import LOOPS_PROGRAM, run
+from compiler import Compiler
+from quad import ThreadedQuadMachine, load_quad
+from quad_profiler import ProfilingQuadMachine
+
+
+def main(outer=1000, rounds=5):
+    code, source_map = Compiler().compile_with_source_map(LOOPS_PROGRAM)
+    program = load_quad(code)
+    times = {ThreadedQuadMachine: [], ProfilingQuadMachine: []}
+    for _ in range(rounds):
+        for machine_class in times:
+            elapsed, machine = run(machine_class, program, str(outer))
+            times[machine_class].append(elapsed)
+    for machine_class, elapsed in times.items():
+        print(f"  {machine_class.__name__:22} {min(elapsed) * 1000:8.2f} ms")
+    overhead = min(times[ProfilingQuadMachine]) / min(times[ThreadedQuadMachine]) - 1
+    print(f"profiling overhead: {overhead:.0%}")
+    machine.profile.source_map = source_map
+    print(machine.profile.report(5), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+""" Benchmark for sly's Lexer.relex.
+    We tokenize the generated cpl program into a TokenBuffer and then make small edits (typing
+    and deleting a few characters) around a cursor, that jumps to a random place every 50 edits,
+    updating the buffer with relex. The shift of the tokens after an edit is moved along with
+    the cursor, so a jump costs more. We compare the time of the edits with tokenizing all of
+    the text again, and check the buffer against it
+"""
+
+import random
+import time
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+
+def snapshot(buffer):
+    return [(tok.type, tok.value, tok.lineno, tok.index, tok.end) for tok in buffer]
+
+
+def main(statements=20000, edits=200, seed=1):
+    text = common.generate_cpl(statements)
+    lexer = CpqLexer(SymbolTable())
+    start = time.perf_counter()
+    buffer = lexer.tokenize_all(text)
+    full_time = time.perf_counter() - start
+    print(f"{len(buffer)} tokens, tokenize_all {full_time * 1000:8.1f} ms")
+
+    rnd = random.Random(seed)
+    times = {"typing": [], "jump": []}
+    relexed = 0
+    cursor = len(buffer.text) // 2
+    for n in range(edits):
+        kind = "typing"
+        if n % 50 == 49:
+            cursor, kind = rnd.randrange(len(buffer.text)), "jump"
+        cursor = min(max(cursor + rnd.randint(-8, 8), 0), len(buffer.text) - 3)
+        if rnd.random() < 0.7:
+            deleted, inserted = 0, rnd.choice(["a", "1", " ", "+", ";\n"])
+        else:
+            deleted, inserted = rnd.randint(1, 3), ""
+        start = time.perf_counter()
+        relexed += len(lexer.relex(buffer, cursor, deleted, inserted))
+        times[kind].append(time.perf_counter() - start)
+        cursor += len(inserted)
+    print(f"{edits} edits, {relexed / edits:.1f} tokens lexed again per edit")
+    for kind, values in times.items():
+        values.sort()
+        print(f"  {kind:<6s} median {values[len(values) // 2] * 1e6:8.1f} us   max {values[-1] * 1e6:8.1f} us")
+    assert snapshot(buffer) == snapshot(CpqLexer(SymbolTable()).tokenize_all(buffer.text))
+
+
+if __name__ == "__main__":
+    main()
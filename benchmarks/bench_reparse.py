@@ -0,0 +1,59 @@
+""" Benchmark for compiling a cpl program again after edits with the IncrementalCompiler.
+    We compile a generated cpl program of 50,000 lines once, and then time the compile after each of
+    a series of edits inside its statements: changing a number, adding a statement line and removing one.
+    The edits come in groups near each other, like when typing, and the first edit of a group jumps
+    to a random place in the program. Some of the edits are checked against a compile of the whole program
+"""
+
+import random
+import time
+
+import common  # sets up the path
+from incremental_compiler import IncrementalCompiler
+
+
+# returns the kind, the offset, the deleted length and the inserted text of a random edit of the text
+# somewhere after start
+def random_edit(text, rnd, start):
+    kind = rnd.choice(("number", "add", "remove"))
+    if kind == "number":
+        offset = text.index("5", start)
+        return kind, offset, 1, str(rnd.randint(1, 9))
+    line = text.index("\n", start) + 1
+    if kind == "add":
+        return kind, line, 0, "    c = c * 2 + 1;\n"
+    return kind, line, text.index("\n", line) + 1 - line, ""
+
+
+def main(statements=50000, groups=10, group_edits=10, check=5):
+    text = common.generate_cpl(statements)
+    compiler = IncrementalCompiler()
+    start = time.perf_counter()
+    compiler.compile(text)
+    full_time = time.perf_counter() - start
+    print(f"{text.count(chr(10))} lines, {len(compiler.buffer)} tokens")
+    print(f"  whole program        {full_time * 1000:10.1f} ms")
+
+    rnd = random.Random(1)
+    block = text.index("{\n") + 2
+    times = {}
+    for group in range(groups):
+        place = rnd.randrange(block, len(text) - 1000)
+        for n in range(group_edits):
+            kind, offset, deleted, inserted = random_edit(text, rnd, place + rnd.randrange(500))
+            text = text[:offset] + inserted + text[offset + deleted:]
+            start = time.perf_counter()
+            code = compiler.edit(offset, deleted, inserted)
+            times.setdefault("jump" if n == 0 else kind, []).append(time.perf_counter() - start)
+            assert code is not None
+        if group % (groups // check) == 0:
+            # the code has other temporary variables and labels, but the same number of lines
+            assert len(code.splitlines()) == len(IncrementalCompiler().compile(text).splitlines())
+    for kind, elapsed in times.items():
+        elapsed.sort()
+        print(f"  edit: {kind:<14s} {elapsed[len(elapsed) // 2] * 1000:10.2f} ms median"
+              f"  {max(elapsed) * 1000:8.2f} ms max  ({len(elapsed)} edits)")
+
+
+if __name__ == "__main__":
+    main()
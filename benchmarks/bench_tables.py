@@ -0,0 +1,66 @@
+""" Benchmark comparing sly's dictionary LR tables with the array based CompactLRTable.
+    For every grammar we print the memory used by both representations, and for the cpl
+    grammar we also compare the parsing speed on both tables, with parse() and with the generated
+    parse function
+"""
+
+import sys
+
+import common  # sets up the path
+from sly.yacc import CompactLRTable
+
+
+# approximate deep size of nested dicts/lists of ints and strings
+def deep_sizeof(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(x, seen) for x in obj)
+    return size
+
+
+def memory():
+    print("table memory (bytes)")
+    for name, parser_class in common.load_parsers():
+        table = parser_class._lrtable
+        dict_size = deep_sizeof([table.lr_action, table.lr_goto, table.defaulted_states])
+        compact = CompactLRTable(table)
+        print(f"  {name:<12s} dict {dict_size:8d}   compact {compact.nbytes():8d}")
+
+
+def parsing(statements=2000, rounds=5):
+    from cpq_lexer import CpqLexer
+    from cpq_parser import CpqParser
+    from symbol_table import SymbolTable
+
+    text = common.generate_cpl(statements)
+    tokens = list(CpqLexer(SymbolTable()).tokenize(text))
+    compact_table = CompactLRTable(CpqParser._lrtable)
+
+    def run(compact, generate):
+        parser = CpqParser(SymbolTable())
+        parser.generate_parse = generate
+        if compact:
+            parser._compact_lrtable = compact_table
+            parser.compact_tables = True
+        # the lexer normally adds the variables to the symbol table
+        for name in ("a", "b", "c"):
+            parser.symbol_table.add_variable(name)
+        parser.parse(iter(tokens))
+
+    print(f"cpl parse of {len(tokens)} tokens")
+    for generate in (False, True):
+        for label, compact in (("dict", False), ("compact", True)):
+            label = f"{label}, generated" if generate else label
+            elapsed = common.best_time(lambda: run(compact, generate), 1, rounds)
+            print(f"  {label:<18s} {elapsed * 1000:8.2f} ms  {len(tokens) / elapsed:10.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    memory()
+    parsing()
@@ -0,0 +1,56 @@
+""" Benchmark for sly's Lexer.tokenize_all.
+    We tokenize a generated cpl program of about a million tokens into a list of Token objects
+    and into a TokenBuffer, and compare the memory they take. Then we parse the program from
+    the buffer and from the lexer
+"""
+
+import time
+import tracemalloc
+
+import common  # sets up the path
+from cpq_lexer import CpqLexer
+from cpq_parser import CpqParser
+from symbol_table import SymbolTable
+
+
+# returns the result of func and the memory it still holds after returning
+def allocated(func):
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def parse(tokens):
+    parser = CpqParser(SymbolTable())
+    # the lexer normally adds the variables to the symbol table
+    for name in ("a", "b", "c"):
+        parser.symbol_table.add_variable(name)
+    start = time.perf_counter()
+    parser.parse(tokens)
+    return time.perf_counter() - start
+
+
+def main(statements=64000, parse_statements=4000):
+    text = common.generate_cpl(statements)
+    tokens, list_size = allocated(lambda: list(CpqLexer(SymbolTable()).tokenize(text)))
+    count = len(tokens)
+    del tokens
+    buffer, buffer_size = allocated(lambda: CpqLexer(SymbolTable()).tokenize_all(text))
+    print(f"{count} tokens, {len(text) / 1e6:.1f} MB of text")
+    print(f"  list of Token  {list_size / 1e6:8.1f} MB")
+    print(f"  TokenBuffer    {buffer_size / 1e6:8.1f} MB  ({buffer.nbytes() / 1e6:.1f} MB of arrays, "
+          f"{len(buffer.values)} stored values)")
+
+    # the cpl code generation is too slow for a million tokens, so we parse a smaller program
+    text = common.generate_cpl(parse_statements)
+    buffer = CpqLexer(SymbolTable()).tokenize_all(text)
+    lexer_time = parse(CpqLexer(SymbolTable()).tokenize(text))
+    buffer_time = parse(buffer)
+    print(f"parse of {len(buffer)} tokens from the lexer  {lexer_time * 1000:8.1f} ms")
+    print(f"parse of {len(buffer)} tokens from the buffer {buffer_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
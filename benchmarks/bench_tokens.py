@@ -0,0 +1,84 @@
+""" Benchmark for token allocation in sly's Lexer.tokenize.
+    The text of ignored tokens without an action function is skipped without making a Token.
+    We lex a comment heavy program with the wasm example lexer (whose comments are such a rule)
+    and the generated cpl program, and count the matches, the Token objects made and the tokens
+    yielded. We also print the size of a Token next to a namedtuple and a tuple with the same fields
+"""
+
+import sys
+import tracemalloc
+from collections import namedtuple
+
+import common  # sets up the path
+import sly.lex
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+Token = sly.lex.Token
+
+
+# Token that counts its instances
+class CountingToken(Token):
+    __slots__ = ()
+    made = 0
+
+    def __init__(self):
+        CountingToken.made += 1
+
+
+# wraps a compiled master pattern to count the matches
+class CountingPattern:
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.matches = 0
+
+    def match(self, text, index):
+        self.matches += 1
+        return self.pattern.match(text, index)
+
+
+def wasm_program(lines=20000):
+    body = ["# compute the next value", "x = x + 1 * (y - 2);", "# done", "if x < 10 then y else x;"]
+    return "\n".join(body[n % len(body)] for n in range(lines)) + "\n"
+
+
+def count(lexer_class, make_lexer, text):
+    pattern = lexer_class._master_re
+    lexer_class._master_re = counting = CountingPattern(pattern)
+    sly.lex.Token = CountingToken
+    CountingToken.made = 0
+    try:
+        yielded = sum(1 for _ in make_lexer().tokenize(text))
+    finally:
+        sly.lex.Token = Token
+        lexer_class._master_re = pattern
+    return counting.matches, CountingToken.made, yielded
+
+
+def measure(name, lexer_class, make_lexer, text, rounds=5):
+    matches, made, yielded = count(lexer_class, make_lexer, text)
+    elapsed = common.best_time(lambda: list(make_lexer().tokenize(text)), 1, rounds)
+    tracemalloc.start()
+    tokens = list(make_lexer().tokenize(text))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tokens
+    print(f"{name}: {matches} matches, {made} Token objects made, {yielded} tokens yielded")
+    print(f"  {elapsed * 1000:8.2f} ms  {yielded / elapsed:10.0f} tokens/s  peak {peak / 1e6:6.2f} MB")
+
+
+def main():
+    print("object sizes (bytes)")
+    TokenTuple = namedtuple("TokenTuple", "type value lineno index end")
+    tok = Token()
+    tok.type, tok.value, tok.lineno, tok.index, tok.end = "ID", "x", 1, 0, 1
+    print(f"  Token {sys.getsizeof(tok)}   namedtuple {sys.getsizeof(TokenTuple('ID', 'x', 1, 0, 1))}"
+          f"   tuple {sys.getsizeof(('ID', 'x', 1, 0, 1))}")
+
+    module = common.load_example("wasm_expr", common.EXAMPLE_GRAMMARS[4][1])
+    measure("wasm expr", module.ExprLexer, module.ExprLexer, wasm_program())
+    measure("cpl", CpqLexer, lambda: CpqLexer(SymbolTable()), common.generate_cpl(2000))
+
+
+if __name__ == "__main__":
+    main()
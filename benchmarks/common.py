@@ -0,0 +1,88 @@
+""" Shared helpers for the benchmark scripts in this folder.
+    The benchmarks run against the sly copy under 'sly-master' and the compiler under 'cpq-code',
+    so we put both of them on the path here instead of relying on an installed sly
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLY_SRC = os.path.join(ROOT, "sly-master", "src")
+SLY_EXAMPLES = os.path.join(ROOT, "sly-master", "example")
+CPQ_CODE = os.path.join(ROOT, "cpq-code")
+TESTS = os.path.join(ROOT, "tests")
+
+for path in (CPQ_CODE, SLY_SRC):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# example grammars bundled with sly, as (name, relative path, parser class name)
+EXAMPLE_GRAMMARS = [
+    ("calc", os.path.join("calc", "calc.py"), "CalcParser"),
+    ("calc_prec", os.path.join("calc_prec", "calc.py"), "CalcParser"),
+    ("calc_ebnf", os.path.join("calc_ebnf", "calc.py"), "CalcParser"),
+    ("schcls", os.path.join("schcls", "schcls.py"), "SchParser"),
+    ("wasm_expr", os.path.join("wasm", "expr.py"), "ExprParser"),
+]
+
+
+# loads an example module from sly's example folder without running its __main__ part
+def load_example(name, relative_path):
+    path = os.path.join(SLY_EXAMPLES, relative_path)
+    folder = os.path.dirname(path)
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    spec = importlib.util.spec_from_file_location(f"bench_example_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# returns a list of (name, parser class) for all the example grammars and the cpl grammar
+def load_parsers():
+    parsers = []
+    for name, relative_path, classname in EXAMPLE_GRAMMARS:
+        module = load_example(name, relative_path)
+        parsers.append((name, getattr(module, classname)))
+    from cpq_parser import CpqParser
+
+    parsers.append(("cpl", CpqParser))
+    return parsers
+
+
+# reads one of the sample cpl programs from the tests folder
+def read_sample(filename):
+    with open(os.path.join(TESTS, filename), "r") as file:
+        return file.read()
+
+
+# builds a large valid cpl program with 'statements' statements inside the main block
+def generate_cpl(statements=1000):
+    body = [
+        "    input(a);",
+        "    b = 5 * 30 + a;",
+        "    c = static_cast<int> (a + b * c - 5);",
+        "    if (!(b - 73.5 * a <= c + 5 * 30) || a > c + 5 && 5 + 3 < 2) a = 5; else a = 7;",
+        "    while (a < b + 5) { c = c + 1; a = c; }",
+        "    output(a + b * 3.2 + c);",
+    ]
+    lines = ["/* generated benchmark program */", "a, b: float;", "c: int;", "{"]
+    for n in range(statements):
+        lines.append(body[n % len(body)])
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+# runs func 'repeat' times and returns the best time out of 'rounds' rounds
+def best_time(func, repeat=1, rounds=5):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,436 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the C backend, which translates a QUAD program into an equivalent C program,
+    and compiles it into an executable with the system's C compiler
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+
+from quad import (
+    HALT,
+    IADD,
+    IASN,
+    IDIV,
+    IEQL,
+    IGRT,
+    IINP,
+    ILSS,
+    IMLT,
+    INQL,
+    IPRT,
+    ISUB,
+    ITOR,
+    JMPZ,
+    JUMP,
+    RADD,
+    RASN,
+    RDIV,
+    REQL,
+    RGRT,
+    RINP,
+    RLSS,
+    RMLT,
+    RNQL,
+    RPRT,
+    RSUB,
+    RTOI,
+    QuadError,
+)
+
+# the range of the C program's ints, which are 64 bit
+INT_MIN = -(2**63)
+INT_MAX = 2**63 - 1
+
+# the gcc builtin that computes each int opcode and detects an overflow
+OVERFLOW_BUILTINS = {
+    IADD: "__builtin_add_overflow",
+    ISUB: "__builtin_sub_overflow",
+    IMLT: "__builtin_mul_overflow",
+}
+
+# the C operator of each float arithmetic opcode and each comparison opcode
+C_OPERATORS = {
+    RADD: "+",
+    RSUB: "-",
+    RMLT: "*",
+    IEQL: "==",
+    INQL: "!=",
+    ILSS: "<",
+    IGRT: ">",
+    REQL: "==",
+    RNQL: "!=",
+    RLSS: "<",
+    RGRT: ">",
+}
+
+# the flags of the C compiler. floats mustn't be contracted into fused multiply adds, which round once
+# instead of twice, so the results are the same as the results of QuadMachine
+C_FLAGS = ["-O2", "-ffp-contract=off"]
+
+# the runtime of the C program. it reads and prints numbers like QuadMachine, and its errors are the
+# errors of QuadMachine that run_quad_file prints
+C_RUNTIME = r"""#include <ctype.h>
+#include <errno.h>
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <strings.h>
+
+static const char *program_name = PROGRAM_NAME;
+
+static void fail(int line, const char *message)
+{
+    fflush(stdout);
+    fprintf(stderr, "Error in QUAD program %s, line %d: %s\n", program_name, line, message);
+    exit(1);
+}
+
+static void overflow(int line)
+{
+    fail(line, "the int is too large for 64 bits");
+}
+
+/* formats a double like python's str(), with the shortest digits that are read back as x. for each
+   number of digits we try the closest digits to x, and the digits next to them, which are read back as x
+   when x is a power of 2 whose next smaller double is closer to it than its next larger double */
+static void format_double(double x, char *out)
+{
+    char text[40], digits[24];
+    long long mantissa = 0, candidate = 0;
+    int precision, exponent, count, point, i, k;
+    if (isnan(x)) {
+        strcpy(out, "nan");
+        return;
+    }
+    if (signbit(x))
+        *out++ = '-';
+    x = fabs(x);
+    if (isinf(x)) {
+        strcpy(out, "inf");
+        return;
+    }
+    for (precision = 1; precision <= 17; precision++) {
+        snprintf(text, sizeof text, "%.*e", precision - 1, x);
+        mantissa = 0;
+        for (i = 0; text[i] != 'e'; i++)
+            if (text[i] != '.')
+                mantissa = mantissa * 10 + (text[i] - '0');
+        exponent = atoi(text + i + 1) - (precision - 1);
+        for (k = 0; k < 3; k++) {
+            candidate = mantissa + (k == 1) - (k == 2);
+            snprintf(text, sizeof text, "%llde%d", candidate, exponent);
+            if (strtod(text, NULL) == x)
+                break;
+        }
+        if (k < 3)
+            break;
+    }
+    count = sprintf(digits, "%lld", candidate);
+    point = count + exponent;
+    while (count > 1 && digits[count - 1] == '0')
+        count--;
+    if (point <= -4 || point > 16) {
+        *out++ = digits[0];
+        if (count > 1) {
+            *out++ = '.';
+            memcpy(out, digits + 1, count - 1);
+            out += count - 1;
+        }
+        sprintf(out, "e%+03d", point - 1);
+    } else if (point <= 0) {
+        *out++ = '0';
+        *out++ = '.';
+        for (i = point; i < 0; i++)
+            *out++ = '0';
+        memcpy(out, digits, count);
+        out[count] = '\0';
+    } else if (point >= count) {
+        memcpy(out, digits, count);
+        out += count;
+        for (i = count; i < point; i++)
+            *out++ = '0';
+        strcpy(out, ".0");
+    } else {
+        memcpy(out, digits, point);
+        out[point] = '.';
+        memcpy(out + point + 1, digits + point, count - point);
+        out[count + 1] = '\0';
+    }
+}
+
+static void print_int(long long x)
+{
+    printf("%lld\n", x);
+}
+
+static void print_double(double x)
+{
+    char text[40];
+    format_double(x, text);
+    puts(text);
+}
+
+/* reads the next whitespace separated word of the input */
+static char *read_word(int line)
+{
+    static char *word = NULL;
+    static size_t size = 0;
+    size_t length = 0;
+    int c;
+    while ((c = getchar()) != EOF && isspace(c))
+        ;
+    if (c == EOF)
+        fail(line, "the input ended");
+    do {
+        if (length + 1 >= size) {
+            size = size ? size * 2 : 64;
+            word = realloc(word, size);
+            if (word == NULL)
+                fail(line, "out of memory");
+        }
+        word[length++] = (char)c;
+    } while ((c = getchar()) != EOF && !isspace(c));
+    word[length] = '\0';
+    return word;
+}
+
+/* fails with the message of a word that python's int() or float() doesn't read */
+static void wrong_number(int line, const char *word)
+{
+    size_t length = strlen(word);
+    char *message = malloc(length * 4 + 64), *out = message;
+    char quote = strchr(word, '\'') && !strchr(word, '"') ? '"' : '\'';
+    if (message == NULL)
+        fail(line, "out of memory");
+    *out++ = quote;
+    for (; *word; word++) {
+        unsigned char c = (unsigned char)*word;
+        if (c == '\\' || c == (unsigned char)quote)
+            out += sprintf(out, "\\%c", c);
+        else if (c < 32 || c == 127)
+            out += sprintf(out, "\\x%02x", c);
+        else
+            *out++ = (char)c;
+    }
+    *out++ = quote;
+    strcpy(out, " in the input isn't a number of the right type");
+    fail(line, message);
+}
+
+/* removes the underscores of a word, which python allows only between digits */
+static int remove_underscores(char *word)
+{
+    char *in = word, *out = word;
+    for (; *in; in++) {
+        if (*in == '_') {
+            if (in == word || !isdigit((unsigned char)in[-1]) || !isdigit((unsigned char)in[1]))
+                return 0;
+            continue;
+        }
+        *out++ = *in;
+    }
+    *out = '\0';
+    return 1;
+}
+
+static long long read_int(int line)
+{
+    char *word = read_word(line), *end, *p;
+    char original[strlen(word) + 1];
+    long long value;
+    strcpy(original, word);
+    p = word + (*word == '+' || *word == '-');
+    if (!isdigit((unsigned char)*p) || !remove_underscores(p))
+        wrong_number(line, original);
+    for (; *p; p++)
+        if (!isdigit((unsigned char)*p))
+            wrong_number(line, original);
+    errno = 0;
+    value = strtoll(word, &end, 10);
+    if (errno == ERANGE)
+        overflow(line);
+    return value;
+}
+
+static double read_float(int line)
+{
+    char *word = read_word(line), *end, *p;
+    char original[strlen(word) + 1];
+    const char *names[] = {"inf", "infinity", "nan"};
+    size_t i;
+    strcpy(original, word);
+    p = word + (*word == '+' || *word == '-');
+    for (i = 0; i < 3; i++)
+        if (strcasecmp(p, names[i]) == 0)
+            return strtod(word, NULL);
+    if (!remove_underscores(p) || strspn(p, "0123456789.eE+-") != strlen(p))
+        wrong_number(line, original);
+    double value = strtod(word, &end);
+    if (end == word || *end != '\0')
+        wrong_number(line, original);
+    return value;
+}
+
+static long long divide(long long a, long long b, int line)
+{
+    if (b == 0)
+        fail(line, "division by zero");
+    if (a == -9223372036854775807LL - 1 && b == -1)
+        overflow(line);
+    return a / b;
+}
+
+static double float_divide(double a, double b, int line)
+{
+    if (b == 0)
+        fail(line, "division by zero");
+    return a / b;
+}
+
+static long long float_to_int(double x, int line)
+{
+    if (isnan(x) || isinf(x)) {
+        char text[80];
+        sprintf(text, "can't convert %s to an int", isnan(x) ? "nan" : x < 0 ? "-inf" : "inf");
+        fail(line, text);
+    }
+    if (x >= 9223372036854775808.0 || x < -9223372036854775808.0)
+        overflow(line);
+    return (long long)x;
+}
+"""
+
+
+# returns the name of a variable's C variable
+def c_name(program, slot: int):
+    name = program.names[slot]
+    if name.isidentifier() and name.isascii():
+        return f"v_{name}"
+    return f"v{slot}_"
+
+
+# returns the C string literal of a string
+def c_string(text: str):
+    escaped = "".join(
+        f"\\{c}" if c in '\\"' else c if " " <= c <= "~" else f"\\{ord(c):03o}"
+        for c in text.encode().decode("latin-1")
+    )
+    return f'"{escaped}"'
+
+
+# this is the C backend class
+class CBackend:
+    """
+    Every variable of the program is a local variable of main(), a long long if it's an int and a double
+    if it's a float, and every number is a constant: a float is written in hexadecimal, which is exact.
+    Each instruction is a C statement, labeled if a jump jumps to it, and the jumps are gotos.
+    The C program computes exactly what QuadMachine computes, and prints its output and its errors the
+    same way, except that its ints are 64 bit: an int that overflows is an error.
+    """
+
+    def __init__(self, program, name: str):
+        self.program = program
+        self.name = name  # the name of the QUAD program in the error messages
+        self.numbers = {slot: program.memory[slot] for slot in program.numbers.values()}
+
+    # returns the C expression of a slot
+    def operand(self, slot: int):
+        if slot not in self.numbers:
+            return c_name(self.program, slot)
+        value = self.numbers[slot]
+        if isinstance(value, int):
+            if not INT_MIN <= value <= INT_MAX:
+                raise QuadError(f"the number {value} is too large for 64 bits")
+            # the minimal int can't be written as a negated constant
+            return f"({value + 1}LL - 1)" if value == INT_MIN else f"({value}LL)"
+        if value != value:
+            return "NAN"
+        if value in (float("inf"), float("-inf")):
+            return "INFINITY" if value > 0 else "(-INFINITY)"
+        return f"({value.hex()})"
+
+    # returns the C statement of instruction n
+    def statement(self, n: int):
+        op, a, b, c = self.program.code[n]
+        line = self.program.lines[n]
+        # only the operands that the instruction reads are slots, a program may have no slots at all
+        x = self.operand(b) if op < IASN or op in (IASN, RASN, JMPZ, ITOR, RTOI) else None
+        y = self.operand(c) if op < IASN else None
+        target = c_name(self.program, a) if op not in (JMPZ, JUMP, HALT, IPRT, RPRT) else None
+        if op in OVERFLOW_BUILTINS:
+            return f"if ({OVERFLOW_BUILTINS[op]}({x}, {y}, &{target})) overflow({line});"
+        if op == IDIV:
+            return f"{target} = divide({x}, {y}, {line});"
+        if op == RDIV:
+            return f"{target} = float_divide({x}, {y}, {line});"
+        if op in C_OPERATORS:
+            return f"{target} = {x} {C_OPERATORS[op]} {y};"
+        if op == IASN or op == RASN:
+            return f"{target} = {x};"
+        if op == JMPZ:
+            return f"if (!{x}) goto L{a};"
+        if op == JUMP:
+            return f"goto L{a};"
+        if op == ITOR:
+            return f"{target} = (double){x};"
+        if op == RTOI:
+            return f"{target} = float_to_int({x}, {line});"
+        if op == IINP:
+            return f"{target} = read_int({line});"
+        if op == RINP:
+            return f"{target} = read_float({line});"
+        if op == IPRT:
+            return f"print_int({self.operand(a)});"
+        if op == RPRT:
+            return f"print_double({self.operand(a)});"
+        return "goto halt;"
+
+    # returns the source of the C program
+    def generate(self):
+        program = self.program
+        targets = {instruction[1] for instruction in program.code if instruction[0] in (JMPZ, JUMP)}
+        lines = [f"/* generated by cpq from the QUAD program {self.name} */"]
+        lines.append(f"#define PROGRAM_NAME {c_string(self.name)}")
+        lines.append(C_RUNTIME)
+        lines.append("int main(void)")
+        lines.append("{")
+        for name, slot in program.variables.items():
+            kind = "long long" if isinstance(program.memory[slot], int) else "double"
+            lines.append(f"    {kind} {c_name(program, slot)} = 0;")
+        for n in range(len(program.code)):
+            label = f"L{n}: " if n in targets else ""
+            lines.append(f"{label}    {self.statement(n)}")
+        lines.append("halt:")
+        lines.append("    return 0;")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+# returns the C program of a QUAD program, 'name' is the name of the QUAD program in its error messages
+def generate_c(program, name: str):
+    return CBackend(program, name).generate()
+
+
+# returns the command of the C compiler: the CC environment variable, or cc, gcc or clang if one of
+# them is installed. returns None if there's no C compiler
+def c_compiler():
+    if os.environ.get("CC"):
+        return shlex.split(os.environ["CC"])
+    for command in ("cc", "gcc", "clang"):
+        if shutil.which(command):
+            return [command]
+    return None
+
+
+# compiles a C program file into an executable. returns the C compiler's error output if it failed,
+# and raises FileNotFoundError if there's no C compiler
+def compile_c(c_filename: str, executable: str):
+    compiler = c_compiler()
+    if compiler is None:
+        raise FileNotFoundError("no C compiler")
+    command = [*compiler, *C_FLAGS, "-o", executable, c_filename, "-lm"]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return None if result.returncode == 0 else result.stderr
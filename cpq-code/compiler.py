@@ -2,6 +2,9 @@
     This module defines the Compiler class 
 """
 
+import mmap
+import os
+
 from cpq_lexer import CpqLexer
 from cpq_parser import CpqParser
 from parser_classes import CodeConstruct
@@ -9,11 +12,14 @@ from symbol_table import SymbolTable
 from utils import (
     FILE_READING_ERROR,
     ILLEGAL_FILENAME_ERROR,
+    MMAP_SIZE_THRESHOLD,
     PARSING_ERROR_MSG,
+    SOURCE_MAP_EXTENSION,
     error_print,
     legal_filename,
     raw_filename,
     reparse_output,
+    reparse_output_with_source_map,
 )
 
 
@@ -25,28 +31,62 @@ class Compiler:
         self.lexer = CpqLexer(self.symbol_table)
         self.parser = CpqParser(self.symbol_table)
 
-    # this is the main function that executes the compilation process
-    def run_on_file(self, filename: str):
+    # this is the main function that executes the compilation process. returns the generated code if
+    # the output file was created, otherwise None. with 'source_map' it also creates a .map file with
+    # the source map of the code, the line in the cpl program of each line of the code
+    def run_on_file(self, filename: str, source_map: bool = False):
+        code = None
         try:
             if not legal_filename(filename):
                 error_print(ILLEGAL_FILENAME_ERROR)
                 raise Exception
             with open(filename, "r") as file:
                 try:
-                    input_text = file.read()
-                    result: CodeConstruct = self.parser.parse(
-                        self.lexer.tokenize(input_text)
-                    )
+                    input_text = self.read_source(file)
+                    if source_map:
+                        compiled = self.compile_with_source_map(input_text)
+                        code, lines = (None, None) if compiled is None else compiled
+                    else:
+                        code = self.compile(input_text)
                     # only if errors were not detected we create an output file
-                    if (
-                        not self.lexer.errors_detected
-                        and not self.parser.errors_detected
-                    ):
+                    if code is not None:
                         raw_file = raw_filename(filename)
-                        # create the output file as .qud and reparse the output
+                        # create the output file as .qud
                         with open(f"{raw_file}.qud", "w") as new_file:
-                            new_file.write(reparse_output(result.generated_code))
+                            new_file.write(code)
+                        if source_map:
+                            with open(f"{raw_file}{SOURCE_MAP_EXTENSION}", "w") as map_file:
+                                map_file.write("".join(f"{line}\n" for line in lines))
                 except Exception as e:
                     error_print(PARSING_ERROR_MSG)
+                    code = None
         except Exception as e:
             error_print(FILE_READING_ERROR)
+            code = None
+        return code
+
+    # compiles the text of a program and returns the generated code (reparsed), or None if errors were detected
+    def compile(self, text):
+        result: CodeConstruct = self.parser.parse(self.lexer.tokenize(text))
+        if self.lexer.errors_detected or self.parser.errors_detected:
+            return None
+        return reparse_output(result.generated_code)
+
+    # compiles the text of a program like compile, and returns the generated code and its source map,
+    # or None if errors were detected. see reparse_output_with_source_map
+    def compile_with_source_map(self, text):
+        self.parser.source_map = True
+        try:
+            result: CodeConstruct = self.parser.parse(self.lexer.tokenize(text))
+        finally:
+            self.parser.source_map = False
+        if self.lexer.errors_detected or self.parser.errors_detected:
+            return None
+        return reparse_output_with_source_map(result.generated_code)
+
+    # returns the text to compile. large files are memory mapped instead of being read,
+    # the lexer lexes the mapped bytes and decodes only the token values it needs
+    def read_source(self, file):
+        if os.fstat(file.fileno()).st_size >= MMAP_SIZE_THRESHOLD:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return file.read()
@@ -7,26 +7,75 @@ import sys
 # we insert sly library into the path
 # this insertion is relative, therefore it's important to run cpq.py from the folder containing cpq-code
 sys.path.insert(0, "sly-master\\src\\")
+from c_backend import compile_c, generate_c
 from compiler import Compiler
+from quad import BYTECODE_EXTENSION, QuadError, dump_bytecode_file, load_quad
 from utils import (
+    C_COMPILATION_ERROR,
+    C_GENERATION_ERROR,
+    NO_C_COMPILER_ERROR,
     NOT_ENOUGH_ARGV_PARAMS_ERROR,
     SIGNATURE_LINE,
     TOO_MANY_ARGV_PARAMS_ERROR,
     error_print,
+    raw_filename,
 )
 
+# the flags that the compiler takes before the filename: --c also creates a .c file with the C program
+# of the QUAD code, --native also compiles it into an executable with the system's C compiler,
+# --bytecode also creates a .qbc file with the QUAD bytecode, which the QUAD runtime loads faster, and
+# --source-map also creates a .map file with the line in the cpl program of each line of the QUAD code
+TARGET_FLAGS = ("--c", "--native", "--bytecode", "--source-map")
+
+
+# creates the QUAD bytecode file of the QUAD code that was generated for a file
+def run_bytecode_backend(filename: str, code: str):
+    dump_bytecode_file(load_quad(code), f"{raw_filename(filename)}{BYTECODE_EXTENSION}")
+
+
+# creates the C program of the QUAD code that was generated for a file, and compiles it if 'native'
+def run_c_backend(filename: str, code: str, native: bool):
+    raw_file = raw_filename(filename)
+    try:
+        c_code = generate_c(load_quad(code), f"{raw_file}.qud")
+    except QuadError as e:
+        # the C program's ints are 64 bit, so a larger int number can't be translated
+        error_print(C_GENERATION_ERROR)
+        error_print(str(e))
+        return
+    with open(f"{raw_file}.c", "w") as c_file:
+        c_file.write(c_code)
+    if not native:
+        return
+    try:
+        errors = compile_c(f"{raw_file}.c", raw_file)
+    except FileNotFoundError:
+        error_print(NO_C_COMPILER_ERROR)
+        return
+    if errors is not None:
+        error_print(C_COMPILATION_ERROR)
+        error_print(errors)
+
 
 # we print a signature to stderr, check if the length of argv is legal and if it is-
 # we call the compiler to run on the file that the user supplied
 def main():
     error_print(SIGNATURE_LINE)
     cpq_compiler = Compiler()
-    if len(sys.argv) > 2:  # more than one parameter
+    args = sys.argv[1:]
+    targets = []
+    while args[:1] and args[0] in TARGET_FLAGS:
+        targets.append(args.pop(0))
+    if len(args) > 1:  # more than one parameter
         error_print(TOO_MANY_ARGV_PARAMS_ERROR)
-    elif len(sys.argv) < 2:
+    elif len(args) < 1:
         error_print(NOT_ENOUGH_ARGV_PARAMS_ERROR)
     else:
-        cpq_compiler.run_on_file(sys.argv[1])
+        code = cpq_compiler.run_on_file(args[0], source_map="--source-map" in targets)
+        if code is not None and "--bytecode" in targets:
+            run_bytecode_backend(args[0], code)
+        if code is not None and ("--c" in targets or "--native" in targets):
+            run_c_backend(args[0], code, "--native" in targets)
 
 
 if __name__ == "__main__":
@@ -44,32 +44,41 @@ class CpqLexer(Lexer):
         CAST,
     }
 
-    ignore = " \t\r"  # ignore whitespace
-    ignore_newline = r"\n+"  # ignore newlines
+    ignore = " \t\r\n"  # ignore whitespace and newlines
 
-    # comments
-    @_(r"(\"[^\"]*\"(?!\\))|(//[^\n]*$|/(?!\\)\*[\s\S]*?\*(?!\\)/)")
+    # sly computes the line numbers of the tokens from a newline index of the text when they're needed,
+    # for the error messages, so we don't count the newlines while lexing
+    lazy_lineno = True
+
+    # comments that end with the line, which are only allowed on the last line
+    ignore_comment = r"//[^\n]*$"
+
+    # comments, and strings, which cpl ignores like comments. we find their end with str.find instead of
+    # matching them with a regular expression, which is linear in their length too but much slower per
+    # character. an unterminated comment or string runs to the end of the text, so an edit after it
+    # (see Lexer.relex) is seen to change it
+    @_(r"/\*|\"")
     def COMMENT(self, t):
-        self.lineno += t.value.count(
-            "\n"
-        )  # count lines in comment for correct error reporting
-
-    # count newlines
-    def ignore_newline(self, t):
-        self.lineno += t.value.count("\n")
-
-    # special id tokens
-    BREAK = r"break"
-    CASE = r"case"
-    DEFAULT = r"default"
-    ELSE = r"else"
-    FLOAT = r"float"
-    IF = r"if"
-    INPUT = r"input"
-    INT = r"int"
-    OUTPUT = r"output"
-    SWITCH = r"switch"
-    WHILE = r"while"
+        text = self.text
+        binary = not isinstance(text, str)
+        if t.value == "/*":
+            end = text.find(b"*/" if binary else "*/", self.index)
+            if end >= 0:
+                self.index = end + 2
+                return
+        else:
+            end = text.find(b'"' if binary else '"', self.index)
+            if end >= 0:
+                if text[end + 1 : end + 2] != (b"\\" if binary else "\\"):
+                    self.index = end + 1
+                    return
+                # a string can't be followed by a backslash, so the quote is an illegal character
+                self.index = t.index
+                self.lineno = t.lineno
+                return self.error(t)
+        error_print(f"Error in lexical analysis on line {t.lineno}: Unterminated comment")
+        self.index = len(text)
+        self.errors_detected = True
 
     # special symbols
     LBRACES = r"\{"
@@ -86,6 +95,21 @@ class CpqLexer(Lexer):
     CAST = r"(static_cast<int>)|(static_cast<float>)"
     NUM = r"([0-9]+\.[0-9]*)|[0-9]+"
     ID = r"[a-zA-Z]([a-zA-Z]|[0-9])*"
+
+    # special id tokens, they are matched as an ID and sly remaps them by their value.
+    # this way a name like 'iffy' or 'integer' is a single ID and isn't split into a keyword and an ID
+    ID["break"] = BREAK
+    ID["case"] = CASE
+    ID["default"] = DEFAULT
+    ID["else"] = ELSE
+    ID["float"] = FLOAT
+    ID["if"] = IF
+    ID["input"] = INPUT
+    ID["int"] = INT
+    ID["output"] = OUTPUT
+    ID["switch"] = SWITCH
+    ID["while"] = WHILE
+
     ADDOP = r"[+-]"
     MULOP = r"[*/]"
     OR = r"\|\|"
@@ -118,5 +142,6 @@ class CpqLexer(Lexer):
             f"Error in lexical analysis on line {self.lineno}: Illegal character '%s'"
             % t.value[0]
         )
-        self.index += 1
+        # the end of the token is after the whole character, also when a non-ASCII character is lexed as bytes
+        self.index = t.end
         self.errors_detected = True
@@ -4,15 +4,19 @@
 
 from code_generator import CodeGenerator
 from cpq_lexer import CpqLexer
-from parser_classes import CodeConstruct
+from parser_classes import CodeConstruct, StmtListConstruct
 from sly import Parser
 from symbol_table import SymbolTable
-from utils import FLOAT, INT, error_print
+from utils import FLOAT, INT, SOURCE_LINE_MARK, error_print
 
 
 # this is the parser class
 class CpqParser(Parser):
     tokens = CpqLexer.tokens
+    # we only use p.lineno, which is read from the tokens, so sly doesn't need to track positions
+    track_positions = False
+    # sly generates and compiles a parse function specialized for this grammar
+    generate_parse = True
 
     """
     Here we define all of the derivation rules and real-time code generation
@@ -89,11 +93,11 @@ class CpqParser(Parser):
         "switch_stmt",
         "break_stmt",
         "stmt_block",
+        passthrough=True,
     )
-    # we return the stmt's code
+    # a stmt is just the stmt's code, so sly passes the construct through without calling this function
     def stmt(self, p):
-        construct: CodeConstruct = p[0]
-        return CodeConstruct(generated_code=construct.generated_code)
+        return p[0]
 
     @_("ID ASSIGN expression SEMICOLON")
     def assignment_stmt(self, p):
@@ -121,7 +125,7 @@ class CpqParser(Parser):
                 f"Semantic error in assignment stmt on line {p.lineno}, tried to assign float to int!.."
             )
             generated_code = ""
-        return CodeConstruct(generated_code=generated_code)
+        return CodeConstruct(generated_code=self.mark_source_line(generated_code, p))
 
     @_("INPUT LPAREN ID RPAREN SEMICOLON")
     def input_stmt(self, p):
@@ -134,7 +138,7 @@ class CpqParser(Parser):
             return CodeConstruct(generated_code="")
         # if no errors found call the code generator
         generated_code = self.code_generator.generate_input_stmt(id=p.ID)
-        return CodeConstruct(generated_code=generated_code)
+        return CodeConstruct(generated_code=self.mark_source_line(generated_code, p))
 
     @_("OUTPUT LPAREN expression RPAREN SEMICOLON")
     def output_stmt(self, p):
@@ -147,7 +151,7 @@ class CpqParser(Parser):
             expression_code=expression.generated_code,
             expression_retval_var=expression.retval_var,
         )
-        return CodeConstruct(generated_code=generated_code)
+        return CodeConstruct(generated_code=self.mark_source_line(generated_code, p))
 
     @_("IF LPAREN boolexpr RPAREN stmt ELSE stmt")
     def if_stmt(self, p):
@@ -164,7 +168,7 @@ class CpqParser(Parser):
             positive_stmt_code=positive_stmt.generated_code,
             negative_stmt_code=negative_stmt.generated_code,
         )
-        return CodeConstruct(generated_code=generated_code)
+        return CodeConstruct(generated_code=self.mark_source_line(generated_code, p))
 
     @_("WHILE LPAREN boolexpr RPAREN stmt")
     def while_stmt(self, p):
@@ -179,7 +183,7 @@ class CpqParser(Parser):
             boolexpr_retval_var=boolexpr.retval_var,
             stmt_code=stmt.generated_code,
         )
-        return CodeConstruct(generated_code=generated_code)
+        return CodeConstruct(generated_code=self.mark_source_line(generated_code, p))
 
     ######################## switch and break are ignored
     @_(
@@ -205,14 +209,14 @@ class CpqParser(Parser):
 
     @_("stmtlist stmt")
     def stmtlist(self, p):
-        # we add a newline between every stmt
-        generated_code = p.stmtlist.generated_code + "\n" + p.stmt.generated_code
-        return CodeConstruct(generated_code=generated_code)
+        # we add the stmt's code to the list, a newline is added between every stmt when it's joined
+        p.stmtlist.stmt_codes.append(p.stmt.generated_code)
+        return p.stmtlist
 
     # empty rule
     @_("empty")
     def stmtlist(self, p):
-        return CodeConstruct(generated_code="")
+        return StmtListConstruct()
 
     @_("boolexpr OR boolterm")
     def boolexpr(self, p):
@@ -232,11 +236,10 @@ class CpqParser(Parser):
         )
         return CodeConstruct(generated_code=generated_code, retval_var=retval_var)
 
-    @_("boolterm")
+    # pass-through rule, sly doesn't call this function. An error in boolterm was already recorded
+    # where its retval_var was set to None, so there is nothing to check here
+    @_("boolterm", passthrough=True)
     def boolexpr(self, p):
-        if p.boolterm.retval_var is None:  # then we have an error in boolexpr
-            self.errors_detected = True
-            return CodeConstruct(generated_code="", retval_var=None)
         return p.boolterm
 
     @_("boolterm AND boolfactor")
@@ -257,11 +260,9 @@ class CpqParser(Parser):
         )
         return CodeConstruct(generated_code=generated_code, retval_var=retval_var)
 
-    @_("boolfactor")
+    # pass-through rule, see boolexpr
+    @_("boolfactor", passthrough=True)
     def boolterm(self, p):
-        if p.boolfactor.retval_var is None:  # then we have an error in boolfactor
-            self.errors_detected = True
-            return CodeConstruct(generated_code="", retval_var=None)
         return p.boolfactor
 
     @_("NOT LPAREN boolexpr RPAREN")
@@ -315,11 +316,9 @@ class CpqParser(Parser):
         )
         return CodeConstruct(generated_code=generated_code, retval_var=retval_var)
 
-    @_("term")
+    # pass-through rule, see boolexpr
+    @_("term", passthrough=True)
     def expression(self, p):
-        if p.term.retval_var is None:  # then we have an error in term
-            self.errors_detected = True
-            return CodeConstruct(generated_code="", retval_var=None)
         return p.term
 
     @_("term MULOP factor")
@@ -341,11 +340,9 @@ class CpqParser(Parser):
         )
         return CodeConstruct(generated_code=generated_code, retval_var=retval_var)
 
-    @_("factor")
+    # pass-through rule, see boolexpr
+    @_("factor", passthrough=True)
     def term(self, p):
-        if p.factor.retval_var is None:  # then we have an error in factor
-            self.errors_detected = True
-            return CodeConstruct(generated_code="", retval_var=None)
         return p.factor
 
     @_("LPAREN expression RPAREN")
@@ -425,3 +422,13 @@ class CpqParser(Parser):
         self.symbol_table: SymbolTable = symbol_table
         self.errors_detected = False
         self.code_generator: CodeGenerator = CodeGenerator(symbol_table)
+        # when it's set, the code of each stmt is between lines that mark its line in the source, which
+        # utils.reparse_output_with_source_map removes from the generated code
+        self.source_map = False
+
+    # returns the code of the stmt of production 'p', between the lines that mark its line if there's a source map.
+    # p.lineno is read only then, since the lexer finds the line of a token from its index when it's read
+    def mark_source_line(self, generated_code: str, p):
+        if not self.source_map or not generated_code:
+            return generated_code
+        return f"{SOURCE_LINE_MARK} {p.lineno}\n{generated_code}\n{SOURCE_LINE_MARK}"
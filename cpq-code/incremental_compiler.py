@@ -0,0 +1,176 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the IncrementalCompiler class, which compiles a program again
+    after every edit of its text, for example while it's typed in an editor
+"""
+
+import contextlib
+import io
+import sys
+from array import array
+from bisect import bisect_left
+
+from compiler import Compiler
+from cpq_lexer import CpqLexer
+from cpq_parser import CpqParser
+from symbol_table import SymbolTable
+from utils import PARSING_ERROR_MSG, clean_newlines, error_print, output_lines, reparse_output
+
+
+# this is the incremental compiler class
+class IncrementalCompiler(Compiler):
+    """
+    compile() compiles a whole program and edit() compiles it again after an edit that replaced
+    'deleted' characters at 'offset' with the 'inserted' text. Both return the generated code, or None
+    if errors were detected, in which case the error messages are printed like in run_on_file.
+
+    While parsing, sly records the subtree of every stmt with the parser states under it.
+    After an edit the lexer lexes only the tokens around the edit again, and when those tokens are
+    inside the top level stmts of the program's block, only these stmts are parsed again on top of the
+    recorded states. The code of all of the other stmts is reused. The code generator is kept between
+    edits, so the temporary variables and labels of the new code are never ones that the reused code has.
+    An edit of the declarations or of the block's braces, a syntax error in the stmts or an edit after
+    errors were detected compiles the whole program again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = None  # the tokens of the program
+        self.code = None  # the generated code, None if there were errors
+        self.stmt_codes: list[str] = []  # the code of each top level stmt, with clean newlines
+        self.ragged_stmts = 0  # the number of stmts whose code ends with a newline
+        self.stmt_starts = array("i")  # the token number where each top level stmt starts, and the end of the last
+        # like the tokens of the buffer, the starts from starts_shift_from on are 'starts_shift' tokens later
+        self.starts_shift_from = 0
+        self.starts_shift = 0
+        self.stmt_states = None  # the parser states under a top level stmt
+
+    # compiles the whole program
+    def compile(self, text: str):
+        # a new symbol table, lexer and parser, so that the code is the same as the code of run_on_file
+        self.symbol_table = SymbolTable()
+        self.lexer = CpqLexer(self.symbol_table)
+        self.parser = CpqParser(self.symbol_table)
+        self.parser.subtree_symbols = ("stmt",)
+        # the parser takes the tokens while they're lexed and stored in the buffer, like the tokens of run_on_file.
+        # the lexer's errors come out between the parser's, and its token functions update the symbol table
+        # before the tokens after them are parsed. the parser reads all of the tokens, up to the end of the text
+        self.buffer, tokens = self.lexer.tokenize_buffered(text)
+        result = self.parser.parse(tokens)
+        self.code = None
+        if self.lexer.errors_detected or self.parser.errors_detected:
+            return None
+        if result is None:
+            # the parser got to the end of the file in the middle of the program
+            error_print(PARSING_ERROR_MSG)
+            return None
+
+        # the top level stmts are the stmts with the fewest parser states under them
+        subtrees = self.parser.subtrees
+        self.parser.subtrees = []
+        depth = min((len(subtree.states) for subtree in subtrees), default=None)
+        stmts = [subtree for subtree in subtrees if len(subtree.states) == depth]
+        self.stmt_codes = [clean_newlines(stmt.value.generated_code) for stmt in stmts]
+        self.ragged_stmts = sum(code.endswith("\n") for code in self.stmt_codes)
+        self.stmt_starts = array("i", [self.buffer.find(stmt.index) for stmt in stmts])
+        self.starts_shift_from = self.starts_shift = 0
+        if stmts:
+            self.stmt_starts.append(self.buffer.find(stmts[-1].end))
+            self.stmt_states = stmts[0].states
+        else:
+            self.stmt_states = None
+        self.code = reparse_output(result.generated_code)
+        return self.code
+
+    # compiles the program again after an edit of its text
+    def edit(self, offset: int, deleted: int, inserted: str):
+        count = len(self.buffer)
+        # lexical errors compile the whole program again, which prints their messages
+        with contextlib.redirect_stderr(io.StringIO()):
+            changed = self.lexer.relex(self.buffer, offset, deleted, inserted)
+        if self.lexer.errors_detected or self.code is None or self.stmt_states is None:
+            return self.compile(self.buffer.text)
+
+        # the tokens from first up to last were replaced by the tokens in the changed range
+        added = len(self.buffer) - count
+        first, last = changed.start, changed.stop - added
+        if first == last == changed.stop:
+            return self.code
+        starts = self.stmt_starts
+        if first < self.stmt_start(0) or last > self.stmt_start(len(starts) - 1):
+            return self.compile(self.buffer.text)
+
+        # the stmts from k0 up to k1 have a replaced token, or a replaced token right after them which
+        # they were reduced on. we parse their tokens again as stmts
+        k0 = max(self.stmts_before(first) - 1, 0)
+        k1 = min(max(self.stmts_before(last), k0 + 1), len(starts) - 1)
+        stop = self.stmt_start(k1) + added
+        new_codes = []
+        new_starts = array("i")
+        n = self.stmt_start(k0)
+        messages = io.StringIO()
+        with contextlib.redirect_stderr(messages):
+            while n < stop:
+                stmt = self.parser.parse_subtree(self.buffer.tokens(n), self.stmt_states)
+                if stmt is None:
+                    break
+                new_codes.append(clean_newlines(stmt.value.generated_code))
+                new_starts.append(n)
+                n = self.buffer.find(stmt.end)
+        if n != stop:
+            # the new tokens aren't stmts that end where the old ones did
+            return self.compile(self.buffer.text)
+        # the other stmts had no errors, so these are all of the program's error messages
+        sys.stderr.write(messages.getvalue())
+        if self.parser.errors_detected:
+            self.code = None
+            return None
+
+        self.ragged_stmts += sum(code.endswith("\n") for code in new_codes)
+        self.ragged_stmts -= sum(code.endswith("\n") for code in self.stmt_codes[k0:k1])
+        self.stmt_codes[k0:k1] = new_codes
+        # the stmts after the edit start 'added' tokens later
+        self.move_starts_shift(k1)
+        starts[k0:k1] = new_starts
+        self.starts_shift_from = k0 + len(new_starts)
+        self.starts_shift += added
+        self.code = self.output()
+        return self.code
+
+    # returns the token number where stmt k starts, or the end of the last stmt for k of the number of stmts
+    def stmt_start(self, k: int):
+        if k >= self.starts_shift_from:
+            return self.stmt_starts[k] + self.starts_shift
+        return self.stmt_starts[k]
+
+    # returns the number of stmts that start before token n
+    def stmts_before(self, n: int):
+        starts, shift_from = self.stmt_starts, self.starts_shift_from
+        k = bisect_left(starts, n, 0, min(shift_from, len(starts)))
+        if k == shift_from:
+            k = bisect_left(starts, n - self.starts_shift, k)
+        return k
+
+    # moves the start of the shift to stmt k, which costs the number of stmts it moves over.
+    # edits near each other, like when typing, move it only a little
+    def move_starts_shift(self, k: int):
+        starts, shift_from, shift = self.stmt_starts, self.starts_shift_from, self.starts_shift
+        if k > shift_from:
+            starts[shift_from:k] = array("i", [start + shift for start in starts[shift_from:k]])
+        elif k < shift_from:
+            starts[k:shift_from] = array("i", [start - shift for start in starts[k:shift_from]])
+        self.starts_shift_from = k
+
+    # returns the output for the code of the stmts, which is reparse_output() of their code joined with
+    # newlines. cleaning the newlines of all of the code takes long for a large program, so the code of every
+    # stmt is cleaned when it's generated, and we only need to leave out the stmts without code
+    def output(self):
+        if self.ragged_stmts:
+            return reparse_output("\n".join(self.stmt_codes))
+        lines = list(filter(None, self.stmt_codes))
+        # stmts without code after the last code leave a newline in the end, and no code is an empty line
+        last = len(self.stmt_codes) - 1
+        while last >= 0 and not self.stmt_codes[last]:
+            last -= 1
+        if 0 <= last < len(self.stmt_codes) - 1 or not lines:
+            lines.append("")
+        return output_lines(lines)
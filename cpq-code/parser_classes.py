@@ -1,6 +1,7 @@
 """ Written by Ilai Azaria, 2024
-    This module defines the classes used for the parser. Specifically we only have the
-    'CodeConstruct' class, which is the data structure used in generating code
+    This module defines the classes used for the parser. Specifically we have the
+    'CodeConstruct' class, which is the data structure used in generating code,
+    and the 'StmtListConstruct' class for the code of a stmtlist
 """
 
 
@@ -18,3 +19,23 @@ class CodeConstruct:
     def __init__(self, generated_code: str, retval_var: str = ""):
         self.generated_code = generated_code
         self.retval_var = retval_var
+
+
+# this is the code construct of a stmtlist
+class StmtListConstruct(CodeConstruct):
+    """
+    The code of a stmtlist is the code of each of its stmts after a newline.
+    Adding each stmt's code to one string copies the code of all of the stmts before it,
+    which takes quadratic time in the number of stmts. So we keep the stmts' code in a list
+    and join it only when the stmtlist's generated code is used.
+    """
+
+    def __init__(self):
+        self.stmt_codes: list[str] = []
+        self.retval_var = ""
+
+    @property
+    def generated_code(self):
+        if not self.stmt_codes:
+            return ""
+        return "\n" + "\n".join(self.stmt_codes)
@@ -0,0 +1,892 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the QUAD runtime, which loads the QUAD code that the compiler generates
+    and runs it
+"""
+
+import gc
+import itertools
+import mmap
+import operator
+import os
+import stat
+import struct
+import sys
+from array import array
+
+from utils import SIGNATURE_LINE, error_print
+
+# the opcodes of the decoded instructions. the arithmetic opcodes come first and the comparisons
+# after them, so that the interpreter finds them with one comparison of the opcode
+(
+    IADD,
+    ISUB,
+    IMLT,
+    IDIV,
+    RADD,
+    RSUB,
+    RMLT,
+    RDIV,
+    IEQL,
+    INQL,
+    ILSS,
+    IGRT,
+    REQL,
+    RNQL,
+    RLSS,
+    RGRT,
+    IASN,
+    RASN,
+    JMPZ,
+    JUMP,
+    ITOR,
+    RTOI,
+    IINP,
+    RINP,
+    IPRT,
+    RPRT,
+    HALT,
+) = range(27)
+
+# the opcode of each QUAD instruction and the kinds of its operands: 'I' and 'R' are an int and a float
+# variable that the instruction sets, 'i' and 'r' are an int and a float variable or number that it
+# reads, and 'L' is a label
+INSTRUCTIONS = {
+    "IADD": (IADD, "Iii"),
+    "ISUB": (ISUB, "Iii"),
+    "IMLT": (IMLT, "Iii"),
+    "IDIV": (IDIV, "Iii"),
+    "RADD": (RADD, "Rrr"),
+    "RSUB": (RSUB, "Rrr"),
+    "RMLT": (RMLT, "Rrr"),
+    "RDIV": (RDIV, "Rrr"),
+    "IEQL": (IEQL, "Iii"),
+    "INQL": (INQL, "Iii"),
+    "ILSS": (ILSS, "Iii"),
+    "IGRT": (IGRT, "Iii"),
+    "REQL": (REQL, "Irr"),
+    "RNQL": (RNQL, "Irr"),
+    "RLSS": (RLSS, "Irr"),
+    "RGRT": (RGRT, "Irr"),
+    "IASN": (IASN, "Ii"),
+    "RASN": (RASN, "Rr"),
+    "JMPZ": (JMPZ, "Li"),
+    "JUMP": (JUMP, "L"),
+    "ITOR": (ITOR, "Ri"),
+    "RTOI": (RTOI, "Ir"),
+    "IINP": (IINP, "I"),
+    "RINP": (RINP, "R"),
+    "IPRT": (IPRT, "i"),
+    "RPRT": (RPRT, "r"),
+    "HALT": (HALT, ""),
+}
+
+
+# this is the exception for errors in QUAD code, while loading it or while running it
+class QuadError(Exception):
+    pass
+
+
+# int division truncates toward zero, like in C
+def int_divide(a, b):
+    if b == 0:
+        raise QuadError("division by zero")
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def float_divide(a, b):
+    if b == 0:
+        raise QuadError("division by zero")
+    return a / b
+
+
+# the function of each arithmetic and comparison opcode, by the opcode
+FUNCTIONS = [
+    operator.add,
+    operator.sub,
+    operator.mul,
+    int_divide,
+    operator.add,
+    operator.sub,
+    operator.mul,
+    float_divide,
+    operator.eq,
+    operator.ne,
+    operator.lt,
+    operator.gt,
+    operator.eq,
+    operator.ne,
+    operator.lt,
+    operator.gt,
+]
+
+
+# checks if an operand is a number and not a variable
+def is_number(word: str):
+    return word[0] in "0123456789.+-"
+
+
+# this is the QUAD program class
+class QuadProgram:
+    """
+    A QUAD program is decoded once, when it's loaded, into a list of instructions that are tuples of
+    an opcode and 3 operands (unused operands are 0). Every variable and every number of the program
+    has a slot in the memory of the machine that runs it, and the operands are the indices of the slots,
+    or the index of the instruction after a label for a jump. The numbers' slots are set to their values
+    before the program runs, so the instructions read numbers and variables the same way.
+    A variable is an int or a float by the instructions that use it, and starts as 0.
+    """
+
+    def __init__(self):
+        self.code: list[tuple] = []  # the instructions
+        self.lines: list[int] = []  # the line of each instruction in the QUAD code
+        self.memory: list = []  # the values of the slots before the program runs
+        self.names: list[str] = []  # the name of the variable or the number of each slot
+        self.variables: dict[str, int] = {}  # the slot of each variable
+        self.numbers: dict[tuple, int] = {}  # the slot of each number, by its kind and its text
+        self.labels: dict[str, int] = {}  # the instruction after each label
+        self.slots: dict[tuple, int] = {}  # the slot of each operand that was decoded, by its text and kind
+
+    # returns the slot of an operand of kind 'kind'
+    def slot(self, word: str, kind: str):
+        key = (word, kind)
+        if key in self.slots:
+            return self.slots[key]
+        self.slots[key] = slot = self.new_slot(word, kind)
+        return slot
+
+    # returns the slot of an operand that wasn't decoded before with this kind
+    def new_slot(self, word: str, kind: str):
+        if is_number(word):
+            if kind in "IR":
+                raise QuadError(f"can't set the number {word}")
+            key = (kind, word)
+            if key not in self.numbers:
+                try:
+                    value = int(word) if kind == "i" else float(word)
+                except ValueError:
+                    raise QuadError(f"{word} isn't an {'int' if kind == 'i' else 'float'} number")
+                self.numbers[key] = self.add_slot(word, value)
+            return self.numbers[key]
+        value = 0 if kind in "Ii" else 0.0
+        if word not in self.variables:
+            self.variables[word] = self.add_slot(word, value)
+        slot = self.variables[word]
+        if type(self.memory[slot]) is not type(value):
+            raise QuadError(f"the variable {word} is used as an int and as a float")
+        return slot
+
+    # returns the first instruction of each basic block of the program, in order. a block starts at the
+    # beginning, at a label that a jump jumps to and after a jump or a HALT
+    def block_starts(self):
+        starts = {0}
+        for n, (op, a, b, c) in enumerate(self.code):
+            if op == JMPZ or op == JUMP:
+                starts.add(a)
+            if op == JMPZ or op == JUMP or op == HALT:
+                starts.add(n + 1)
+        return sorted(start for start in starts if start < len(self.code))
+
+    def add_slot(self, name: str, value):
+        self.names.append(name)
+        self.memory.append(value)
+        return len(self.memory) - 1
+
+    # decodes the instruction in the words of a line of QUAD code
+    def decode(self, words: list[str], jumps: list):
+        if words[0] not in INSTRUCTIONS:
+            raise QuadError(f"unknown instruction {words[0]}")
+        opcode, kinds = INSTRUCTIONS[words[0]]
+        if len(words) - 1 != len(kinds):
+            raise QuadError(f"{words[0]} takes {len(kinds)} operands")
+        slots = self.slots
+        operands = [0, 0, 0]
+        for n in range(len(kinds)):
+            key = (words[n + 1], kinds[n])
+            if key in slots:
+                operands[n] = slots[key]
+            elif kinds[n] == "L":
+                # the label may come later, we resolve all of the jumps in the end
+                jumps.append((len(self.code), n, words[n + 1]))
+            else:
+                operands[n] = self.slot(*key)
+        return (opcode, *operands)
+
+
+# decodes the text of a QUAD program. errors are QuadErrors with the line of the error
+def load_quad(text: str):
+    program = QuadProgram()
+    jumps = []
+    lineno = 0
+    for lineno, line in enumerate(text.splitlines(), 1):
+        words = line.split()
+        if not words or words[0][0] == "-" and line.strip() == SIGNATURE_LINE:
+            continue
+        try:
+            if words[0][-1] == ":" and len(words) == 1:
+                label = words[0][:-1]
+                if label in program.labels:
+                    raise QuadError(f"the label {label} is defined twice")
+                program.labels[label] = len(program.code)
+                continue
+            program.code.append(program.decode(words, jumps))
+            program.lines.append(lineno)
+        except QuadError as e:
+            raise QuadError(f"line {lineno}: {e}") from None
+
+    # the program halts when it runs past its last instruction
+    program.code.append((HALT, 0, 0, 0))
+    program.lines.append(lineno)
+    for n, operand, label in jumps:
+        if label not in program.labels:
+            raise QuadError(f"line {program.lines[n]}: the label {label} isn't defined")
+        instruction = list(program.code[n])
+        instruction[operand + 1] = program.labels[label]
+        program.code[n] = tuple(instruction)
+    return program
+
+
+# loads a QUAD program file, which is QUAD code or QUAD bytecode if it ends with .qbc
+def load_quad_file(filename: str):
+    if filename.endswith(BYTECODE_EXTENSION):
+        return load_bytecode_file(filename)
+    with open(filename, "r") as file:
+        return load_quad(file.read())
+
+
+# the QUAD bytecode is a binary file of a decoded program, which is loaded without decoding the QUAD
+# code again. after the header it has the kind of each slot, the value of each slot before the program
+# runs, the instruction after each label, the instructions, the line of each instruction, and the names
+# of the slots and of the labels, separated by newlines. each section is an array of fixed size items,
+# so it's unpacked as a whole. an instruction is 4 unsigned 32 bit numbers, the opcode and the operands,
+# with the jumps' labels already resolved to the instructions after them
+BYTECODE_EXTENSION = ".qbc"
+BYTECODE_MAGIC = b"QBC\0"
+BYTECODE_VERSION = 1
+# the magic, the version, the number of instructions, the number of slots, the number of labels and the
+# size of the names
+BYTECODE_HEADER = struct.Struct("<4sIIIII")
+BYTECODE_INSTRUCTION = struct.Struct("<4I")
+
+# the kinds of the slots. the kinds of float slots are odd. an int number that doesn't fit in 64 bits
+# has the value 0, and its value is read from its name
+INT_VARIABLE, FLOAT_VARIABLE, INT_NUMBER, FLOAT_NUMBER, LARGE_INT_NUMBER = range(5)
+
+
+# returns the bytes of the items of an array of 'typecode', in little endian order
+def pack_array(typecode: str, items):
+    items = array(typecode, items)
+    if sys.byteorder == "big":
+        items.byteswap()
+    return items.tobytes()
+
+
+# returns the list of the items of an array of 'typecode' in little endian bytes
+def unpack_array(typecode: str, data):
+    items = array(typecode)
+    items.frombytes(data)
+    if sys.byteorder == "big":
+        items.byteswap()
+    return items.tolist()
+
+
+# returns the QUAD bytecode of a program
+def dump_bytecode(program: QuadProgram):
+    numbers = set(program.numbers.values())
+    kinds = bytearray()
+    values = []
+    for slot, value in enumerate(program.memory):
+        if type(value) is float:
+            kinds.append(FLOAT_NUMBER if slot in numbers else FLOAT_VARIABLE)
+            value = struct.unpack("<q", struct.pack("<d", value))[0]
+        elif slot in numbers:
+            large = not -(2**63) <= value < 2**63
+            kinds.append(LARGE_INT_NUMBER if large else INT_NUMBER)
+            value = 0 if large else value
+        else:
+            kinds.append(INT_VARIABLE)
+        values.append(value)
+    code = [operand for instruction in program.code for operand in instruction]
+    names = "\n".join([*program.names, *program.labels]).encode()
+    header = BYTECODE_HEADER.pack(
+        BYTECODE_MAGIC, BYTECODE_VERSION, len(program.code), len(kinds), len(program.labels), len(names)
+    )
+    return b"".join(
+        [
+            header,
+            kinds,
+            pack_array("q", values),
+            pack_array("I", program.labels.values()),
+            pack_array("I", code),
+            pack_array("I", program.lines),
+            names,
+        ]
+    )
+
+
+# decodes the QUAD bytecode in a buffer. the instructions are unpacked from the buffer as they are, and
+# only their bounds are checked, so bytecode that wasn't written by dump_bytecode may fail when it runs
+def load_bytecode(buffer):
+    if len(buffer) < BYTECODE_HEADER.size:
+        raise QuadError("the bytecode is truncated")
+    magic, version, code_size, slot_count, label_count, names_size = BYTECODE_HEADER.unpack_from(buffer)
+    if magic != BYTECODE_MAGIC or version != BYTECODE_VERSION:
+        raise QuadError(f"the file isn't QUAD bytecode of version {BYTECODE_VERSION}")
+    values_start = BYTECODE_HEADER.size + slot_count
+    targets_start = values_start + slot_count * 8
+    code_start = targets_start + label_count * 4
+    lines_start = code_start + code_size * BYTECODE_INSTRUCTION.size
+    names_start = lines_start + code_size * 4
+    if len(buffer) != names_start + names_size or code_size == 0:
+        raise QuadError("the bytecode is truncated")
+    names = bytes(buffer[names_start:]).decode().split("\n") if slot_count + label_count else []
+    if len(names) != slot_count + label_count:
+        raise QuadError("the bytecode has a wrong number of names")
+
+    program = QuadProgram()
+    kinds = bytes(buffer[BYTECODE_HEADER.size : values_start])
+    if kinds and max(kinds) > LARGE_INT_NUMBER:
+        raise QuadError(f"unknown slot kind {max(kinds)} in the bytecode")
+    ints = unpack_array("q", buffer[values_start:targets_start])
+    floats = unpack_array("d", buffer[values_start:targets_start])
+    program.names = names[:slot_count]
+    program.memory = [real if kind & 1 else integer for kind, integer, real in zip(kinds, ints, floats)]
+    for slot, kind in enumerate(kinds):
+        if kind == LARGE_INT_NUMBER:
+            program.memory[slot] = int(program.names[slot])
+    program.variables = {program.names[slot]: slot for slot, kind in enumerate(kinds) if kind < INT_NUMBER}
+    program.numbers = {
+        ("r" if kind & 1 else "i", program.names[slot]): slot for slot, kind in enumerate(kinds) if kind >= INT_NUMBER
+    }
+    program.labels = dict(zip(names[slot_count:], unpack_array("I", buffer[targets_start:code_start])))
+
+    program.code = list(BYTECODE_INSTRUCTION.iter_unpack(buffer[code_start:lines_start]))
+    program.lines = unpack_array("I", buffer[lines_start:names_start])
+    ops, a, b, c = zip(*program.code)
+    if max(ops) > HALT or max(max(a), max(b), max(c)) >= max(slot_count, code_size):
+        raise QuadError("the bytecode has an instruction that isn't valid")
+    if program.code[-1][0] != HALT:
+        raise QuadError("the bytecode doesn't end with HALT")
+    return program
+
+
+# loads a QUAD bytecode file. the file is memory mapped and the sections are unpacked from the mapped
+# pages. the garbage collector is paused while the program is built, since it would scan its growing
+# lists and dicts again and again, and none of them are garbage
+def load_bytecode_file(filename: str):
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise QuadError("the bytecode is truncated")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with mapped, memoryview(mapped) as view:
+            return load_bytecode(view)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def dump_bytecode_file(program: QuadProgram, filename: str):
+    with open(filename, "wb") as file:
+        file.write(dump_bytecode(program))
+
+
+# the number of characters that the machines read from their input at a time
+INPUT_CHUNK_SIZE = 1 << 16
+# the number of output lines that the machines keep before they write them
+OUTPUT_BUFFER_SIZE = 1 << 12
+
+
+# returns True if a source is a terminal or a pipe, which are read a line at a time, since reading a
+# chunk of them would wait for more input than the program needs
+def is_interactive(source):
+    try:
+        return not stat.S_ISREG(os.fstat(source.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        # a source without a file, like io.StringIO, has all of its input already
+        return False
+
+
+# this is the class of the input of a QUAD machine
+class QuadInput:
+    """
+    The input is read from 'source', which has a read(size) and a readline() method that return text,
+    or '' at its end, like a text file, io.StringIO or NumberSource. It's read 'chunk_size' characters at
+    a time, or a line at a time if 'chunk_size' is 0, and each chunk is split into its whitespace
+    separated words at once. A word that the chunk cuts is completed by the next chunk.
+    'before_read' is called before each chunk is read, or is None.
+    """
+
+    def __init__(self, source, chunk_size: int = INPUT_CHUNK_SIZE, before_read=None):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.before_read = before_read
+        self.words = iter(())  # the words of the last chunk that weren't read
+        self.partial = ""  # the end of the last chunk, which may be the beginning of a word. None at the end
+
+    # reads the next number of the input with 'convert'
+    def read_number(self, convert):
+        word = next(self.words, None)
+        if word is None:
+            word = self.next_word()
+        try:
+            return convert(word)
+        except ValueError:
+            raise QuadError(f"{word!r} in the input isn't a number of the right type") from None
+
+    # reads chunks until one of them has a word, and returns it
+    def next_word(self):
+        while self.partial is not None:
+            if self.before_read is not None:
+                self.before_read()
+            text = self.source.read(self.chunk_size) if self.chunk_size else self.source.readline()
+            if not text:
+                words, self.partial = self.partial.split(), None
+            else:
+                text = self.partial + text
+                words = text.split()
+                self.partial = words.pop() if words and not text[-1].isspace() else ""
+            self.words = iter(words)
+            word = next(self.words, None)
+            if word is not None:
+                return word
+        raise QuadError("the input ended")
+
+
+# this is the class of the output of a QUAD machine
+class QuadOutput:
+    """
+    The output lines are written to 'sink', which has a write(text) method, like a text file, io.StringIO
+    or NumberSink. The lines are kept in a list, and they are joined and written when there are
+    'buffer_size' of them, when flush() is called and when the machine halts or fails. 'buffer_size' 0
+    writes each line when it's written, and None keeps all of the lines until they are flushed.
+    The interpreters append to 'lines' and check its size themselves, which is faster than calling write().
+    """
+
+    def __init__(self, sink, buffer_size: int = OUTPUT_BUFFER_SIZE):
+        self.sink = sink
+        self.buffer_size = sys.maxsize if buffer_size is None else buffer_size
+        self.lines: list[str] = []
+        if buffer_size is None:
+            self.write = self.lines.append
+
+    def write(self, line: str):
+        lines = self.lines
+        lines.append(line)
+        if len(lines) >= self.buffer_size:
+            self.flush()
+
+    # writes the lines to the sink, and flushes the sink if it can be flushed
+    def flush(self):
+        if self.lines:
+            self.sink.write("".join(self.lines))
+            self.lines.clear()
+            if hasattr(self.sink, "flush"):
+                self.sink.flush()
+
+
+# this is the class of an input of numbers in memory, for programs that run QUAD machines
+class NumberSource:
+    """
+    The source reads the numbers of an iterable, as the words of the input, when the machine reads them,
+    so the iterable can be a generator of more numbers than fit in memory. The numbers are read like the
+    numbers of a text input, so an int can be read into a float variable but a float can't be read into
+    an int variable.
+    """
+
+    def __init__(self, numbers):
+        self.numbers = iter(numbers)
+
+    def read(self, size: int = -1):
+        numbers = self.numbers if size < 0 else itertools.islice(self.numbers, max(size // 16, 1))
+        text = "\n".join(map(str, numbers))
+        return f"{text}\n" if text else ""
+
+    def readline(self):
+        return self.read(1)
+
+
+# this is the class of an output of numbers in memory, for programs that run QUAD machines
+class NumberSink:
+    """
+    The sink keeps the numbers that the machine writes in 'numbers', as ints and floats.
+    """
+
+    def __init__(self):
+        self.numbers: list = []
+
+    def write(self, text: str):
+        self.numbers += [int(word) if word.lstrip("-").isdigit() else float(word) for word in text.split()]
+
+
+# this is the QUAD machine class, which runs a QUAD program
+class QuadMachine:
+    """
+    The machine reads the numbers of the input instructions from the whitespace separated words of
+    'stdin', and writes each output number on a line of 'stdout'. Floats are written like str() writes them.
+    After run(), 'memory' has the values of the slots and 'steps' is the number of instructions that ran.
+
+    The input is read in chunks of 'chunk_size' characters and the output is written every 'buffer_size'
+    lines (see QuadInput and QuadOutput). By default a terminal or a pipe is read a line at a time, and
+    the output is flushed before the input is read, so that a user or a program that talks with the
+    machine sees the output before it writes the next input. 'flush_on_input' sets that explicitly.
+    """
+
+    def __init__(
+        self,
+        program: QuadProgram,
+        stdin=None,
+        stdout=None,
+        chunk_size: int = None,
+        buffer_size: int = OUTPUT_BUFFER_SIZE,
+        flush_on_input: bool = None,
+    ):
+        self.program = program
+        self.stdin = sys.stdin if stdin is None else stdin
+        self.stdout = sys.stdout if stdout is None else stdout
+        self.memory = list(program.memory)
+        self.steps = 0
+        interactive = is_interactive(self.stdin)
+        if chunk_size is None:
+            chunk_size = 0 if interactive else INPUT_CHUNK_SIZE
+        if flush_on_input is None:
+            flush_on_input = interactive
+        self.output = QuadOutput(self.stdout, buffer_size)
+        self.input = QuadInput(self.stdin, chunk_size, self.output.flush if flush_on_input else None)
+
+    # reads the next number of the input with 'convert'
+    def read_number(self, convert):
+        return self.input.read_number(convert)
+
+    # returns the value of a variable
+    def value(self, name: str):
+        return self.memory[self.program.variables[name]]
+
+    # runs the program from its first instruction until it halts. errors are QuadErrors with the line
+    # of the instruction that failed. the output is flushed when the program halts or fails
+    def run(self):
+        try:
+            self.execute()
+        finally:
+            self.output.flush()
+
+    # runs the program, the machine classes run it in their own way
+    def execute(self):
+        code, mem, functions = self.program.code, self.memory, FUNCTIONS
+        lines, buffer_size, read_number = self.output.lines, self.output.buffer_size, self.input.read_number
+        # 'start' is the first instruction since the last jump, and we count the instructions that ran
+        # only when we jump, instead of after every instruction
+        pc = start = 0
+        try:
+            while True:
+                op, a, b, c = code[pc]
+                pc += 1
+                if op < IEQL:
+                    mem[a] = functions[op](mem[b], mem[c])
+                elif op < IASN:
+                    mem[a] = 1 if functions[op](mem[b], mem[c]) else 0
+                elif op <= RASN:
+                    mem[a] = mem[b]
+                elif op == JMPZ:
+                    if not mem[b]:
+                        self.steps += pc - start
+                        pc = start = a
+                elif op == JUMP:
+                    self.steps += pc - start
+                    pc = start = a
+                elif op == ITOR:
+                    mem[a] = float(mem[b])
+                elif op == RTOI:
+                    mem[a] = int(mem[b])
+                elif op == IINP:
+                    mem[a] = read_number(int)
+                elif op == RINP:
+                    mem[a] = read_number(float)
+                elif op <= RPRT:
+                    lines.append(f"{mem[a]}\n")
+                    if len(lines) >= buffer_size:
+                        self.output.flush()
+                else:
+                    break
+        except (QuadError, OverflowError, ValueError) as e:
+            self.steps += pc - start
+            raise self.runtime_error(e, pc - 1) from None
+        self.steps += pc - start
+
+    # returns the QuadError for the error 'e' of instruction n. OverflowErrors and ValueErrors are
+    # from converting an infinite float or a nan to an int, or an int that's too large to a float or
+    # to a string
+    def runtime_error(self, e: Exception, n: int):
+        op, a, b, c = self.program.code[n]
+        if isinstance(e, QuadError):
+            message = str(e)
+        elif op == RTOI:
+            message = f"can't convert {self.memory[b]} to an int"
+        else:
+            message = f"the int is too large to {'convert to a float' if op == ITOR else 'print'}"
+        return QuadError(f"line {self.program.lines[n]}: {message}")
+
+
+# this is the closure threaded QUAD machine class
+class ThreadedQuadMachine(QuadMachine):
+    """
+    This machine runs a program like QuadMachine, but first turns the instructions into closures that
+    run them, with their operands bound, so running an instruction needs no decoding and no dispatch.
+    The closures of each basic block are run one after the other, and the closure of the block's jump
+    returns the index of the next block to run, or None when the program halts.
+
+    Calling a closure costs about as much as the dispatch of QuadMachine, so pairs of instructions that
+    the compiler generates together get one closure: an arithmetic instruction and the assignment of
+    its result, and a comparison and the JMPZ of its result. Both instructions still run, so the
+    memory after the pair is the same.
+    """
+
+    # returns the closure that runs the instructions from n, and the number of instructions it runs.
+    # 'end' is the end of the block, and jumps get the block indices of their targets from 'blocks'
+    def thread(self, n: int, end: int, blocks: dict):
+        code = self.program.code
+        op, a, b, c = code[n]
+        following_op, d, e, _ = code[n + 1] if n + 1 < end else (None, None, None, None)
+        if op < IEQL and following_op in (IASN, RASN) and e == a:
+            instruction = self.thread_assigned(op, a, b, c, d)
+            count = 2
+        elif IEQL <= op < IASN and following_op == JMPZ and e == a:
+            instruction = self.thread_branch(op, a, b, c, blocks[d], blocks[n + 2])
+            count = 2
+        else:
+            instruction = self.thread_single(n, blocks)
+            count = 1
+        # the instruction that failed is found by its closure. only the first of a pair can fail
+        instruction.index = n
+        return instruction, count
+
+    # returns the closure of an arithmetic instruction whose result is assigned to slot d
+    def thread_assigned(self, op: int, a: int, b: int, c: int, d: int):
+        mem = self.memory
+        if op == IADD or op == RADD:
+
+            def instruction():
+                mem[a] = mem[d] = mem[b] + mem[c]
+
+        elif op == ISUB or op == RSUB:
+
+            def instruction():
+                mem[a] = mem[d] = mem[b] - mem[c]
+
+        elif op == IMLT or op == RMLT:
+
+            def instruction():
+                mem[a] = mem[d] = mem[b] * mem[c]
+
+        else:
+            divide = FUNCTIONS[op]
+
+            def instruction():
+                mem[a] = mem[d] = divide(mem[b], mem[c])
+
+        return instruction
+
+    # returns the closure of a comparison and the JMPZ to block 'target' on its result. 'following' is
+    # the block after the JMPZ
+    def thread_branch(self, op: int, a: int, b: int, c: int, target: int, following: int):
+        mem = self.memory
+        if op == IEQL or op == REQL:
+
+            def instruction():
+                if mem[b] == mem[c]:
+                    mem[a] = 1
+                    return following
+                mem[a] = 0
+                return target
+
+        elif op == INQL or op == RNQL:
+
+            def instruction():
+                if mem[b] != mem[c]:
+                    mem[a] = 1
+                    return following
+                mem[a] = 0
+                return target
+
+        elif op == ILSS or op == RLSS:
+
+            def instruction():
+                if mem[b] < mem[c]:
+                    mem[a] = 1
+                    return following
+                mem[a] = 0
+                return target
+
+        else:
+
+            def instruction():
+                if mem[b] > mem[c]:
+                    mem[a] = 1
+                    return following
+                mem[a] = 0
+                return target
+
+        return instruction
+
+    # returns the closure of instruction n
+    def thread_single(self, n: int, blocks: dict):
+        op, a, b, c = self.program.code[n]
+        mem = self.memory
+        if op == IADD or op == RADD:
+
+            def instruction():
+                mem[a] = mem[b] + mem[c]
+
+        elif op == ISUB or op == RSUB:
+
+            def instruction():
+                mem[a] = mem[b] - mem[c]
+
+        elif op == IMLT or op == RMLT:
+
+            def instruction():
+                mem[a] = mem[b] * mem[c]
+
+        elif op == IDIV or op == RDIV:
+            divide = FUNCTIONS[op]
+
+            def instruction():
+                mem[a] = divide(mem[b], mem[c])
+
+        elif op == IEQL or op == REQL:
+
+            def instruction():
+                mem[a] = 1 if mem[b] == mem[c] else 0
+
+        elif op == INQL or op == RNQL:
+
+            def instruction():
+                mem[a] = 1 if mem[b] != mem[c] else 0
+
+        elif op == ILSS or op == RLSS:
+
+            def instruction():
+                mem[a] = 1 if mem[b] < mem[c] else 0
+
+        elif op == IGRT or op == RGRT:
+
+            def instruction():
+                mem[a] = 1 if mem[b] > mem[c] else 0
+
+        elif op == IASN or op == RASN:
+
+            def instruction():
+                mem[a] = mem[b]
+
+        elif op == JMPZ:
+            target, following = blocks[a], blocks[n + 1]
+
+            def instruction():
+                return following if mem[b] else target
+
+        elif op == JUMP:
+            target = blocks[a]
+
+            def instruction():
+                return target
+
+        elif op == ITOR:
+
+            def instruction():
+                mem[a] = float(mem[b])
+
+        elif op == RTOI:
+
+            def instruction():
+                mem[a] = int(mem[b])
+
+        elif op == IINP or op == RINP:
+            read_number, convert = self.input.read_number, int if op == IINP else float
+
+            def instruction():
+                mem[a] = read_number(convert)
+
+        elif op == IPRT or op == RPRT:
+            output = self.output
+            lines, buffer_size = output.lines, output.buffer_size
+
+            def instruction():
+                lines.append(f"{mem[a]}\n")
+                if len(lines) >= buffer_size:
+                    output.flush()
+
+        else:
+
+            def instruction():
+                return None
+
+        return instruction
+
+    # returns the closures of each block's instructions before its jump, and the closure of the jump.
+    # a block that doesn't end with a jump or a HALT gets a jump to the block after it
+    def thread_blocks(self):
+        code = self.program.code
+        starts = self.program.block_starts()
+        blocks = {start: block for block, start in enumerate(starts)}
+        blocks[len(code)] = len(starts)
+        bodies, jumps = [], []
+        for block, (start, end) in enumerate(zip(starts, [*starts[1:], len(code)])):
+            body, n = [], start
+            while n < end:
+                instruction, count = self.thread(n, end, blocks)
+                body.append(instruction)
+                n += count
+            if code[end - 1][0] in (JMPZ, JUMP, HALT):
+                jumps.append(body.pop())
+            else:
+                jumps.append(lambda following=block + 1: following)
+                jumps[-1].index = end - 1
+            bodies.append(body)
+        return starts, bodies, jumps
+
+    def execute(self):
+        starts, bodies, jumps = self.thread_blocks()
+        sizes = [end - start for start, end in zip(starts, [*starts[1:], len(self.program.code)])]
+        block, steps = 0, 0
+        try:
+            while block is not None:
+                for instruction in bodies[block]:
+                    instruction()
+                instruction = jumps[block]
+                following = instruction()
+                steps += sizes[block]
+                block = following
+        except (QuadError, OverflowError, ValueError) as e:
+            self.steps += steps + instruction.index - starts[block] + 1
+            raise self.runtime_error(e, instruction.index) from None
+        self.steps += steps
+
+
+# loads a QUAD program and runs it with the standard input and output
+def run_quad_file(filename: str, machine_class=QuadMachine):
+    try:
+        machine_class(load_quad_file(filename)).run()
+    except QuadError as e:
+        error_print(f"Error in QUAD program {filename}, {e}")
+    except OSError:
+        error_print(f"Error while trying to read the QUAD program {filename}...")
+
+
+# the runtime runs the QUAD program file that the user supplied, which is QUAD code or QUAD bytecode
+# if it ends with .qbc. with --threaded before the filename it runs it with the closure threaded machine
+def main():
+    args = sys.argv[1:]
+    machine_class = QuadMachine
+    if args[:1] == ["--threaded"]:
+        args = args[1:]
+        machine_class = ThreadedQuadMachine
+    if len(args) != 1:
+        error_print("Please provide the QUAD program filename! Aborting...")
+    else:
+        run_quad_file(args[0], machine_class)
+
+
+if __name__ == "__main__":
+    main()
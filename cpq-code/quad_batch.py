@@ -0,0 +1,398 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the batch QUAD machine, which runs a QUAD program on a whole batch of input
+    records at once with NumPy arrays. Unlike the rest of the compiler it needs NumPy
+"""
+
+import sys
+
+import numpy as np
+
+from quad import (
+    IADD,
+    IASN,
+    IDIV,
+    IEQL,
+    IGRT,
+    IINP,
+    ILSS,
+    IMLT,
+    INQL,
+    IPRT,
+    ISUB,
+    ITOR,
+    JMPZ,
+    JUMP,
+    RADD,
+    RASN,
+    RDIV,
+    REQL,
+    RGRT,
+    RINP,
+    RLSS,
+    RMLT,
+    RNQL,
+    RPRT,
+    RSUB,
+    RTOI,
+    QuadError,
+    load_quad_file,
+)
+from utils import error_print
+
+# the range of the batch machine's ints, which are 64 bit
+INT_MIN = np.iinfo(np.int64).min
+INT_MAX = np.iinfo(np.int64).max
+
+# the error message of an int that doesn't fit in 64 bits, like in the C backend's programs
+OVERFLOW_MESSAGE = "the int is too large for 64 bits"
+
+# the NumPy function of each float arithmetic opcode and each comparison opcode
+UFUNCS = {
+    RADD: np.add,
+    RSUB: np.subtract,
+    RMLT: np.multiply,
+    IEQL: np.equal,
+    INQL: np.not_equal,
+    ILSS: np.less,
+    IGRT: np.greater,
+    REQL: np.equal,
+    RNQL: np.not_equal,
+    RLSS: np.less,
+    RGRT: np.greater,
+}
+
+
+# this is the batch QUAD machine class
+class BatchQuadMachine:
+    """
+    The machine runs a QUAD program on many input records, which are its lanes. Every variable is an
+    array with its value in each lane, and each instruction is a NumPy operation on the arrays of the lanes
+    that run it. Each lane has the basic block it runs next, and the machine always runs the first block
+    that lanes are in, with only those lanes: lanes that took the two branches of an if run the code after
+    it together again, and lanes that left a loop wait for the lanes that are still in it, until all of the
+    lanes halted.
+
+    'inputs' is a 2D array with the numbers that each lane reads in its row, and 'counts' has the number
+    of inputs of each lane, all of its row by default. After run(), 'memory' has the arrays of the slots,
+    'steps' has the number of instructions that ran in each lane and output(lane) is the output of a lane,
+    like QuadMachine's. A lane stops at an error, and 'errors' has its QuadError by the lane.
+    The ints are 64 bit, so an int that overflows is an error, like in the C backend's programs.
+
+    While the machine runs, the arrays only have the lanes that may still run, in 'live' order: when most
+    of the lanes in the arrays halted, their values are moved to the arrays of all of the lanes and the
+    arrays are compacted, so lanes that halted early don't slow down the lanes that run longer.
+    """
+
+    def __init__(self, program, inputs, counts=None):
+        self.program = program
+        self.inputs = np.asarray(inputs)
+        if self.inputs.ndim != 2:
+            raise QuadError("the inputs aren't a 2D array of records")
+        self.lanes = len(self.inputs)
+        self.counts = np.full(self.lanes, self.inputs.shape[1]) if counts is None else np.asarray(counts)
+        self.positions = np.zeros(self.lanes, dtype=np.intp)  # the next input of each lane
+        self.live = np.arange(self.lanes)  # the lane of each index of the arrays
+        self.all_lanes = np.arange(self.lanes)  # all of the indices of the arrays
+        self.halted = 0  # the number of lanes in the arrays that halted or failed
+
+        # the numbers are NumPy scalars, and the variables are arrays
+        self.numbers = set(program.numbers.values())
+        self.dtypes = [np.int64 if isinstance(value, int) else np.float64 for value in program.memory]
+        self.memory = []
+        for slot, value in enumerate(program.memory):
+            if slot in self.numbers:
+                if isinstance(value, int) and not INT_MIN <= value <= INT_MAX:
+                    raise QuadError(f"the number {value} is too large for 64 bits")
+                self.memory.append(self.dtypes[slot](value))
+            else:
+                self.memory.append(np.zeros(self.lanes, dtype=self.dtypes[slot]))
+
+        starts = program.block_starts()
+        self.blocks = list(zip(starts, [*starts[1:], len(program.code)]))
+        self.block_of = {start: block for block, start in enumerate(starts)}
+        self.next_block = np.zeros(self.lanes, dtype=np.intp)  # the block each lane runs next
+        self.steps = np.zeros(self.lanes, dtype=np.int64)
+        # the arrays of all of the lanes, with the values of the lanes that were compacted out
+        self.variable_slots = [slot for slot in range(len(self.memory)) if slot not in self.numbers]
+        self.final_memory = {slot: self.memory[slot].copy() for slot in self.variable_slots}
+        self.final_steps = self.steps.copy()
+        self.errors: dict[int, QuadError] = {}
+        self.outputs: list[tuple] = []  # the lanes and the values of each output instruction that ran
+
+    # returns the array of a variable
+    def value(self, name: str):
+        return self.memory[self.program.variables[name]]
+
+    # returns the output of a lane, with each number on a line like QuadMachine writes it
+    def output(self, lane: int):
+        lines = []
+        for lanes, values in self.outputs:
+            n = np.searchsorted(lanes, lane)
+            if n < len(lanes) and lanes[n] == lane:
+                lines.append(f"{values[n].item()}\n")
+        return "".join(lines)
+
+    # returns the outputs of all of the lanes, a list of the numbers of each lane
+    def lane_outputs(self):
+        outputs = [[] for _ in range(self.lanes)]
+        for lanes, values in self.outputs:
+            for lane, value in zip(lanes.tolist(), values.tolist()):
+                outputs[lane].append(value)
+        return outputs
+
+    # runs the program in all of the lanes until they halt or fail
+    def run(self):
+        halted = len(self.blocks)
+        # float operations on inf and nan are fine, and ints that overflow are checked
+        with np.errstate(all="ignore"):
+            while len(self.live):
+                if self.halted * 2 > len(self.live):
+                    self.compact()
+                    continue
+                block = int(self.next_block.min())
+                if block == halted:
+                    break
+                lanes = np.flatnonzero(self.next_block == block)
+                self.run_block(block, None if len(lanes) == len(self.live) else lanes)
+        self.compact()
+        for slot in self.variable_slots:
+            self.memory[slot] = self.final_memory[slot]
+        self.steps = self.final_steps
+
+    # moves the values of the lanes that halted to the arrays of all of the lanes, and removes them from
+    # the arrays
+    def compact(self):
+        done = self.next_block == len(self.blocks)
+        lanes = self.live[done]
+        for slot in self.variable_slots:
+            self.final_memory[slot][lanes] = self.memory[slot][done]
+        self.final_steps[lanes] = self.steps[done]
+        keep = ~done
+        for slot in self.variable_slots:
+            self.memory[slot] = self.memory[slot][keep]
+        self.next_block = self.next_block[keep]
+        self.steps = self.steps[keep]
+        self.positions = self.positions[keep]
+        self.counts = self.counts[keep]
+        self.live = self.live[keep]
+        self.all_lanes = np.arange(len(self.live))
+        self.halted = 0
+
+    # returns the values of a slot in the lanes 'lanes', or None for all of the lanes
+    def load(self, slot: int, lanes):
+        if lanes is None or slot in self.numbers:
+            return self.memory[slot]
+        return self.memory[slot][lanes]
+
+    # sets the values of a slot in the lanes 'lanes', or None for all of the lanes
+    def store(self, slot: int, lanes, value):
+        if lanes is not None:
+            self.memory[slot][lanes] = value
+        elif np.ndim(value) == 0:
+            self.memory[slot] = np.full(len(self.live), value, dtype=self.dtypes[slot])
+        else:
+            self.memory[slot] = value.astype(self.dtypes[slot], copy=False)
+
+    # stops the lanes of 'lanes' where 'failed' is True at instruction n of a block that starts at 'start',
+    # with an error message of each of them. returns the lanes that didn't fail and the mask of them, which
+    # is None if no lane failed
+    def remove_failed(self, n: int, start: int, lanes, failed, messages):
+        failed = np.broadcast_to(failed, (len(self.live) if lanes is None else len(lanes),))
+        if not failed.any():
+            return lanes, None
+        lanes = self.all_lanes if lanes is None else lanes
+        line = self.program.lines[n]
+        failed_lanes = lanes[failed]
+        for lane, message in zip(self.live[failed_lanes].tolist(), messages(failed)):
+            self.errors[lane] = QuadError(f"line {line}: {message}")
+        self.next_block[failed_lanes] = len(self.blocks)
+        self.steps[failed_lanes] += n - start + 1
+        self.halted += len(failed_lanes)
+        keep = ~failed
+        return lanes[keep], keep
+
+    # runs a block in the lanes 'lanes', or None for all of the lanes
+    def run_block(self, block: int, lanes):
+        start, end = self.blocks[block]
+        code = self.program.code
+        following = block + 1
+        for n in range(start, end):
+            op, a, b, c = code[n]
+            # we only load the operands that the instruction reads, a program may have no slots at all
+            if op < IASN:
+                x, y = self.load(b, lanes), self.load(c, lanes)
+            elif op in (IASN, RASN, JMPZ, ITOR, RTOI):
+                x = self.load(b, lanes)
+            if op == IADD or op == ISUB or op == IMLT:
+                # 64 bit ints wrap around, and we find the lanes where they did
+                if op == IADD:
+                    result = x + y
+                    overflow = ((x ^ result) & (y ^ result)) < 0
+                elif op == ISUB:
+                    result = x - y
+                    overflow = ((x ^ y) & (x ^ result)) < 0
+                else:
+                    result = x * y
+                    nonzero = np.where(x == 0, 1, x)
+                    overflow = (x != 0) & ((result // nonzero != y) | ((x == -1) & (y == INT_MIN)))
+                lanes, keep = self.remove_failed(n, start, lanes, overflow, lambda failed: repeat(OVERFLOW_MESSAGE))
+                result = select(result, keep)
+            elif op == IDIV:
+                zero = y == 0
+                overflow = (x == INT_MIN) & (y == -1)
+                lanes, keep = self.remove_failed(
+                    n,
+                    start,
+                    lanes,
+                    zero | overflow,
+                    lambda failed: np.where(
+                        np.broadcast_to(zero, failed.shape)[failed], "division by zero", OVERFLOW_MESSAGE
+                    ).tolist(),
+                )
+                x, y = select(x, keep), select(y, keep)
+                # NumPy's // rounds down, and cpl's division truncates toward zero
+                result = x // y + (((x % y) != 0) & ((x < 0) != (y < 0)))
+            elif op == RDIV:
+                lanes, keep = self.remove_failed(n, start, lanes, y == 0, lambda failed: repeat("division by zero"))
+                result = select(x, keep) / select(y, keep)
+            elif op in UFUNCS:
+                result = UFUNCS[op](x, y)
+            elif op == IASN or op == RASN:
+                result = x.copy() if lanes is None and np.ndim(x) else x
+            elif op == ITOR:
+                result = np.asarray(x, dtype=np.float64)
+            elif op == RTOI:
+                finite = np.isfinite(x)
+                lanes, keep = self.remove_failed(
+                    n,
+                    start,
+                    lanes,
+                    ~finite | (x >= 2.0**63) | (x < -(2.0**63)),
+                    lambda failed: [
+                        f"can't convert {value} to an int" if value != value or value in (np.inf, -np.inf)
+                        else OVERFLOW_MESSAGE
+                        for value in np.broadcast_to(x, failed.shape)[failed].tolist()
+                    ],
+                )
+                result = np.trunc(select(x, keep)).astype(np.int64)
+            elif op == IINP or op == RINP:
+                lanes, result = self.read_inputs(n, start, lanes, op == IINP)
+            elif op == IPRT or op == RPRT:
+                value = self.load(a, lanes)
+                printed = self.all_lanes if lanes is None else lanes
+                self.outputs.append((self.live[printed], np.broadcast_to(value, printed.shape).copy()))
+                continue
+            elif op == JMPZ:
+                target = np.where(x == 0, self.block_of[a], self.block_of[n + 1])
+                self.end_block(lanes, target, end - start)
+                return
+            elif op == JUMP:
+                following = self.block_of[a]
+                break
+            else:
+                following = len(self.blocks)
+                self.halted += len(self.live) if lanes is None else len(lanes)
+                break
+
+            if lanes is not None and len(lanes) == 0:
+                # all of the lanes failed
+                return
+            self.store(a, lanes, result)
+        self.end_block(lanes, following, end - start)
+
+    # sets the block that the lanes run next, after they ran a block of 'size' instructions
+    def end_block(self, lanes, following, size: int):
+        if lanes is None:
+            self.next_block[:] = following
+            self.steps += size
+        else:
+            self.next_block[lanes] = following
+            self.steps[lanes] += size
+
+    # reads the next input of the lanes 'lanes', or None for all of the lanes, as ints or as floats.
+    # returns the lanes that didn't fail and the values they read
+    def read_inputs(self, n: int, start: int, lanes, integer: bool):
+        indices = self.all_lanes if lanes is None else lanes
+        positions = self.positions[indices]
+        ended = positions >= self.counts[indices]
+        lanes, keep = self.remove_failed(n, start, lanes, ended, lambda failed: repeat("the input ended"))
+        indices, positions = select(indices, keep), select(positions, keep)
+        values = self.inputs[self.live[indices], positions]
+        self.positions[indices] += 1
+        if not integer:
+            return lanes, values.astype(np.float64)
+        if values.dtype.kind != "f":
+            return lanes, values.astype(np.int64)
+        # a float input is read as an int if it's a whole number that fits in 64 bits
+        whole = np.isfinite(values) & (values == np.trunc(values))
+        large = whole & ((values >= 2.0**63) | (values < -(2.0**63)))
+        lanes, keep = self.remove_failed(
+            n,
+            start,
+            lanes,
+            ~whole | large,
+            lambda failed: [
+                OVERFLOW_MESSAGE if is_large else f"{str(value)!r} in the input isn't a number of the right type"
+                for value, is_large in zip(values[failed].tolist(), large[failed].tolist())
+            ],
+        )
+        return lanes, select(values, keep).astype(np.int64)
+
+
+# returns the values of an array in the lanes of 'keep', or the value itself if it's the same in all lanes
+def select(value, keep):
+    if keep is None or np.ndim(value) == 0:
+        return value
+    return value[keep]
+
+
+# returns an endless iterator of the same error message, for the lanes that failed
+def repeat(message: str):
+    while True:
+        yield message
+
+
+# reads a file of input records, one on each line with its numbers separated by whitespace. returns the
+# 2D array of the records and the number of inputs of each record. the array has ints if all of the
+# numbers are ints, and floats otherwise
+def read_records(filename: str):
+    with open(filename, "r") as file:
+        records = [line.split() for line in file]
+    counts = [len(words) for words in records]
+    width = max(counts, default=0)
+    for dtype, convert in ((np.int64, int), (np.float64, float)):
+        try:
+            rows = [[convert(word) for word in words] + [0] * (width - len(words)) for words in records]
+            return np.array(rows, dtype=dtype).reshape(len(records), width), counts
+        except (ValueError, OverflowError):
+            continue
+    raise QuadError("the records have a word that isn't a number")
+
+
+# runs a QUAD program on the records of a records file, and writes the outputs of each record on a line
+def run_batch_file(filename: str, records_filename: str):
+    try:
+        inputs, counts = read_records(records_filename)
+        machine = BatchQuadMachine(load_quad_file(filename), inputs, counts)
+        machine.run()
+    except QuadError as e:
+        error_print(f"Error in QUAD program {filename}, {e}")
+        return
+    except OSError:
+        error_print(f"Error while trying to read the QUAD program {filename} or its records...")
+        return
+    sys.stdout.write("".join(" ".join(map(str, numbers)) + "\n" for numbers in machine.lane_outputs()))
+    for lane in sorted(machine.errors):
+        error_print(f"Error in QUAD program {filename}, record {lane + 1}, {machine.errors[lane]}")
+
+
+# the batch runtime runs the QUAD program file that the user supplied on the records of the records file
+def main():
+    if len(sys.argv) != 3:
+        error_print("Please provide the QUAD program filename and the records filename! Aborting...")
+    else:
+        run_batch_file(sys.argv[1], sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
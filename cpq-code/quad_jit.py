@@ -0,0 +1,323 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the tracing QUAD machine, which interprets a QUAD program like QuadMachine, and
+    compiles the loops that run many times into Python functions while the program runs
+"""
+
+import sys
+
+from quad import (
+    FUNCTIONS,
+    HALT,
+    IADD,
+    IASN,
+    IDIV,
+    IEQL,
+    IGRT,
+    IINP,
+    ILSS,
+    IMLT,
+    INQL,
+    IPRT,
+    ISUB,
+    ITOR,
+    JMPZ,
+    JUMP,
+    RADD,
+    RASN,
+    RDIV,
+    REQL,
+    RGRT,
+    RINP,
+    RLSS,
+    RMLT,
+    RNQL,
+    RPRT,
+    RSUB,
+    RTOI,
+    QuadError,
+    QuadMachine,
+    float_divide,
+    int_divide,
+    load_quad_file,
+)
+from utils import error_print
+
+# the number of times that a loop jumps back to its first instruction before it's traced
+TRACE_THRESHOLD = 50
+# the maximal number of instructions in a trace. a longer loop isn't compiled
+MAX_TRACE_LENGTH = 1000
+
+# the python operator of each arithmetic and comparison opcode
+OPERATORS = {
+    IADD: "+",
+    ISUB: "-",
+    IMLT: "*",
+    RADD: "+",
+    RSUB: "-",
+    RMLT: "*",
+    RDIV: "/",
+    IEQL: "==",
+    INQL: "!=",
+    ILSS: "<",
+    IGRT: ">",
+    REQL: "==",
+    RNQL: "!=",
+    RLSS: "<",
+    RGRT: ">",
+}
+
+
+# this is the class of a trace, a loop that was compiled into a python function
+class Trace:
+    """
+    The function runs the instructions of one iteration of the loop, in the order they ran when it was
+    traced, again and again. Each JMPZ in the trace is a guard that checks that it jumps like it jumped
+    then, and when it doesn't, the function stores its local variables in the memory and returns the
+    number of the guard and the number of instructions that ran. 'exits' has the instruction that the
+    program continues at after each guard, and the number of the trace's instructions up to the guard.
+    When an instruction fails, the function returns the exception, and 'positions' has the position in
+    the trace of the instruction on each line of the function.
+    """
+
+    def __init__(self, instructions: list, source: str, exits: list, positions: dict):
+        self.instructions = instructions  # the instructions of the trace, in order
+        self.source = source
+        self.exits = exits
+        self.positions = positions
+        namespace = {"QuadError": QuadError, "int_divide": int_divide, "float_divide": float_divide}
+        exec(compile(source, f"<trace {instructions[0]}>", "exec"), namespace)
+        self.function = namespace["trace"]
+
+
+# this is the class that generates the python function of a trace
+class TraceCompiler:
+    """
+    QUAD is typed by its opcodes: a variable is an int or a float by the instructions that use it, so the
+    trace needs no type guards, and each instruction is compiled into the python operation of its opcode.
+    The variables that the trace uses are local variables of the function, and the numbers are constants.
+    An int division by a positive number and a float division by a number that isn't 0 can't fail, so
+    they are compiled into python's operators instead of calls.
+    """
+
+    def __init__(self, program, trace: list):
+        self.program = program
+        self.trace = trace  # the instructions that ran, and the instruction that ran after each of them
+        self.numbers = set(program.numbers.values())
+        self.lines = ["def trace(mem, read_number, write):"]
+        self.exits = []
+        self.positions = {}
+
+    # returns the python expression of a slot's value
+    def operand(self, slot: int):
+        if slot not in self.numbers:
+            return f"v{slot}"
+        value = self.program.memory[slot]
+        if value != value or value in (float("inf"), float("-inf")):
+            return f"float({repr(value)!r})"
+        return f"({value!r})" if value < 0 or repr(value)[0] == "-" else repr(value)
+
+    # returns the statement of an instruction that isn't a jump or a HALT
+    def statement(self, op: int, a: int, b: int, c: int):
+        x, y = self.operand(b), self.operand(c)
+        if op == IDIV:
+            if c in self.numbers and self.program.memory[c] > 0:
+                return f"v{a} = {x} // {y} if {x} >= 0 else -(-{x} // {y})"
+            return f"v{a} = int_divide({x}, {y})"
+        if op == RDIV and not (c in self.numbers and self.program.memory[c]):
+            return f"v{a} = float_divide({x}, {y})"
+        if op < IEQL:
+            return f"v{a} = {x} {OPERATORS[op]} {y}"
+        if op < IASN:
+            return f"v{a} = 1 if {x} {OPERATORS[op]} {y} else 0"
+        if op == IASN or op == RASN:
+            return f"v{a} = {x}"
+        if op == ITOR:
+            return f"v{a} = float({x})"
+        if op == RTOI:
+            return f"v{a} = int({x})"
+        if op == IINP or op == RINP:
+            return f"v{a} = read_number({'int' if op == IINP else 'float'})"
+        return f'write(f"{{{self.operand(a)}}}\\n")'
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    # returns the Trace of the instructions
+    def compile(self):
+        code = self.program.code
+        read, written = set(), set()
+        for n, _ in self.trace:
+            op, a, b, c = code[n]
+            if op < IASN:
+                slots = (b, c)
+            elif op in (IASN, RASN, ITOR, RTOI, JMPZ):
+                slots = (b,)
+            elif op == IPRT or op == RPRT:
+                slots = (a,)
+            else:
+                slots = ()
+            read.update(slot for slot in slots if slot not in self.numbers)
+            if op < JMPZ or op in (ITOR, RTOI, IINP, RINP):
+                written.add(a)
+        stores = "; ".join(f"mem[{slot}] = v{slot}" for slot in sorted(written)) or "pass"
+
+        for slot in sorted(read | written):
+            self.emit(1, f"v{slot} = mem[{slot}]")
+        self.emit(1, "steps = 0")
+        self.emit(1, "try:")
+        self.emit(2, "while True:")
+        for position, (n, following) in enumerate(self.trace):
+            op, a, b, c = code[n]
+            if op == JMPZ:
+                # the guard exits when the JMPZ jumps differently than it jumped in the trace
+                taken = following != n + 1
+                self.exits.append((n + 1 if taken else a, position + 1))
+                x = self.operand(b)
+                condition = x if taken else f"not {x}"
+                self.emit(3, f"if {condition}:")
+                self.emit(4, f"side_exit = {len(self.exits) - 1}")
+                self.emit(4, "break")
+            elif op != JUMP:
+                self.emit(3, self.statement(op, a, b, c))
+                self.positions[len(self.lines)] = position
+        self.emit(3, f"steps += {len(self.trace)}")
+        self.emit(1, "except (QuadError, OverflowError, ValueError) as e:")
+        self.emit(2, stores)
+        self.emit(2, "return None, steps, e")
+        self.emit(1, stores)
+        self.emit(1, "return side_exit, steps, None")
+        source = "\n".join(self.lines) + "\n"
+        return Trace([n for n, _ in self.trace], source, self.exits, self.positions)
+
+
+# this is the tracing QUAD machine class
+class TracingQuadMachine(QuadMachine):
+    """
+    The machine interprets the program like QuadMachine, and counts the jumps back to each instruction.
+    When a loop jumped back to its first instruction TRACE_THRESHOLD times, the machine records the
+    instructions of its next iteration while it interprets them, and compiles them into a Trace. From
+    then on, a jump back to the loop runs the trace's function, until a guard fails, and the machine
+    interprets the program from the guard's instruction.
+    A recorded iteration that jumps back to another instruction, halts or is longer than MAX_TRACE_LENGTH
+    isn't compiled, and the loop isn't traced again.
+    """
+
+    def __init__(self, program, stdin=None, stdout=None, **options):
+        super().__init__(program, stdin, stdout, **options)
+        self.traces: dict[int, Trace] = {}  # the trace of each loop, by its first instruction
+        self.jumps_back: dict[int, int] = {}  # the number of jumps back to each instruction
+        self.failed = None  # the instruction that failed in a trace or while recording one
+
+    def execute(self):
+        code, mem, functions = self.program.code, self.memory, FUNCTIONS
+        write, read_number = self.output.write, self.input.read_number
+        pc = start = 0
+        try:
+            while True:
+                op, a, b, c = code[pc]
+                pc += 1
+                if op < IEQL:
+                    mem[a] = functions[op](mem[b], mem[c])
+                elif op < IASN:
+                    mem[a] = 1 if functions[op](mem[b], mem[c]) else 0
+                elif op <= RASN:
+                    mem[a] = mem[b]
+                elif op == JMPZ or op == JUMP:
+                    if op == JUMP or not mem[b]:
+                        self.steps += pc - start
+                        start = pc
+                        pc = start = self.jump_back(a) if a < pc else a
+                elif op == ITOR:
+                    mem[a] = float(mem[b])
+                elif op == RTOI:
+                    mem[a] = int(mem[b])
+                elif op == IINP:
+                    mem[a] = read_number(int)
+                elif op == RINP:
+                    mem[a] = read_number(float)
+                elif op <= RPRT:
+                    write(f"{mem[a]}\n")
+                else:
+                    break
+        except (QuadError, OverflowError, ValueError) as e:
+            self.steps += pc - start
+            raise self.runtime_error(e, pc - 1 if self.failed is None else self.failed) from None
+        self.steps += pc - start
+
+    # jumps back to instruction n: runs its trace if it has one, and traces it if it's the time to.
+    # returns the instruction to interpret next
+    def jump_back(self, n: int):
+        trace = self.traces.get(n)
+        if trace is None:
+            count = self.jumps_back[n] = self.jumps_back.get(n, 0) + 1
+            if count != TRACE_THRESHOLD:
+                return n
+            following = self.record(n)
+            if following != n or n not in self.traces:
+                return following
+            trace = self.traces[n]
+        side_exit, steps, error = trace.function(self.memory, self.input.read_number, self.output.write)
+        if error is not None:
+            # the first frame of the traceback is the function's, which caught the error
+            position = trace.positions[error.__traceback__.tb_lineno]
+            self.steps += steps + position + 1
+            self.failed = trace.instructions[position]
+            raise error
+        following, position = trace.exits[side_exit]
+        self.steps += steps + position
+        return following
+
+    # interprets the instructions from n and records them, until the loop jumps back to n and its trace
+    # is compiled, or the recording stops. returns the instruction to interpret next
+    def record(self, n: int):
+        code, mem = self.program.code, self.memory
+        trace, pc = [], n
+        while len(trace) < MAX_TRACE_LENGTH:
+            op, a, b, c = code[pc]
+            if op == HALT:
+                return pc
+            self.failed = pc
+            self.steps += 1
+            following = pc + 1
+            if op < IEQL:
+                mem[a] = FUNCTIONS[op](mem[b], mem[c])
+            elif op < IASN:
+                mem[a] = 1 if FUNCTIONS[op](mem[b], mem[c]) else 0
+            elif op <= RASN:
+                mem[a] = mem[b]
+            elif op == JUMP or op == JMPZ and not mem[b]:
+                following = a
+            elif op == ITOR:
+                mem[a] = float(mem[b])
+            elif op == RTOI:
+                mem[a] = int(mem[b])
+            elif op == IINP or op == RINP:
+                mem[a] = self.input.read_number(int if op == IINP else float)
+            elif op == IPRT or op == RPRT:
+                self.output.write(f"{mem[a]}\n")
+            self.failed = None
+            trace.append((pc, following))
+            if following <= pc:
+                if following == n:
+                    self.traces[n] = TraceCompiler(self.program, trace).compile()
+                return following
+            pc = following
+        return pc
+
+
+# the tracing machine runs the QUAD program file that the user supplied
+def main():
+    args = sys.argv[1:]
+    if len(args) != 1:
+        error_print("Please provide the QUAD program filename! Aborting...")
+        return
+    try:
+        TracingQuadMachine(load_quad_file(args[0])).run()
+    except QuadError as e:
+        error_print(f"Error in QUAD program {args[0]}, {e}")
+    except OSError:
+        error_print(f"Error while trying to read the QUAD program {args[0]}...")
+
+
+if __name__ == "__main__":
+    main()
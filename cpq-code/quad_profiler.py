@@ -0,0 +1,256 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the QUAD profiler, which runs a QUAD program and counts and times its
+    instructions, its basic blocks and its loops. The hot spots are reported by their QUAD lines, and by
+    their lines in the cpl program when cpq made a source map of the QUAD code (cpq.py --source-map)
+"""
+
+import os
+import sys
+import time
+from bisect import bisect_right
+
+from quad import JMPZ, JUMP, QuadError, ThreadedQuadMachine, load_quad_file
+from utils import SOURCE_MAP_EXTENSION, error_print
+
+
+# this is the profiling QUAD machine class
+class ProfilingQuadMachine(ThreadedQuadMachine):
+    """
+    The machine runs the basic blocks of the threaded machine, and after each block it adds 1 to the
+    block's count and the time since the previous block ended to the block's time, so the cost of the
+    profiling is one call of the clock for each block and not for each instruction. All of the
+    instructions of a block run when it runs, so their counts are the block's count.
+    After run(), 'profile' is the QuadProfile of the run, also when the program failed.
+    """
+
+    def __init__(self, program, stdin=None, stdout=None, clock=time.perf_counter_ns, **options):
+        super().__init__(program, stdin, stdout, **options)
+        self.clock = clock
+        self.profile = None
+
+    def execute(self):
+        starts, bodies, jumps = self.thread_blocks()
+        sizes = [end - start for start, end in zip(starts, [*starts[1:], len(self.program.code)])]
+        counts, times, back_jumps = [0] * len(starts), [0] * len(starts), [0] * len(starts)
+        self.profile = QuadProfile(self.program, starts, counts, times, back_jumps)
+        clock = self.clock
+        block, steps = 0, 0
+        last = clock()
+        try:
+            while block is not None:
+                for instruction in bodies[block]:
+                    instruction()
+                instruction = jumps[block]
+                following = instruction()
+                steps += sizes[block]
+                counts[block] += 1
+                now = clock()
+                times[block] += now - last
+                last = now
+                if following is not None and following <= block:
+                    back_jumps[block] += 1
+                block = following
+        except (QuadError, OverflowError, ValueError) as e:
+            times[block] += clock() - last
+            self.profile.failed = instruction.index
+            self.steps += steps + instruction.index - starts[block] + 1
+            raise self.runtime_error(e, instruction.index) from None
+        self.steps += steps
+
+
+# this is the class of a loop of a profiled program
+class QuadLoop:
+    """
+    A loop is found by its jumps back: the blocks that jump back to an earlier block (or to themselves)
+    end a loop, whose header is the block they jump to, and whose blocks are the blocks from the header
+    to the last of them. The while loops of cpl programs are such loops.
+    'iterations' is the number of jumps back, and 'entries' is the number of times the loop was entered
+    from outside of it.
+    """
+
+    def __init__(self, header: int, last: int, iterations: int, entries: int):
+        self.header = header
+        self.last = last
+        self.iterations = iterations
+        self.entries = entries
+
+    def contains(self, block: int):
+        return self.header <= block <= self.last
+
+
+# this is the class of the profile of a run of a QUAD program
+class QuadProfile:
+    """
+    The profile has the count and the time (in nanoseconds) of each basic block of the program, by the
+    index of the block, from which the counts of the instructions and the loops are computed.
+    'source_map' is the line in the cpl program of each line of the QUAD code, or None.
+    """
+
+    def __init__(self, program, starts: list, counts: list, times: list, back_jumps: list):
+        self.program = program
+        self.starts = starts  # the first instruction of each block
+        self.ends = [*starts[1:], len(program.code)]  # the instruction after each block
+        self.counts = counts
+        self.times = times
+        self.back_jumps = back_jumps  # the number of times each block jumped back
+        self.failed = None  # the instruction that failed, if the program failed
+        self.source_map = None
+
+    # returns the number of times each instruction ran
+    def instruction_counts(self):
+        counts = []
+        for block, count in enumerate(self.counts):
+            counts.extend([count] * (self.ends[block] - self.starts[block]))
+        if self.failed is not None:
+            # the instructions of the block that failed, up to the instruction that failed, ran once more
+            for n in range(self.starts[bisect_right(self.starts, self.failed) - 1], self.failed + 1):
+                counts[n] += 1
+        return counts
+
+    # returns the number of instructions of a block that ran
+    def block_steps(self, block: int):
+        return self.counts[block] * (self.ends[block] - self.starts[block])
+
+    # returns the loops of the program, in the order of their headers
+    def loops(self):
+        code, lasts, iterations = self.program.code, {}, {}
+        for block, end in enumerate(self.ends):
+            op, target = code[end - 1][:2]
+            if (op == JMPZ or op == JUMP) and target <= self.starts[block]:
+                header = bisect_right(self.starts, target) - 1
+                lasts[header] = max(lasts.get(header, block), block)
+                iterations[header] = iterations.get(header, 0) + self.back_jumps[block]
+        return [
+            QuadLoop(header, lasts[header], iterations[header], self.counts[header] - iterations[header])
+            for header in sorted(lasts)
+        ]
+
+    # returns the cpl lines of the instructions from 'start' to 'end', as text
+    def source_lines(self, start: int, end: int):
+        if self.source_map is None:
+            return ""
+        lines = self.program.lines
+        sources = {self.source_map[lines[n] - 1] for n in range(start, end) if lines[n] <= len(self.source_map)}
+        sources.discard(0)
+        if not sources:
+            return "-"
+        return f"{min(sources)}" if len(sources) == 1 else f"{min(sources)}-{max(sources)}"
+
+    # returns the QUAD lines of the instructions from 'start' to 'end', as text
+    def quad_lines(self, start: int, end: int):
+        return f"{self.program.lines[start]}-{self.program.lines[end - 1]}"
+
+    # returns the name of a block or of a loop in the report and in the collapsed stacks
+    def name(self, kind: str, start: int, end: int):
+        sources = self.source_lines(start, end)
+        return f"{kind} {self.quad_lines(start, end)}" + (f" (cpl {sources})" if sources else "")
+
+    # returns the time of each cpl line in nanoseconds and the number of its instructions that ran. the
+    # time of a block is divided between the lines of its instructions
+    def source_line_totals(self):
+        times, steps = {}, {}
+        lines = self.program.lines
+        for block, start in enumerate(self.starts):
+            end = self.ends[block]
+            for n in range(start, end):
+                source = self.source_map[lines[n] - 1] if lines[n] <= len(self.source_map) else 0
+                times[source] = times.get(source, 0) + self.times[block] / (end - start)
+                steps[source] = steps.get(source, 0) + self.counts[block]
+        return times, steps
+
+    # returns the report of the hottest blocks, loops and cpl lines, 'limit' of each
+    def report(self, limit: int = 10):
+        total_time = sum(self.times) or 1
+        total_steps = sum(self.instruction_counts())
+        lines = [f"{total_steps} instructions in {sum(self.counts)} blocks ran in {total_time / 1e6:.2f} ms"]
+
+        def row(name: str, count: int, steps: int, elapsed: float):
+            return f"  {name:32} {count:>12} {steps:>14} {elapsed / 1e6:>12.2f} {elapsed / total_time:>7.1%}"
+
+        header = f"  {'':32} {'count':>12} {'instructions':>14} {'time (ms)':>12} {'time':>7}"
+        blocks = sorted(range(len(self.starts)), key=lambda block: (-self.times[block], -self.block_steps(block)))
+        lines += ["hot blocks:", header]
+        for block in blocks[:limit]:
+            if self.counts[block]:
+                name = self.name("block", self.starts[block], self.ends[block])
+                lines.append(row(name, self.counts[block], self.block_steps(block), self.times[block]))
+
+        loops = [loop for loop in self.loops() if self.counts[loop.header]]
+        loop_times = {loop: sum(self.times[loop.header : loop.last + 1]) for loop in loops}
+        if loops:
+            lines += ["hot loops:", f"  {'':32} {'iterations':>12} {'instructions':>14} {'time (ms)':>12} {'time':>7}"]
+            for loop in sorted(loops, key=lambda loop: -loop_times[loop])[:limit]:
+                name = self.name("loop", self.starts[loop.header], self.ends[loop.last])
+                steps = sum(self.block_steps(block) for block in range(loop.header, loop.last + 1))
+                lines.append(row(name, loop.iterations, steps, loop_times[loop]) + f"  entered {loop.entries}")
+
+        if self.source_map is not None:
+            times, steps = self.source_line_totals()
+            lines += ["hot cpl lines:", f"  {'':32} {'':>12} {'instructions':>14} {'time (ms)':>12} {'time':>7}"]
+            for source in sorted(times, key=lambda source: -times[source])[:limit]:
+                name = f"line {source}" if source else "outside of stmts"
+                lines.append(row(name, "", steps[source], times[source]))
+        return "\n".join(lines) + "\n"
+
+    # returns the collapsed stacks of the run, for flame graph tools: a line for each block that ran, with
+    # the loops that contain it, outermost first, and the block's time in microseconds
+    def collapsed_stacks(self):
+        loops = self.loops()
+        stacks = []
+        for block, start in enumerate(self.starts):
+            elapsed = round(self.times[block] / 1000)
+            if not self.counts[block] or not elapsed:
+                continue
+            frames = ["program"]
+            for loop in loops:
+                if loop.contains(block):
+                    frames.append(self.name("loop", self.starts[loop.header], self.ends[loop.last]))
+            frames.append(self.name("block", start, self.ends[block]))
+            stacks.append(f"{';'.join(frames)} {elapsed}")
+        return "".join(f"{stack}\n" for stack in stacks)
+
+
+# returns the source map of a QUAD program file that cpq made next to it, or None if there isn't one
+def load_source_map(filename: str):
+    try:
+        with open(f"{os.path.splitext(filename)[0]}{SOURCE_MAP_EXTENSION}", "r") as file:
+            return [int(line) for line in file]
+    except (OSError, ValueError):
+        return None
+
+
+# the profiler runs the QUAD program file that the user supplied with the standard input and output, and
+# prints the report to stderr. with --collapsed and a filename before the program's filename, it also
+# writes the collapsed stacks to that file
+def main():
+    args = sys.argv[1:]
+    collapsed = None
+    if args[:1] == ["--collapsed"] and len(args) > 1:
+        collapsed = args[1]
+        args = args[2:]
+    if len(args) != 1:
+        error_print("Please provide the QUAD program filename! Aborting...")
+        return
+    filename = args[0]
+    try:
+        machine = ProfilingQuadMachine(load_quad_file(filename))
+    except QuadError as e:
+        error_print(f"Error in QUAD program {filename}, {e}")
+        return
+    except OSError:
+        error_print(f"Error while trying to read the QUAD program {filename}...")
+        return
+    try:
+        machine.run()
+    except QuadError as e:
+        error_print(f"Error in QUAD program {filename}, {e}")
+    sys.stdout.flush()
+    machine.profile.source_map = load_source_map(filename)
+    error_print(machine.profile.report(), end="")
+    if collapsed is not None:
+        with open(collapsed, "w") as file:
+            file.write(machine.profile.collapsed_stacks())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,647 @@
+""" Written by Ilai Azaria, 2024
+    This module defines the QUAD to Python transpiler, which translates a QUAD program (or a cpl program,
+    through its QUAD code) into the source of one Python function, and runs the function instead of
+    interpreting the program
+"""
+
+import importlib.util
+import marshal
+import os
+import sys
+
+from compiler import Compiler
+from quad import (
+    HALT,
+    IADD,
+    IASN,
+    IDIV,
+    IEQL,
+    IGRT,
+    IINP,
+    ILSS,
+    IMLT,
+    INQL,
+    IPRT,
+    ISUB,
+    ITOR,
+    JMPZ,
+    JUMP,
+    RADD,
+    RASN,
+    RDIV,
+    REQL,
+    RGRT,
+    RINP,
+    RLSS,
+    RMLT,
+    RNQL,
+    RPRT,
+    RSUB,
+    RTOI,
+    QuadError,
+    QuadMachine,
+    int_divide,
+    load_quad,
+)
+from utils import PARSING_ERROR_MSG, error_print
+
+# the version of the generated code. it's hashed with the program into the key of the cached code,
+# so code that an older transpiler cached isn't used
+TRANSPILER_VERSION = b"1"
+
+# the name of the generated function, and its arguments
+FUNCTION_NAME = "quad_program"
+FUNCTION_ARGUMENTS = "read_number, append, int_divide, float_to_int"
+
+# the python operator of each arithmetic and comparison opcode
+OPERATORS = {
+    IADD: "+",
+    ISUB: "-",
+    IMLT: "*",
+    RADD: "+",
+    RSUB: "-",
+    RMLT: "*",
+    RDIV: "/",
+    IEQL: "==",
+    INQL: "!=",
+    ILSS: "<",
+    IGRT: ">",
+    REQL: "==",
+    RNQL: "!=",
+    RLSS: "<",
+    RGRT: ">",
+}
+
+# the opcodes of the instructions whose result can be an expression in the instruction that reads it
+VALUE_OPCODES = set(OPERATORS) | {IDIV, IASN, RASN, ITOR, RTOI}
+
+# the maximal depth of an expression. python can't compile too deeply nested parentheses, so a deeper
+# expression is assigned to its variable first
+MAX_DEPTH = 50
+
+
+# converts a float to an int for RTOI, with the error message of QuadMachine
+def float_to_int(value: float):
+    try:
+        return int(value)
+    except (OverflowError, ValueError):
+        raise QuadError(f"can't convert {value} to an int") from None
+
+
+# this is the class of the expression that computes the value of an instruction's result
+class Expression:
+    """
+    'text' is the python expression of the value, and 'compound' is True when it needs parentheses to be
+    an operand. When the value is a count (0 or more, like the results of comparisons and their sums and
+    products, which cpl computes its boolean operators with) 'truth' is a python condition that's true when
+    it isn't 0, and 'boolean' is True when it's only 0 or 1.
+    'fallible' is the instruction that can fail in the expression, at most one so that an error is found
+    by its line, and 'value' is the value of a number.
+    """
+
+    __slots__ = ("text", "compound", "truth", "boolean", "fallible", "depth", "value")
+
+    def __init__(self, text, compound=False, truth=None, boolean=False, fallible=None, depth=0, value=None):
+        self.text = text
+        self.compound = compound
+        self.truth = truth
+        self.boolean = boolean
+        self.fallible = fallible
+        self.depth = depth
+        self.value = value
+
+    # returns the text of the expression as an operand of an operator
+    def operand(self):
+        return f"({self.text})" if self.compound else self.text
+
+    # returns a python condition that's true when the value isn't 0
+    def condition(self):
+        return self.truth if self.truth is not None else self.text
+
+
+# this is the class of the result of transpiling a program, which can be cached
+class TranspiledQuad:
+    """
+    'code' is the compiled code of the module that defines the function, 'lines' has the QUAD line and the
+    opcode of the instruction that can fail on each line of the function, and 'names' and 'memory' are the
+    names and the initial values of the variables that the function returns. Temporary variables that
+    became a part of an expression aren't variables of the function. 'source' is the source of the
+    function, which isn't cached.
+    """
+
+    def __init__(self, code, lines: dict, names: list, memory: list, source: str = None):
+        self.code = code
+        self.lines = lines
+        self.names = names
+        self.memory = memory
+        self.variables = {name: n for n, name in enumerate(names)}
+        self.source = source
+
+    # returns the marshalled data of the transpiled program
+    def dumps(self):
+        return marshal.dumps((self.code, self.lines, self.names, self.memory))
+
+    @classmethod
+    def loads(cls, data: bytes):
+        return cls(*marshal.loads(data))
+
+
+# this is the transpiler class
+class QuadTranspiler:
+    """
+    The function has a local variable for each variable of the program, so an instruction runs at the
+    speed of python's local variables. Each straight run of instructions becomes python statements, and
+    a temporary variable that's set once and read once, by an instruction after it in the same block, is
+    inlined into the expression that reads it. The instructions are inlined in the order they run, so
+    errors happen in the same order too.
+    The control flow of the code that the compiler generates becomes structured code: the label pattern
+    of generate_while_code becomes a python while loop, and a JMPZ over code that ends with a JUMP over
+    more code becomes an if and an else. A program whose jumps don't have these patterns runs its basic
+    blocks in a dispatch loop instead.
+    """
+
+    def __init__(self, program):
+        self.program = program
+        code = program.code
+        self.numbers = {slot: program.memory[slot] for slot in program.numbers.values()}
+        starts = program.block_starts()
+        self.blocks = {start: block for block, start in enumerate(starts)}
+        self.block_of = []
+        for block, (start, end) in enumerate(zip(starts, [*starts[1:], len(code)])):
+            self.block_of.extend([block] * (end - start))
+
+        # the instructions that write and read each slot, and the backward jumps to each instruction
+        writers, readers = {}, {}
+        self.back_jumps = {}
+        for n, instruction in enumerate(code):
+            op = instruction[0]
+            if op in VALUE_OPCODES or op == IINP or op == RINP:
+                writers.setdefault(instruction[1], []).append(n)
+            for slot in self.read_slots(instruction):
+                readers.setdefault(slot, []).append(n)
+            if op == JUMP and instruction[1] <= n:
+                self.back_jumps.setdefault(instruction[1], []).append(n)
+
+        # the slots that can be inlined, by the instruction that reads them
+        self.inlined = {}
+        for slot, (n,) in ((slot, writers[slot]) for slot in writers if len(writers[slot]) == 1):
+            reads = readers.get(slot, ())
+            if code[n][0] in VALUE_OPCODES and len(reads) == 1:
+                if reads[0] > n and self.block_of[reads[0]] == self.block_of[n]:
+                    self.inlined[slot] = reads[0]
+        self.variables = [
+            slot
+            for slot in sorted(program.variables.values())
+            if slot not in self.inlined
+        ]
+
+    # returns the slots that an instruction reads, in order
+    @staticmethod
+    def read_slots(instruction: tuple):
+        op, a, b, c = instruction
+        if op in OPERATORS or op == IDIV:
+            return (b, c)
+        if op in (IASN, RASN, ITOR, RTOI, JMPZ):
+            return (b,)
+        if op == IPRT or op == RPRT:
+            return (a,)
+        return ()
+
+    # returns the name of a variable's local variable
+    def name(self, slot: int):
+        name = self.program.names[slot]
+        if name.isidentifier() and name.isascii():
+            return f"v_{name}"
+        return f"v{slot}_"
+
+    # returns the expression of a slot's value, without the inlined expressions
+    def slot_expression(self, slot: int):
+        if slot not in self.numbers:
+            return Expression(self.name(slot))
+        value = self.numbers[slot]
+        text = repr(value)
+        if value != value or value in (float("inf"), float("-inf")):
+            text = f"float({text!r})"
+        return Expression(text, compound=value < 0, value=value)
+
+    # transpiles the program, returns the TranspiledQuad. the structured code is used if the program's
+    # jumps have its patterns and python can compile it, and 'structured' False always uses the dispatch loop
+    def transpile(self, structured=True):
+        for emit in (self.emit_structured, self.emit_dispatch) if structured else (self.emit_dispatch,):
+            self.lines = [f"def {FUNCTION_NAME}({FUNCTION_ARGUMENTS}):"]
+            self.owners = [None]  # the instruction that can fail on each line
+            self.indent = 1
+            self.pending = []  # the (slot, Expression) of the inlined instructions that weren't read yet
+            for slot in self.variables:
+                self.emit(f"{self.name(slot)} = {self.program.memory[slot]!r}")
+            if not emit():
+                continue
+            source = "\n".join(self.lines) + "\n"
+            try:
+                code = compile(source, "<QUAD program>", "exec")
+            except (SyntaxError, RecursionError, MemoryError, ValueError):
+                continue
+            lines = {
+                lineno: (self.program.lines[n], self.program.code[n][0])
+                for lineno, n in enumerate(self.owners, 1)
+                if n is not None
+            }
+            names = [self.program.names[slot] for slot in self.variables]
+            memory = [self.program.memory[slot] for slot in self.variables]
+            return TranspiledQuad(code, lines, names, memory, source)
+        raise QuadError("the program is too large to transpile")
+
+    # adds a line of code, 'owner' is the instruction that can fail on it
+    def emit(self, line: str, owner: int = None):
+        self.lines.append("    " * self.indent + line)
+        self.owners.append(owner)
+
+    # returns the line that returns the values of the variables
+    def return_line(self):
+        names = ", ".join(self.name(slot) for slot in self.variables)
+        return f"return ({names}{',' if len(self.variables) == 1 else ''})"
+
+    # returns the expressions of the slots that instruction n reads, and the number of them that are
+    # pending. the inlined ones are the pending expressions if they're the last ones in the same order,
+    # otherwise all of the pending expressions are assigned to their variables first
+    def operands(self, n: int):
+        slots = self.read_slots(self.program.code[n])
+        inlined = [slot for slot in slots if self.inlined.get(slot) == n]
+        if inlined and [slot for slot, expression in self.pending[-len(inlined) :]] == inlined:
+            expressions = dict(self.pending[-len(inlined) :])
+            operands = [expressions.get(slot) or self.slot_expression(slot) for slot in slots]
+            return operands, len(inlined)
+        self.flush()
+        return [self.slot_expression(slot) for slot in slots], 0
+
+    # removes the last 'count' pending expressions, after the instruction that reads them used them
+    def take(self, count: int):
+        if count:
+            del self.pending[-count:]
+
+    # assigns the pending expressions to their variables
+    def flush(self):
+        for slot, expression in self.pending:
+            self.emit(f"{self.name(slot)} = {expression.text}", expression.fallible)
+        self.pending = []
+
+    # returns the expression of the result of instruction n, or None if its operands can't be a part of it
+    def expression(self, n: int, operands: list):
+        op = self.program.code[n][0]
+        x = operands[0]
+        y = operands[1] if len(operands) > 1 else None
+        depth = 1 + max(expression.depth for expression in operands)
+        fallibles = [expression.fallible for expression in operands if expression.fallible is not None]
+        if depth > MAX_DEPTH or len(fallibles) > 1:
+            return None
+        fallible = fallibles[0] if fallibles else None
+
+        if op == IASN or op == RASN:
+            return x
+        if op == ITOR or op == RTOI or op == IDIV or op == RDIV:
+            # these can fail, unless they divide by a number that isn't 0
+            if op == ITOR:
+                text, compound = f"float({x.text})", False
+            elif op == RTOI:
+                text, compound = f"float_to_int({x.text})", False
+            elif op == RDIV:
+                text, compound = f"{x.operand()} / {y.operand()}", True
+                if y.value:
+                    return Expression(text, True, fallible=fallible, depth=depth)
+            elif y.value is not None and y.value > 0 and not x.compound:
+                # truncating division by a positive number doesn't fail
+                text = f"{x.text} // {y.text} if {x.text} >= 0 else -(-{x.text} // {y.text})"
+                return Expression(text, True, fallible=fallible, depth=depth)
+            else:
+                text, compound = f"int_divide({x.text}, {y.text})", False
+            if fallible is not None:
+                return None
+            return Expression(text, compound, fallible=n, depth=depth)
+
+        if op in (IEQL, INQL, IGRT) and x.truth is not None and y.value == 0:
+            # a count compared to 0, which cpl's boolean operators do
+            truth = f"not ({x.truth})" if op == IEQL else x.truth
+        elif op in (IEQL, INQL, ILSS, IGRT, REQL, RNQL, RLSS, RGRT):
+            truth = f"{x.operand()} {OPERATORS[op]} {y.operand()}"
+        elif op == ISUB and x.value == 1 and y.boolean:
+            # 1 - x is the not of a boolean x
+            truth = f"not ({y.truth})"
+        elif op in (IADD, IMLT) and x.truth is not None and y.truth is not None and y.fallible is None:
+            # the sum of counts isn't 0 if one of them isn't, and the product if both aren't
+            truth = f"({x.truth}) {'or' if op == IADD else 'and'} ({y.truth})"
+            if op == IMLT and x.boolean and y.boolean:
+                return Expression(f"1 if {truth} else 0", True, truth, True, fallible, depth)
+            text = f"{x.operand()} {OPERATORS[op]} {y.operand()}"
+            return Expression(text, True, truth, False, fallible, depth)
+        else:
+            return Expression(f"{x.operand()} {OPERATORS[op]} {y.operand()}", True, fallible=fallible, depth=depth)
+        return Expression(f"1 if {truth} else 0", True, truth, True, fallible, depth)
+
+    # emits the code of instruction n, which isn't a jump or a HALT
+    def emit_instruction(self, n: int):
+        op, a, b, c = self.program.code[n]
+        if op == IINP or op == RINP:
+            self.flush()
+            self.emit(f"{self.name(a)} = read_number({'int' if op == IINP else 'float'})", n)
+            return
+        operands, count = self.operands(n)
+        if op == IPRT or op == RPRT:
+            # printing a float can't fail, and printing an int fails if it's too large
+            x = operands[0]
+            if op == IPRT and x.fallible is not None:
+                self.flush()
+                x = self.slot_expression(a)
+            else:
+                self.take(count)
+                self.flush()
+            self.emit(f'append(f"{{{x.text}}}\\n")', n if op == IPRT else x.fallible)
+            return
+        expression = self.expression(n, operands)
+        if expression is None:
+            self.flush()
+            operands = [self.slot_expression(slot) for slot in self.read_slots(self.program.code[n])]
+            expression = self.expression(n, operands)
+        else:
+            self.take(count)
+        if a in self.inlined:
+            self.pending.append((a, expression))
+        else:
+            self.flush()
+            self.emit(f"{self.name(a)} = {expression.text}", expression.fallible)
+
+    # returns the condition of the JMPZ at n, which jumps if it's false
+    def jump_condition(self, n: int):
+        operands, count = self.operands(n)
+        self.take(count)
+        self.flush()
+        return operands[0]
+
+    # emits the program as structured code, returns False if its jumps don't have the patterns
+    def emit_structured(self):
+        return self.emit_region(0, len(self.program.code))
+
+    # emits the instructions from lo up to hi as structured code
+    def emit_region(self, lo: int, hi: int):
+        code = self.program.code
+        n = lo
+        while n < hi:
+            loop = self.loop_at(n, hi)
+            if loop is not None:
+                k, end = loop
+                # the condition of the loop is a python while condition when it has no statements
+                self.flush()
+                line = len(self.lines)
+                self.emit("while True:")
+                self.indent += 1
+                for m in range(n, k):
+                    self.emit_instruction(m)
+                condition = self.jump_condition(k)
+                if len(self.lines) == line + 1:
+                    self.lines[line] = "    " * (self.indent - 1) + f"while {condition.condition()}:"
+                    self.owners[line] = condition.fallible
+                else:
+                    self.emit(f"if not ({condition.condition()}):", condition.fallible)
+                    self.emit("    break")
+                start = len(self.lines)
+                if not self.emit_region(k + 1, end):
+                    return False
+                if len(self.lines) == start:
+                    self.emit("pass")
+                self.indent -= 1
+                n = end + 1
+                continue
+
+            op, a, b, c = code[n]
+            if op == JMPZ:
+                # an if, with an else if the code it jumps over ends with a jump over more code
+                if not n < a <= hi:
+                    return False
+                condition = self.jump_condition(n)
+                self.emit(f"if {condition.condition()}:", condition.fallible)
+                else_start = else_end = a
+                if a - 1 > n and code[a - 1][0] == JUMP and a <= code[a - 1][1] <= hi:
+                    else_end = code[a - 1][1]
+                    then_end = a - 1
+                else:
+                    then_end = a
+                if not self.emit_block(n + 1, then_end):
+                    return False
+                if else_end > else_start:
+                    self.emit("else:")
+                    if not self.emit_block(else_start, else_end):
+                        return False
+                n = else_end
+            elif op == JUMP:
+                return False
+            elif op == HALT:
+                self.flush()
+                self.emit(self.return_line())
+                n += 1
+            else:
+                self.emit_instruction(n)
+                n += 1
+        self.flush()
+        return True
+
+    # emits a region as the indented block of an if or an else
+    def emit_block(self, lo: int, hi: int):
+        self.indent += 1
+        start = len(self.lines)
+        if not self.emit_region(lo, hi):
+            return False
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent -= 1
+        return True
+
+    # returns (k, end) if a while loop of generate_while_code starts at n and ends before hi: the loop's
+    # JMPZ at k jumps to the instruction after its JUMP at 'end' back to n, and there are no other jumps
+    # from its condition's code
+    def loop_at(self, n: int, hi: int):
+        ends = [end for end in self.back_jumps.get(n, ()) if end < hi]
+        if not ends:
+            return None
+        end = max(ends)
+        code = self.program.code
+        for k in range(n, end):
+            op = code[k][0]
+            if op == JMPZ and code[k][1] == end + 1:
+                return k, end
+            if op == JMPZ or op == JUMP or op == HALT:
+                return None
+        return None
+
+    # emits the program as a loop that runs its blocks by their index. the blocks are found by a binary
+    # search of if statements, so the depth of the code is small
+    def emit_dispatch(self):
+        starts = sorted(self.blocks, key=self.blocks.get)
+        self.emit("block = 0")
+        self.emit("while True:")
+        self.indent += 1
+        self.emit_blocks(starts, 0, len(starts))
+        return True
+
+    def emit_blocks(self, starts: list, first: int, last: int):
+        if last - first > 1:
+            middle = (first + last) // 2
+            self.emit(f"if block < {middle}:")
+            self.indent += 1
+            self.emit_blocks(starts, first, middle)
+            self.indent -= 1
+            self.emit("else:")
+            self.indent += 1
+            self.emit_blocks(starts, middle, last)
+            self.indent -= 1
+            return
+        code = self.program.code
+        start = starts[first]
+        end = starts[first + 1] if first + 1 < len(starts) else len(code)
+        for n in range(start, end - 1):
+            self.emit_instruction(n)
+        op, a, b, c = code[end - 1]
+        if op == JMPZ:
+            condition = self.jump_condition(end - 1)
+            self.emit(
+                f"block = {self.blocks[end]} if {condition.condition()} else {self.blocks[a]}",
+                condition.fallible,
+            )
+        elif op == JUMP:
+            self.flush()
+            self.emit(f"block = {self.blocks[a]}")
+        elif op == HALT:
+            self.flush()
+            self.emit(self.return_line())
+        else:
+            self.emit_instruction(end - 1)
+            self.flush()
+            self.emit(f"block = {first + 1}")
+
+
+# transpiles a QUAD program and returns the TranspiledQuad
+def transpile(program, structured=True):
+    return QuadTranspiler(program).transpile(structured)
+
+
+# returns the QUAD code of a program file's text, which is compiled if it's a cpl program that ends with
+# .ou. returns None if the cpl program has errors, which are printed
+def quad_text(filename: str, text: str):
+    if not filename.endswith(".ou"):
+        return text
+    try:
+        return Compiler().compile(text)
+    except Exception:
+        error_print(PARSING_ERROR_MSG)
+        return None
+
+
+# returns the file of the cached code of a program file, in the __pycache__ directory next to it like the
+# cached code of python modules, or None if python has no cache tag
+def cache_filename(filename: str):
+    if sys.implementation.cache_tag is None:
+        return None
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, "__pycache__", f"{name}.{sys.implementation.cache_tag}.pyc")
+
+
+# the header of a cached file has python's magic number, the flags of a pyc that's checked by the hash of
+# its source, and the hash of the program
+def cache_header(key: bytes):
+    return importlib.util.MAGIC_NUMBER + (3).to_bytes(4, "little") + key
+
+
+# loads a QUAD program file, or a cpl program file that ends with .ou, and transpiles it. the transpiled
+# program is cached, and loaded from the cache while the file doesn't change. returns None if the cpl
+# program has errors, which are printed
+def load_transpiled_file(filename: str):
+    with open(filename, "rb") as file:
+        data = file.read()
+    key = importlib.util.source_hash(TRANSPILER_VERSION + data)
+    cached = cache_filename(filename)
+    if cached is not None:
+        try:
+            with open(cached, "rb") as file:
+                cached_data = file.read()
+            header = cache_header(key)
+            if cached_data.startswith(header):
+                return TranspiledQuad.loads(cached_data[len(header) :])
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    text = quad_text(filename, data.decode())
+    if text is None:
+        return None
+    transpiled = transpile(load_quad(text))
+    if cached is not None:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            with open(cached, "wb") as file:
+                file.write(cache_header(key) + transpiled.dumps())
+        except OSError:
+            pass
+    return transpiled
+
+
+# this is the machine class that runs a transpiled program
+class TranspiledQuadMachine(QuadMachine):
+    """
+    The machine runs the function of a TranspiledQuad with the input and the output of QuadMachine.
+    After run(), 'memory' has the values of the variables of the function, and 'steps' isn't counted.
+    """
+
+    def execute(self):
+        namespace = {}
+        exec(self.program.code, namespace)
+        function = namespace[FUNCTION_NAME]
+        try:
+            self.memory[:] = function(self.input.read_number, self.output.write, int_divide, float_to_int)
+        except (QuadError, ZeroDivisionError, OverflowError, ValueError) as e:
+            raise self.transpiled_error(e, function.__code__) from None
+
+    # returns the QuadError for the error 'e' of the function, with the line of the QUAD instruction that
+    # failed, which is found by the line of the function in the traceback
+    def transpiled_error(self, e: Exception, function_code):
+        traceback = e.__traceback__
+        lineno = None
+        while traceback is not None:
+            if traceback.tb_frame.f_code is function_code:
+                lineno = traceback.tb_lineno
+            traceback = traceback.tb_next
+        line, op = self.program.lines.get(lineno, ("?", None))
+        if isinstance(e, QuadError):
+            message = str(e)
+        elif isinstance(e, ZeroDivisionError):
+            message = "division by zero"
+        else:
+            message = f"the int is too large to {'convert to a float' if op == ITOR else 'print'}"
+        return QuadError(f"line {line}: {message}")
+
+
+# transpiles the program file that the user supplied and runs it. with --source before the filename it
+# prints the source of the function instead
+def main():
+    args = sys.argv[1:]
+    source = args[:1] == ["--source"]
+    if source:
+        args = args[1:]
+    if len(args) != 1:
+        error_print("Please provide the QUAD or cpl program filename! Aborting...")
+        return
+    filename = args[0]
+    try:
+        if source:
+            with open(filename, "r") as file:
+                text = quad_text(filename, file.read())
+            if text is not None:
+                print(transpile(load_quad(text)).source, end="")
+            return
+        transpiled = load_transpiled_file(filename)
+        if transpiled is not None:
+            TranspiledQuadMachine(transpiled).run()
+    except QuadError as e:
+        error_print(f"Error in QUAD program {filename}, {e}")
+    except OSError:
+        error_print(f"Error while trying to read the QUAD program {filename}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,12 @@ NOT_ENOUGH_ARGV_PARAMS_ERROR = (
     "Not enough parameters given to argv. Please provide the cpl filename! Aborting..."
 )
 FILE_READING_ERROR = "Error while trying to read your file..."
+NO_C_COMPILER_ERROR = "No C compiler was found. Install one or set CC to its command..."
+C_COMPILATION_ERROR = "The C compiler failed to compile the generated C program:"
+C_GENERATION_ERROR = "The QUAD code can't be translated to C:"
+MMAP_SIZE_THRESHOLD = 16 * 1024 * 1024  # source files of this size or more are memory mapped
+SOURCE_LINE_MARK = "#line"  # the lines that mark the code of a stmt when the parser makes a source map
+SOURCE_MAP_EXTENSION = ".map"
 
 
 # print to stderr
@@ -87,7 +93,36 @@ def clean_newlines(code: str):
 
 # cleans newlines and adds a 'HALT' and a signature line in the end of the string
 def reparse_output(code: str):
-    return clean_newlines(code) + f"\nHALT\n{SIGNATURE_LINE}"
+    return output_lines([clean_newlines(code)])
+
+
+# joins lines of code with clean newlines and adds a 'HALT' and a signature line in the end
+def output_lines(lines):
+    return "\n".join([*lines, "HALT", SIGNATURE_LINE])
+
+
+# removes the lines that mark the code of the stmts from the generated code and reparses it like
+# reparse_output. returns the reparsed code and its source map, the line in the cpl program of the
+# innermost stmt of each line of the code, or 0 for a line that isn't in a stmt
+def reparse_output_with_source_map(code: str):
+    lines, sources, stmt_lines = [], [], []
+    for line in code.split("\n"):
+        if line == SOURCE_LINE_MARK:
+            stmt_lines.pop()
+        elif line.startswith(SOURCE_LINE_MARK):
+            stmt_lines.append(int(line[len(SOURCE_LINE_MARK) :]))
+        else:
+            lines.append(line)
+            sources.append(stmt_lines[-1] if stmt_lines else 0)
+    output = reparse_output("\n".join(lines))
+    # reparsing only removes empty lines, so each line of the output is the next line that's equal to it
+    source_map, n = [], 0
+    for line in output.split("\n"):
+        while n < len(lines) and lines[n] != line:
+            n += 1
+        source_map.append(sources[n] if n < len(lines) else 0)
+        n += 1
+    return output, source_map
 
 
 # strips a filename of .ou in its end
@@ -0,0 +1,456 @@
+# -----------------------------------------------------------------------------
+# sly: dfa.py
+#
+# A table driven DFA engine for lexers.  It has the small part of the re
+# module interface that Lexer uses, so it's selected with regex_module:
+#
+#     from sly import Lexer, dfa
+#
+#     class MyLexer(Lexer):
+#         regex_module = dfa
+#         ...
+#
+# The master pattern of a lexer is an ordered alternation of one named group
+# per token rule.  Every rule that only uses the regular part of the regex
+# syntax (literals, character classes, '.', groups, alternation and greedy
+# repeats) is compiled into a single DFA.  At a given position the DFA finds
+# the first rule (in the order of the rules) that matches, and the longest
+# match of that rule.  The text is examined once, so the time taken is linear
+# in the length of the token no matter how the patterns are written.
+#
+# Rules using anything else (lookahead/lookbehind, anchors, backreferences,
+# lazy or possessive repeats, inline flags) are left to re.  When one of them
+# could start at the current position, the whole master pattern is matched
+# with re instead, which gives exactly the same result as a regular Lexer.
+# With the IGNORECASE or LOCALE flags everything is matched with re.
+#
+# Note: inside a rule re picks the first alternative of an alternation that
+# matches, while the DFA picks the longest match.  The two only differ for
+# patterns like r'<|<=' where an earlier alternative is a prefix of a later one.
+# -----------------------------------------------------------------------------
+
+__all__ = [ 'compile' ]
+
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre
+except ImportError:     # Python < 3.11
+    import sre_parse
+    import sre_constants as sre
+
+error = re.error
+escape = re.escape
+
+# Patterns for the character categories of re (\d, \s, \w and their negations)
+_categories = {
+    sre.CATEGORY_DIGIT: r'\d', sre.CATEGORY_NOT_DIGIT: r'\D',
+    sre.CATEGORY_SPACE: r'\s', sre.CATEGORY_NOT_SPACE: r'\S',
+    sre.CATEGORY_WORD: r'\w',  sre.CATEGORY_NOT_WORD: r'\W',
+    }
+
+# Limit on the number of NFA states of a single rule.  Larger rules (typically
+# with big counted repeats like a{1000}) are left to re.
+MAX_NFA_STATES = 10000
+
+DEAD = -1          # No transition.  The DFA stops
+MISSING = -2       # Transition not computed yet
+
+class _Unsupported(Exception):
+    pass
+
+# -----------------------------------------------------------------------------
+# class _NFA
+#
+# Thompson NFA for the rules.  Edges are labeled with atoms, which are the
+# character sets of the patterns (a literal, '.', a [...] set).  Characters are
+# later grouped into classes of characters that belong to the same atoms.
+# -----------------------------------------------------------------------------
+
+class _NFA(object):
+    def __init__(self):
+        self.edges = [ ]          # state -> [(atom number, state)]
+        self.eps = [ ]            # state -> [state]
+        self.rule = [ ]           # state -> rule number
+        self.accept = { }         # accepting state -> rule number
+        self.atoms = { }          # atom key -> atom number
+        self.start = self.new_state(-1)
+
+    def new_state(self, rule):
+        self.edges.append([])
+        self.eps.append([])
+        self.rule.append(rule)
+        return len(self.rule) - 1
+
+    def atom(self, op, av):
+        key = (op, tuple(av) if op is sre.IN else av)
+        return self.atoms.setdefault(key, len(self.atoms))
+
+    # Add a rule made of the parsed items.  Raises _Unsupported if the
+    # rule uses a feature that the DFA can't handle
+    def add_rule(self, items, rule):
+        mark = len(self.rule)
+        try:
+            start = self.new_state(rule)
+            self.current = rule
+            end = self.sequence(items, start)
+        except _Unsupported:
+            # Throw away the states of the rule
+            for lst in (self.edges, self.eps, self.rule):
+                del lst[mark:]
+            raise
+        self.eps[self.start].append(start)
+        self.accept[end] = rule
+
+    def sequence(self, items, s):
+        for op, av in items:
+            s = self.item(op, av, s)
+            if len(self.rule) > MAX_NFA_STATES:
+                raise _Unsupported()
+        return s
+
+    def item(self, op, av, s):
+        if op in (sre.LITERAL, sre.NOT_LITERAL, sre.ANY, sre.IN):
+            t = self.new_state(self.current)
+            self.edges[s].append((self.atom(op, av), t))
+            return t
+
+        if op is sre.SUBPATTERN:
+            group, add_flags, del_flags, p = av
+            if add_flags or del_flags:
+                raise _Unsupported()
+            return self.sequence(p, s)
+
+        if op is sre.BRANCH:
+            end = self.new_state(self.current)
+            for alt in av[1]:
+                a = self.new_state(self.current)
+                self.eps[s].append(a)
+                self.eps[self.sequence(alt, a)].append(end)
+            return end
+
+        if op is sre.MAX_REPEAT:
+            lo, hi, p = av
+            for _ in range(lo):
+                s = self.sequence(p, s)
+            if hi == sre.MAXREPEAT:
+                a = self.new_state(self.current)
+                self.eps[s].append(a)
+                self.eps[self.sequence(p, a)].append(a)
+                return a
+            skips = [ ]
+            for _ in range(hi - lo):
+                skips.append(s)
+                s = self.sequence(p, s)
+            for skip in skips:
+                self.eps[skip].append(s)
+            return s
+
+        raise _Unsupported()
+
+# Return the atoms that can start a match of the parsed items, and whether the
+# items can match the empty string.  Raises _Unsupported if that isn't known.
+def _first(nfa, items):
+    atoms = set()
+    for op, av in items:
+        if op in (sre.LITERAL, sre.NOT_LITERAL, sre.ANY, sre.IN):
+            atoms.add(nfa.atom(op, av))
+            return atoms, False
+        elif op is sre.SUBPATTERN:
+            if av[1] or av[2]:
+                raise _Unsupported()
+            first, nullable = _first(nfa, av[3])
+        elif op is sre.BRANCH:
+            first, nullable = set(), False
+            for alt in av[1]:
+                f, n = _first(nfa, alt)
+                first |= f
+                nullable = nullable or n
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT) or op is getattr(sre, 'POSSESSIVE_REPEAT', None):
+            first, nullable = _first(nfa, av[2])
+            nullable = nullable or av[0] == 0
+        elif op is getattr(sre, 'ATOMIC_GROUP', None):
+            first, nullable = _first(nfa, av)
+        elif op in (sre.AT, sre.ASSERT, sre.ASSERT_NOT):
+            first, nullable = set(), True
+        else:
+            raise _Unsupported()
+        atoms |= first
+        if not nullable:
+            return atoms, False
+    return atoms, True
+
+# Return a function testing if a character belongs to an atom
+def _atom_test(key, flags):
+    op, av = key
+    if op is sre.LITERAL:
+        return lambda o: o == av
+    if op is sre.NOT_LITERAL:
+        return lambda o: o != av
+    if op is sre.ANY:
+        return (lambda o: True) if flags & re.DOTALL else (lambda o: o != 10)
+
+    # A [...] set
+    negate = False
+    tests = [ ]
+    for iop, iav in av:
+        if iop is sre.NEGATE:
+            negate = True
+        elif iop is sre.LITERAL:
+            tests.append(lambda o, c=iav: o == c)
+        elif iop is sre.RANGE:
+            tests.append(lambda o, lo=iav[0], hi=iav[1]: lo <= o <= hi)
+        elif iop is sre.CATEGORY and iav in _categories:
+            pat = re.compile(_categories[iav], flags & re.ASCII)
+            tests.append(lambda o, match=pat.match: match(chr(o)) is not None)
+        else:
+            raise _Unsupported()
+    return lambda o: any(test(o) for test in tests) != negate
+
+# -----------------------------------------------------------------------------
+# class _ClassMap
+#
+# Mapping from character codes to character classes, used with str.translate().
+# A class is written as the character chr(n) where n is the class number.
+# Characters are added the first time they're seen.  Characters in the same class
+# belong to the same atoms, so the DFA has the same transitions for them.
+# -----------------------------------------------------------------------------
+
+class _ClassMap(dict):
+    def __init__(self, tests):
+        self.tests = tests
+        self.numbers = { }        # atom bitmask -> class number
+        self.masks = [ ]          # class number -> atom bitmask
+
+    def __missing__(self, o):
+        mask = 0
+        for n, test in enumerate(self.tests):
+            if test(o):
+                mask |= 1 << n
+        number = self.numbers.get(mask)
+        if number is None:
+            number = self.numbers[mask] = len(self.masks)
+            self.masks.append(mask)
+        c = self[o] = chr(number)
+        return c
+
+class Match(object):
+    '''
+    Result of a match made by the DFA.  It has the methods of a re match
+    object that Lexer uses.
+    '''
+    __slots__ = ('re', 'string', '_start', '_end', 'lastgroup')
+    def __init__(self, pattern, string, start, end, lastgroup):
+        self.re = pattern
+        self.string = string
+        self._start = start
+        self._end = end
+        self.lastgroup = lastgroup
+
+    def group(self, *groups):
+        if groups not in ((), (0,)):
+            raise IndexError('no such group')
+        return self.string[self._start:self._end]
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def span(self):
+        return (self._start, self._end)
+
+    def __repr__(self):
+        return f'<sly.dfa.Match object; span={self.span()!r}, match={self.group()!r}>'
+
+class Pattern(object):
+    '''
+    A compiled pattern.  match() uses the DFA where it can and re otherwise.
+    '''
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self.regex = re.compile(pattern, flags)
+        self.names = [ ]                  # rule number -> group name
+        self.dfa_rules = [ ]              # names of the rules in the DFA
+        self.re_rules = [ ]               # names of the rules left to re
+        self._fallback = None
+
+        parsed = sre_parse.parse(pattern, flags)
+        flags = parsed.state.flags
+        if flags & (re.IGNORECASE | re.LOCALE):
+            return
+
+        groupnames = { n: name for name, n in parsed.state.groupdict.items() }
+        items = list(parsed)
+        if len(items) == 1 and items[0][0] is sre.BRANCH:
+            alternatives = items[0][1][1]
+        else:
+            alternatives = [ items ]
+
+        nfa = _NFA()
+        fallback = set()
+        for rule, alt in enumerate(alternatives):
+            name = None
+            if len(alt) == 1 and alt[0][0] is sre.SUBPATTERN:
+                name = groupnames.get(alt[0][1][0])
+            self.names.append(name)
+            try:
+                nfa.add_rule(alt, rule)
+                self.dfa_rules.append(name)
+            except _Unsupported:
+                self.re_rules.append(name)
+                try:
+                    first, nullable = _first(nfa, alt)
+                except _Unsupported:
+                    nullable = True
+                if nullable:
+                    # The rule could match anywhere.  Nothing is gained from the DFA
+                    return
+                fallback |= first
+
+        tests = [ ]
+        for key in nfa.atoms:
+            try:
+                tests.append(_atom_test(key, flags))
+            except _Unsupported:
+                return
+
+        self._nfa = nfa
+        self._classmap = _ClassMap(tests)
+        self._fallback = sum(1 << n for n in fallback)
+        self._fallback_classes = bytearray()   # class -> 1 if it can start a rule left to re
+        self._states = [ ]                     # DFA state -> set of NFA states
+        self._numbers = { }                    # set of NFA states -> DFA state
+        self._trans = [ ]                      # DFA state -> [DFA state by class]
+        self._accept = [ ]                     # DFA state -> rule number or -1
+        self._last = (None, None, 0)           # last string, its classes and length
+        self._add_state({ nfa.start })
+
+        # Build the part of the DFA used by ASCII text in advance
+        for o in range(128):
+            self._classmap[o]
+        self._update_classes()
+        st = 0
+        while st < len(self._states):
+            for c in range(len(self._fallback_classes)):
+                self._transition(st, c)
+            st += 1
+
+    # Add the DFA state for a set of NFA states (if new).  The set is closed under
+    # the epsilon edges.  Once a rule accepts, the NFA states of the rules after it
+    # are dropped since those rules can no longer be the first rule that matches.
+    def _add_state(self, nfa_states):
+        nfa = self._nfa
+        stack = list(nfa_states)
+        closure = set(stack)
+        while stack:
+            for t in nfa.eps[stack.pop()]:
+                if t not in closure:
+                    closure.add(t)
+                    stack.append(t)
+
+        rules = [ nfa.accept[s] for s in closure if s in nfa.accept ]
+        accept = min(rules, default=-1)
+        if rules:
+            closure = { s for s in closure if nfa.rule[s] <= accept }
+        if not closure:
+            return DEAD
+
+        key = frozenset(closure)
+        st = self._numbers.get(key)
+        if st is None:
+            st = self._numbers[key] = len(self._states)
+            self._states.append(key)
+            self._trans.append([ MISSING ] * len(self._fallback_classes))
+            self._accept.append(accept)
+        return st
+
+    # Compute the transition of DFA state st on class c
+    def _transition(self, st, c):
+        mask = self._classmap.masks[c]
+        edges = self._nfa.edges
+        targets = { t for s in self._states[st] for atom, t in edges[s] if mask >> atom & 1 }
+        nxt = self._trans[st][c] = self._add_state(targets) if targets else DEAD
+        return nxt
+
+    # Make room for the classes found since the last call
+    def _update_classes(self):
+        masks = self._classmap.masks
+        known = len(self._fallback_classes)
+        if known < len(masks):
+            self._fallback_classes.extend(1 if mask & self._fallback else 0 for mask in masks[known:])
+            for row in self._trans:
+                row.extend([ MISSING ] * (len(masks) - known))
+
+    # Translate a string to class numbers
+    def _translate(self, string):
+        classes = string.translate(self._classmap)
+        self._update_classes()
+        try:
+            classes = classes.encode('latin-1')
+        except UnicodeEncodeError:
+            classes = [ ord(c) for c in classes ]
+        self._last = (string, classes, len(classes))
+        return self._last
+
+    def scan(self, string, pos=0):
+        '''
+        Return (group name, end) for a match at pos, or None if there is no
+        match.  This is match() without making a match object.
+        '''
+        if self._fallback is None:
+            m = self.regex.match(string, pos)
+            return (m.lastgroup, m.end()) if m else None
+
+        last = self._last
+        if last[0] is not string:
+            last = self._translate(string)
+        string, classes, n = last
+        if pos < n and self._fallback_classes[classes[pos]]:
+            m = self.regex.match(string, pos)
+            return (m.lastgroup, m.end()) if m else None
+
+        trans = self._trans
+        accept = self._accept
+        st = 0
+        best = accept[0]
+        end = i = pos
+        while i < n:
+            nxt = trans[st][classes[i]]
+            if nxt < 0:
+                if nxt == DEAD:
+                    break
+                nxt = self._transition(st, classes[i])
+                if nxt == DEAD:
+                    break
+            st = nxt
+            i += 1
+            if accept[st] >= 0:
+                best = accept[st]
+                end = i
+
+        if best < 0:
+            return None
+        return (self.names[best], end)
+
+    def match(self, string, pos=0, endpos=None):
+        if self._fallback is None or endpos is not None:
+            return self.regex.match(string, pos) if endpos is None else self.regex.match(string, pos, endpos)
+        m = self.scan(string, pos)
+        if m is None:
+            return None
+        return Match(self, string, pos, m[1], m[0])
+
+    def __repr__(self):
+        return f'sly.dfa.compile({self.pattern!r})'
+
+def compile(pattern, flags=0):
+    '''
+    Compile a pattern.  Same as re.compile(), but matching uses a DFA.
+    Byte patterns are left to re.
+    '''
+    if isinstance(pattern, bytes):
+        return re.compile(pattern, flags)
+    return Pattern(pattern, flags)
@@ -31,10 +31,12 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 # -----------------------------------------------------------------------------
 
-__all__ = ['Lexer', 'LexerStateChange']
+__all__ = ['Lexer', 'LexerStateChange', 'LineIndex']
 
 import re
 import copy
+from array import array
+from bisect import bisect_left, bisect_right
 
 class LexError(Exception):
     '''
@@ -77,6 +79,339 @@ class Token(object):
     def __repr__(self):
         return f'Token(type={self.type!r}, value={self.value!r}, lineno={self.lineno}, index={self.index}, end={self.end})'
 
+class LineToken(Token):
+    '''
+    Token of a lexer with lazy_lineno set.  The line number is computed
+    from the index with the LineIndex of the text the first time that it's
+    read.
+    '''
+    __slots__ = ('lines', '_lineno')
+
+    # A property and not __getattr__, which would slow down reading the other attributes
+    @property
+    def lineno(self):
+        try:
+            return self._lineno
+        except AttributeError:
+            self._lineno = lineno = self.lines.line(self.index)
+            return lineno
+
+    @lineno.setter
+    def lineno(self, lineno):
+        self._lineno = lineno
+
+class ByteToken(Token):
+    '''
+    Token of a bytes-like text, such as an mmap of a file.  The value is
+    decoded (as UTF-8) from the text the first time that it's read.  With
+    lazy_lineno, the line number is computed like for a LineToken.
+    '''
+    __slots__ = ('text', 'lines')
+
+    # Only called while the value or lineno slot is empty
+    def __getattr__(self, name):
+        if name == 'value':
+            self.value = value = self.text[self.index:self.end].decode('utf-8', 'replace')
+            return value
+        if name == 'lineno':
+            self.lineno = lineno = self.lines.line(self.index)
+            return lineno
+        raise AttributeError(name)
+
+# Return the end of the UTF-8 sequence that starts at index of a bytes-like
+# text, or index + 1 if the bytes there aren't a valid sequence
+def _utf8_char_end(text, index):
+    lead = text[index]
+    end = index + (1 if lead < 0xc0 else 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4)
+    try:
+        bytes(text[index:end]).decode('utf-8')
+    except UnicodeDecodeError:
+        return index + 1
+    return end
+
+_newline_re = re.compile('\n')
+_newline_re_bytes = re.compile(b'\n')
+
+class LineIndex(object):
+    '''
+    Line numbers of the positions in a text, where the line at index is
+    lineno.  The offsets where the lines start are found in bulk the first
+    time that a line number is needed, and a line number is then found by
+    bisecting them.
+
+    edit() updates the offsets in place after an edit of the text.  Like
+    the positions of a TokenBuffer, the offsets after the edit keep their
+    old values and the shift is added when they are bisected, so an edit
+    costs the number of lines between it and the edit before it.
+    '''
+    __slots__ = ('text', 'origin', '_starts', '_shift_from', '_shift')
+
+    def __init__(self, text, index=0, lineno=1):
+        self.text = text
+        self.origin = (index, lineno)
+        self._starts = None
+        # Shift of the offsets from number _shift_from on
+        self._shift_from = 0
+        self._shift = 0
+
+    def line(self, index):
+        '''
+        Return the line number of the position index.
+        '''
+        starts = self._starts
+        if starts is None:
+            origin = self.origin[0]
+            newline_re = _newline_re if isinstance(self.text, str) else _newline_re_bytes
+            starts = self._starts = array('i', [origin])
+            starts.extend([ m.end() for m in newline_re.finditer(self.text, origin) ])
+        if self._shift:
+            return self.origin[1] + self._count(index) - 1
+        return self.origin[1] + bisect_right(starts, index) - 1
+
+    def edit(self, text, offset, deleted, inserted):
+        '''
+        Update the index for the edited text, where deleted characters at
+        offset were replaced by the inserted text.
+        '''
+        self.text = text
+        starts = self._starts
+        if starts is None:
+            return
+        if offset < self.origin[0]:
+            # The offsets are found again when they are needed
+            self._starts = None
+            self._shift_from = self._shift = 0
+            return
+        # The lines that started in the deleted text are replaced by the lines
+        # that start in the inserted text
+        first = self._count(offset)
+        last = self._count(offset + deleted)
+        self._move_shift(last)
+        newline_re = _newline_re if isinstance(inserted, str) else _newline_re_bytes
+        new = array('i', [ offset + m.end() for m in newline_re.finditer(inserted) ])
+        starts[first:last] = new
+        self._shift_from = first + len(new)
+        self._shift += len(inserted) - deleted
+        if self._shift_from >= len(starts):
+            self._shift = 0
+
+    # Number of lines that start at or before index
+    def _count(self, index):
+        starts, shift_from = self._starts, self._shift_from
+        n = bisect_right(starts, index, 0, min(shift_from, len(starts)))
+        if n == shift_from:
+            n = bisect_right(starts, index - self._shift, n)
+        return n
+
+    # Move the start of the shift to offset number n
+    def _move_shift(self, n):
+        starts, shift_from, shift = self._starts, self._shift_from, self._shift
+        if n > shift_from:
+            starts[shift_from:n] = array('i', [ v + shift for v in starts[shift_from:n] ])
+        elif n < shift_from:
+            starts[n:shift_from] = array('i', [ v - shift for v in starts[n:shift_from] ])
+        self._shift_from = n
+
+class TokenBuffer(object):
+    '''
+    All of the tokens of a text, stored as arrays: a type code, the start
+    and end index in the text and the line number of every token.  Token
+    values are sliced from the text when they are needed.  Only values that
+    differ from the text (changed by a token function) are stored.  Tokens
+    are recreated by indexing or iterating over the buffer.  The text may
+    be bytes-like, and then the values are decoded as they're sliced.
+
+    Lexer.relex() updates a buffer after an edit of its text.  The tokens
+    after the edit keep their old positions in the arrays, and the shift
+    is added when they are read, so use position() to get the positions.
+
+    The buffer of a lexer with lazy_lineno set has no line number array.
+    The line numbers are computed from the positions with the LineIndex
+    in lines instead.
+    '''
+    def __init__(self, text, lines=None):
+        self.text = text
+        self.binary = not isinstance(text, str)
+        self.names = [ ]                 # type code -> token type
+        self.codes = { }                 # token type -> type code
+        self.types = array('H')
+        self.start = array('i')
+        self.end = array('i')
+        self.lineno = array('i') if lines is None else None
+        self.lines = lines
+        self.values = { }                # token number -> value, if not the text
+        self.states = { }                # token number -> lexer class after it, where it changes
+        self.origin = (0, 1)             # index and line number where tokenizing started
+        # Shift of the positions and line numbers of the tokens from _shift_from on
+        self._shift_from = 0
+        self._shift = self._line_shift = 0
+
+    def append(self, tok):
+        if self._shift or self._line_shift:
+            self._move_shift(len(self.types))
+        code = self.codes.get(tok.type)
+        if code is None:
+            code = self.codes[tok.type] = len(self.names)
+            self.names.append(tok.type)
+        value = tok.value
+        if value.__class__ is not str or value != self._slice(tok.index, tok.end):
+            self.values[len(self.types)] = value
+        self.types.append(code)
+        self.start.append(tok.index)
+        self.end.append(tok.end)
+        if self.lines is None:
+            self.lineno.append(tok.lineno)
+
+    def extend(self, tokens):
+        for tok in tokens:
+            self.append(tok)
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, n):
+        return self.names[self.types[n]]
+
+    def position(self, n):
+        '''
+        Return the start index, end index and line number of token n.
+        '''
+        if n < 0:
+            n += len(self.types)
+        if self.lines is not None:
+            shift = self._shift if n >= self._shift_from else 0
+            index = self.start[n] + shift
+            return index, self.end[n] + shift, self.lines.line(index)
+        if n >= self._shift_from:
+            return self.start[n] + self._shift, self.end[n] + self._shift, self.lineno[n] + self._line_shift
+        return self.start[n], self.end[n], self.lineno[n]
+
+    def find(self, index):
+        '''
+        Return the number of the first token that ends after index, which
+        is the token that starts there, or the one after a token ending there.
+        '''
+        return self._count_before(index + 1)
+
+    def _slice(self, start, end):
+        if self.binary:
+            return self.text[start:end].decode('utf-8', 'replace')
+        return self.text[start:end]
+
+    def value(self, n):
+        if n in self.values:
+            return self.values[n]
+        index, end, _ = self.position(n)
+        return self._slice(index, end)
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += len(self.types)
+        tok = Token() if self.lines is None else LineToken()
+        tok.type = self.names[self.types[n]]
+        tok.value = self.value(n)
+        if self.lines is None:
+            tok.index, tok.end, tok.lineno = self.position(n)
+        else:
+            tok.index, tok.end, _ = self.position(n)
+            tok.lines = self.lines
+        return tok
+
+    def __iter__(self):
+        return self.tokens()
+
+    def tokens(self, start=0, stop=None):
+        '''
+        Generate the tokens from number start up to stop.
+        '''
+        text = self.text
+        _slice = self._slice if self.binary else None
+        names, types, starts, ends, linenos, values, lines = \
+            self.names, self.types, self.start, self.end, self.lineno, self.values, self.lines
+        shift_from, shift, line_shift = self._shift_from, self._shift, self._line_shift
+        for n in range(start, len(types) if stop is None else stop):
+            tok = Token() if lines is None else LineToken()
+            tok.type = names[types[n]]
+            index = starts[n]
+            end = ends[n]
+            if n >= shift_from:
+                index += shift
+                end += shift
+            tok.index = index
+            tok.end = end
+            if lines is None:
+                tok.lineno = linenos[n] + line_shift if n >= shift_from else linenos[n]
+            else:
+                tok.lines = lines
+            if n in values:
+                tok.value = values[n]
+            else:
+                tok.value = _slice(index, end) if _slice else text[index:end]
+            yield tok
+
+    # Size in bytes of the token arrays
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.types, self.start, self.end, self.lineno) if a is not None)
+
+    # Number of tokens that end before index
+    def _count_before(self, index):
+        n = bisect_left(self.end, index, 0, min(self._shift_from, len(self.end)))
+        if n == self._shift_from:
+            n = bisect_left(self.end, index - self._shift, n, len(self.end))
+        return n
+
+    # The lexer class after token n (-1 for the class before the first token)
+    def _state_after(self, n):
+        key = max((key for key in self.states if key <= n), default=None)
+        return self.states.get(key)
+
+    # Move the start of the shift to token n.  This costs the number of tokens it moves over
+    def _move_shift(self, n):
+        shift_from, count = self._shift_from, len(self.types)
+        for positions, shift in ((self.start, self._shift), (self.end, self._shift),
+                                 (self.lineno, self._line_shift)):
+            if not shift or positions is None:
+                continue
+            if n > shift_from:
+                positions[shift_from:n] = array('i', [ v + shift for v in positions[shift_from:min(n, count)] ])
+            elif n < shift_from:
+                positions[n:shift_from] = array('i', [ v - shift for v in positions[n:shift_from] ])
+        self._shift_from = n
+        if n >= count:
+            self._shift = self._line_shift = 0
+
+    # Replace the tokens from number first up to last with new tokens.  The
+    # tokens after them get the shift.  The text must already be the new one
+    def _splice(self, first, last, tokens, states, shift, line_shift):
+        codes, names = self.codes, self.names
+        for tok in tokens:
+            if tok.type not in codes:
+                codes[tok.type] = len(names)
+                names.append(tok.type)
+        self.types[first:last] = array('H', [ codes[tok.type] for tok in tokens ])
+        self.start[first:last] = array('i', [ tok.index for tok in tokens ])
+        self.end[first:last] = array('i', [ tok.end for tok in tokens ])
+        if self.lines is None:
+            self.lineno[first:last] = array('i', [ tok.lineno for tok in tokens ])
+
+        added = len(tokens) - (last - first)
+        def renumber(items):
+            return { (n + added if n >= last else n): item for n, item in items.items()
+                     if not first <= n < last }
+        self.values = renumber(self.values)
+        for n, tok in enumerate(tokens, first):
+            value = tok.value
+            if value.__class__ is not str or value != self._slice(tok.index, tok.end):
+                self.values[n] = value
+        self.states = renumber(self.states)
+        self.states.update(states)
+
+        self._shift_from = first + len(tokens)
+        if self._shift_from < len(self.types):
+            self._shift, self._line_shift = shift, line_shift
+        else:
+            self._shift = self._line_shift = 0
+
 class TokenStr(str):
     @staticmethod
     def __new__(cls, value, key=None, remap=None):
@@ -187,6 +522,7 @@ class Lexer(metaclass=LexerMeta):
     ignore = ''
     reflags = 0
     regex_module = re
+    lazy_lineno = False
 
     _token_names = set()
     _token_funcs = {}
@@ -333,6 +669,31 @@ class Lexer(metaclass=LexerMeta):
         if not all(isinstance(lit, str) for lit in cls.literals):
             raise LexerBuildError('literals must be specified as strings')
 
+    @classmethod
+    def _binary_master_re(cls):
+        '''
+        The master regular expression for bytes-like text.  It's compiled
+        from the UTF-8 encoding of the patterns the first time it's needed.
+        '''
+        if '_master_re_bytes' not in vars(cls):
+            pattern = cls._master_re.pattern.encode('utf-8')
+            cls._master_re_bytes = cls.regex_module.compile(pattern, cls.reflags)
+        return cls._master_re_bytes
+
+    @classmethod
+    def _ignore_re(cls, binary=False):
+        '''
+        A regular expression matching a run of ignored characters, for str
+        or for bytes-like text, or None if nothing is ignored.
+        '''
+        key = '_ignore_re_bytes' if binary else '_ignore_re_str'
+        if key not in vars(cls):
+            ignore = cls.ignore.encode('utf-8') if binary else cls.ignore
+            chars = [ re.escape(ignore[n:n+1]) for n in range(len(ignore)) ]
+            pattern = (b'[%s]+' % b''.join(chars)) if binary else f'[{"".join(chars)}]+'
+            setattr(cls, key, re.compile(pattern) if ignore else None)
+        return vars(cls)[key]
+
     def begin(self, cls):
         '''
         Begin a new lexer state
@@ -358,16 +719,33 @@ class Lexer(metaclass=LexerMeta):
         self.begin(self.__state_stack.pop())
 
     def tokenize(self, text, lineno=1, index=0):
-        _ignored_tokens = _master_re = _ignore = _token_funcs = _literals = _remapping = None
+        # Text may also be bytes-like (bytes or an mmap).  It's matched with
+        # byte patterns and the tokens are ByteTokens, with values decoded on use
+        binary = not isinstance(text, str)
+        # With lazy_lineno the line numbers of the tokens are computed on use
+        # from a LineIndex, and self.lineno is only set for error().  relex()
+        # passes the LineIndex of the whole text as the lineno
+        lines = None
+        if self.lazy_lineno:
+            lines = self.lines = lineno if isinstance(lineno, LineIndex) else LineIndex(text, index, lineno)
+            lineno = lines.origin[1]
+        _ignored_tokens = _skipped_tokens = _decoded_tokens = _master_re = _scan = _ignore = _skip_ignored = _token_funcs = _literals = _remapping = None
 
         # --- Support for state changes
         def _set_state(cls):
-            nonlocal _ignored_tokens, _master_re, _ignore, _token_funcs, _literals, _remapping
+            nonlocal _ignored_tokens, _skipped_tokens, _decoded_tokens, _master_re, _scan, _ignore, _skip_ignored, _token_funcs, _literals, _remapping
             _ignored_tokens = cls._ignored_tokens
-            _master_re = cls._master_re
-            _ignore = cls.ignore
+            _skipped_tokens = _ignored_tokens - cls._token_funcs.keys() - cls._remapping.keys()
+            _decoded_tokens = cls._token_funcs.keys() | cls._remapping.keys()
+            _master_re = cls._binary_master_re() if binary else cls._master_re
+            # A regex_module may provide scan(text, index) -> (token type, end),
+            # which saves making a match object for every token
+            _scan = getattr(_master_re, 'scan', None)
+            _ignore = cls.ignore.encode('utf-8') if binary else cls.ignore
+            _skip_ignored = _ignore and cls._ignore_re(binary).match
             _token_funcs = cls._token_funcs
-            _literals = cls.literals
+            # Indexing bytes gives an int, so only ASCII literals can match
+            _literals = { ord(lit) for lit in cls.literals if ord(lit) < 128 } if binary else cls.literals
             _remapping = cls._remapping
 
         self.__set_state = _set_state
@@ -397,21 +775,51 @@ class Lexer(metaclass=LexerMeta):
                 try:
                     if text[index] in _ignore:
                         index += 1
+                        # Longer runs of ignored characters, such as indentation,
+                        # are skipped with one match
+                        if text[index] in _ignore:
+                            index = _skip_ignored(text, index).end()
                         continue
                 except IndexError:
                     return
 
-                tok = Token()
-                tok.lineno = lineno
-                tok.index = index
-                m = _master_re.match(text, index)
+                if _scan:
+                    m = _scan(text, index)
+                    if m:
+                        toktype, end = m
+                else:
+                    m = _master_re.match(text, index)
+                    if m:
+                        toktype = m.lastgroup
+                        end = m.end()
+
                 if m:
-                    tok.end = index = m.end()
-                    tok.value = m.group()
-                    tok.type = m.lastgroup
+                    # Text of ignored tokens without an action is skipped without making a token
+                    if toktype in _skipped_tokens:
+                        index = end
+                        continue
 
-                    if tok.type in _remapping:
-                        tok.type = _remapping[tok.type].get(tok.value, tok.type)
+                    if binary:
+                        tok = ByteToken()
+                        tok.text = text
+                        # Remapped tokens and tokens with a function read their value anyway
+                        if toktype in _decoded_tokens:
+                            tok.value = text[index:end].decode('utf-8', 'replace')
+                    elif lines:
+                        tok = LineToken()
+                        tok.value = text[index:end]
+                    else:
+                        tok = Token()
+                        tok.value = text[index:end]
+                    tok.type = toktype
+                    if lines:
+                        tok.lines = lines
+                    else:
+                        tok.lineno = lineno
+                    tok.index = index
+                    tok.end = index = end
+                    if toktype in _remapping:
+                        tok.type = _remapping[toktype].get(tok.value, toktype)
 
                     if tok.type in _token_funcs:
                         self.index = index
@@ -428,19 +836,34 @@ class Lexer(metaclass=LexerMeta):
                     yield tok
 
                 else:
+                    if lines:
+                        tok = LineToken()
+                        tok.lines = lines
+                    else:
+                        tok = Token()
+                        tok.lineno = lineno
+                    tok.index = index
                     # No match, see if the character is in literals
                     if text[index] in _literals:
-                        tok.value = text[index]
+                        tok.value = chr(text[index]) if binary else text[index]
                         tok.end = index + 1
                         tok.type = tok.value
                         index += 1
                         yield tok
                     else:
-                        # A lexing error
+                        # A lexing error.  The end of the token is the end of the
+                        # illegal character.  The value of a string's error is the
+                        # rest of the text, and in bytes only the character is
+                        # decoded, which is the whole UTF-8 sequence
                         self.index = index
-                        self.lineno = lineno
+                        self.lineno = lines.line(index) if lines else lineno
                         tok.type = 'ERROR'
-                        tok.value = text[index:]
+                        if binary:
+                            tok.end = _utf8_char_end(text, index)
+                            tok.value = text[index:tok.end].decode('utf-8', 'replace')
+                        else:
+                            tok.end = index + 1
+                            tok.value = text[index:]
                         tok = self.error(tok)
                         if tok is not None:
                             tok.end = self.index
@@ -455,6 +878,119 @@ class Lexer(metaclass=LexerMeta):
             self.index = index
             self.lineno = lineno
 
+    def tokenize_all(self, text, lineno=1, index=0):
+        '''
+        Tokenize all of the text and return the tokens in a TokenBuffer.
+        '''
+        buffer, tokens = self.tokenize_buffered(text, lineno, index)
+        for tok in tokens:
+            pass
+        return buffer
+
+    def tokenize_buffered(self, text, lineno=1, index=0):
+        '''
+        Return a TokenBuffer and a generator of the tokens of the text,
+        which appends every token to the buffer as it's generated.  Once
+        the generator is exhausted, the buffer is the one tokenize_all()
+        returns.  A parser can take the tokens while the text is being
+        tokenized, so that token functions run in between its actions,
+        like with tokenize().
+        '''
+        buffer = TokenBuffer(text, LineIndex(text, index, lineno) if self.lazy_lineno else None)
+        buffer.origin = (index, lineno)
+        buffer.states[-1] = type(self)
+        return buffer, self._tokenize_into(buffer, text, lineno, index)
+
+    def _tokenize_into(self, buffer, text, lineno, index):
+        state = type(self)
+        append = buffer.append
+        for tok in self.tokenize(text, buffer.lines or lineno, index):
+            append(tok)
+            # Changes of the lexer state are kept for relex()
+            if type(self) is not state:
+                state = buffer.states[len(buffer) - 1] = type(self)
+            yield tok
+
+    def relex(self, buffer, offset, deleted, inserted):
+        '''
+        Update a TokenBuffer made by tokenize_all() after an edit of its
+        text, where deleted characters at offset were replaced by the
+        inserted text.  Tokenizing starts after the last token that ends
+        before the line of the edit, in the lexer state after that token,
+        and stops when the new tokens line up with the old ones again.
+        Line numbers are taken to count the newlines in the text.  With
+        lazy_lineno, the LineIndex of the buffer is updated in place, so
+        tokens made before the edit that haven't read their line number
+        yet get it in the edited text.  Returns the range of the token
+        numbers that were tokenized again.
+        '''
+        old_text = buffer.text
+        text = old_text[:offset] + inserted + old_text[offset + deleted:]
+        edit_end = offset + len(inserted)
+        # Start at the line of the edit, or the line before if the edit reaches
+        # the end of the text, which patterns anchored with $ look at
+        newline = b'\n' if buffer.binary else '\n'
+        line_start = old_text.rfind(newline, 0, offset) + 1
+        if old_text.find(newline, offset + deleted, len(old_text) - 1) < 0:
+            line_start = old_text.rfind(newline, 0, max(line_start - 1, 0)) + 1
+        first = buffer._count_before(line_start)
+        buffer._move_shift(first)
+        if first:
+            index = buffer.end[first - 1]
+        else:
+            index, lineno = buffer.origin
+        if buffer.lines is not None:
+            # The LineIndex of the text is updated for the edit
+            lineno = buffer.lines
+            lineno.edit(text, offset, deleted, inserted)
+        elif first:
+            lineno = buffer.lineno[first - 1] + old_text.count(newline, buffer.start[first - 1], index)
+
+        cls = type(self)
+        state = buffer._state_after(first - 1) or cls
+        starts, ends, count = buffer.start, buffer.end, len(buffer)
+        # An old token lines up with a new one at its stored index plus base
+        base = buffer._shift + len(inserted) - deleted
+        tokens = [ ]
+        states = { }
+        last = first
+        synced = None
+        self.__class__ = state
+        try:
+            for tok in self.tokenize(text, lineno, index):
+                if tok.index >= edit_end:
+                    while last < count and starts[last] + base < tok.index:
+                        last += 1
+                    if (last < count and starts[last] + base == tok.index and ends[last] + base == tok.end
+                        and buffer.type(last) == tok.type and buffer._state_after(last) is type(self)):
+                        synced = tok
+                        break
+                tokens.append(tok)
+                if type(self) is not state:
+                    state = states[first + len(tokens) - 1] = type(self)
+            else:
+                last = count
+            synced_state = type(self)
+        except BaseException:
+            # The buffer keeps the old text
+            if buffer.lines is not None:
+                buffer.lines.edit(old_text, offset, len(inserted), old_text[offset:offset + deleted])
+            raise
+        finally:
+            self.__class__ = cls
+
+        if synced:
+            shift = synced.index - starts[last]
+            line_shift = 0 if buffer.lines is not None else synced.lineno - buffer.lineno[last]
+            # The state after the lined up token is known, but may not be stored
+            if last not in buffer.states and synced_state is not state:
+                states[first + len(tokens)] = synced_state
+        else:
+            shift = line_shift = 0
+        buffer.text = text
+        buffer._splice(first, last, tokens, states, shift, line_shift)
+        return range(first, first + len(tokens))
+
     # Default implementations of the error handler. May be changed in subclasses
     def error(self, t):
         raise LexError(f'Illegal character {t.value[0]!r} at index {self.index}', t.value, self.index)
@@ -33,6 +33,8 @@
 
 import sys
 import inspect
+import linecache
+from array import array
 from collections import OrderedDict, defaultdict, Counter
 
 __all__        = [ 'Parser' ]
@@ -84,15 +86,57 @@ class SlyLogger(object):
 #        .value      = Symbol value
 #        .lineno     = Starting line number
 #        .index      = Starting lex position
+#        .first      = With position tracking, the token it starts with
 # ----------------------------------------------------------------------
 
 class YaccSymbol:
+    __slots__ = ('type', 'value', '_lineno', 'index', 'end', 'first')
+
+    # With position tracking, the line number is read from the first token
+    # when it's asked for.  Reading the line number of a token of a lexer with
+    # lazy_lineno may take a search of the newlines of the text
+    @property
+    def lineno(self):
+        try:
+            return self._lineno
+        except AttributeError:
+            first = self.first
+            self._lineno = lineno = None if first is None else first.lineno
+            return lineno
+
+    @lineno.setter
+    def lineno(self, lineno):
+        self._lineno = lineno
+
     def __str__(self):
         return self.type
 
     def __repr__(self):
         return str(self)
 
+# ----------------------------------------------------------------------
+# A subtree recorded by a parse for one of the Parser.subtree_symbols
+#
+#        .type       = Grammar symbol type
+#        .value      = Symbol value
+#        .index      = Starting lex position
+#        .end        = Ending lex position
+#        .states     = Parser states under the subtree when it started
+# ----------------------------------------------------------------------
+
+class Subtree:
+    __slots__ = ('type', 'value', 'index', 'end', 'states')
+
+    def __init__(self, type, value, index, end, states):
+        self.type = type
+        self.value = value
+        self.index = index
+        self.end = end
+        self.states = states
+
+    def __repr__(self):
+        return f'Subtree({self.type}, index={self.index}, end={self.end})'
+
 # ----------------------------------------------------------------------
 # This class is a wrapper around the objects actually passed to each
 # grammar rule.   Index lookup and assignment actually assign the
@@ -103,9 +147,9 @@ class YaccSymbol:
 
 class YaccProduction:
     __slots__ = ('_slice', '_namemap', '_stack')
-    def __init__(self, s, stack=None):
+    def __init__(self, s, stack=None, namemap=None):
         self._slice = s
-        self._namemap = { }
+        self._namemap = namemap if namemap is not None else { }
         self._stack = stack
 
     def __getitem__(self, n):
@@ -185,6 +229,10 @@ class YaccProduction:
 #       func     - Function that executes on reduce
 #       file     - File where production function is defined
 #       lineno   - Line number where production function is defined
+#       passthrough - True for a unit rule (A -> B) whose value is just the value
+#                  of B.  The parser reduces these without calling func.
+#       accessor - Subclass of YaccProduction passed to func, with a property
+#                  for each symbol name (p.expr, p.expr0, ...)
 #
 # The following attributes are defined or optional.
 #
@@ -194,7 +242,8 @@ class YaccProduction:
 
 class Production(object):
     reduced = 0
-    def __init__(self, number, name, prod, precedence=('right', 0), func=None, file='', line=0):
+    def __init__(self, number, name, prod, precedence=('right', 0), func=None, file='', line=0,
+                 passthrough=False):
         self.name     = name
         self.prod     = tuple(prod)
         self.number   = number
@@ -202,6 +251,7 @@ class Production(object):
         self.file     = file
         self.line     = line
         self.prec     = precedence
+        self.passthrough = passthrough
         
         # Internal settings used during table construction
         self.len  = len(self.prod)   # Length of the production
@@ -226,6 +276,7 @@ class Production(object):
         # Now, walk through the names and generate accessor functions
         nameuse = defaultdict(int)
         namemap = { }
+        properties = { }
         for index, key in enumerate(self.prod):
             if namecount[key] > 1:
                 k = f'{key}{nameuse[key]}'
@@ -233,6 +284,7 @@ class Production(object):
             else:
                 k = key
             namemap[k] = lambda s,i=index: s[i].value
+            properties[k] = property(lambda p,i=index: p._slice[i].value)
             if key in _name_aliases:
                 for n, alias in enumerate(_name_aliases[key]):
                     if namecount[alias] > 1:
@@ -242,8 +294,15 @@ class Production(object):
                         k = alias
                     # The value is either a list (for repetition) or a tuple for optional 
                     namemap[k] = lambda s,i=index,n=n: ([x[n] for x in s[i].value]) if isinstance(s[i].value, list) else s[i].value[n]
+                    properties[k] = property(lambda p,get=namemap[k]: get(p._slice))
 
         self.namemap = namemap
+
+        # Class of the YaccProduction objects passed to func.  Symbol names are
+        # properties, so p.name doesn't go through YaccProduction.__getattr__()
+        properties = { k: v for k, v in properties.items() if not hasattr(YaccProduction, k) }
+        self.accessor = type(f'YaccProduction_{self.number}', (YaccProduction,),
+                             { '__slots__': (), **properties })
                 
         # List of all LR items for the production
         self.lr_items = []
@@ -435,7 +494,7 @@ class Grammar(object):
     # are valid and that %prec is used correctly.
     # -----------------------------------------------------------------------------
 
-    def add_production(self, prodname, syms, func=None, file='', line=0):
+    def add_production(self, prodname, syms, func=None, file='', line=0, passthrough=False):
 
         if prodname in self.Terminals:
             raise GrammarError(f'{file}:{line}: Illegal rule name {prodname!r}. Already defined as a token')
@@ -471,6 +530,10 @@ class Grammar(object):
             precname = rightmost_terminal(syms, self.Terminals)
             prodprec = self.Precedence.get(precname, ('right', 0))
 
+        if passthrough and len(syms) != 1:
+            raise GrammarError(f'{file}:{line}: Rule {prodname!r} has {len(syms)} symbols. '
+                               'Only a rule with a single symbol can be a pass-through')
+
         # See if the rule is already in the rulemap
         map = '%s -> %s' % (prodname, syms)
         if map in self.Prodmap:
@@ -493,7 +556,7 @@ class Grammar(object):
                 self.Nonterminals[t].append(pnumber)
 
         # Create a production and add it to the list of productions
-        p = Production(pnumber, prodname, syms, prodprec, func, file, line)
+        p = Production(pnumber, prodname, syms, prodprec, func, file, line, passthrough)
         self.Productions.append(p)
         self.Prodmap[map] = p
 
@@ -888,44 +951,52 @@ class Grammar(object):
 # This is used to compute the values of Read() sets as well as FOLLOW sets
 # in LALR(1) generation.
 #
-# Inputs:  X    - An input set
-#          R    - A relation
-#          FP   - Set-valued function
+# The elements of X are the integers 0 .. n-1 and sets are represented as
+# Python integers used as bitsets, so a union is a single '|' operation.
+#
+# Inputs:  n    - Number of elements in the input set
+#          R    - A relation.  R[x] is a list of the y's related to x
+#          FP   - Set-valued function.  FP[x] is a bitset
 # ------------------------------------------------------------------------------
 
-def digraph(X, R, FP):
-    N = {}
-    for x in X:
-        N[x] = 0
+def digraph(n, R, FP):
+    N = [0] * n
     stack = []
-    F = {}
-    for x in X:
+    F = [0] * n
+    for x in range(n):
         if N[x] == 0:
-            traverse(x, N, stack, F, X, R, FP)
+            traverse(x, N, stack, F, R, FP)
     return F
 
-def traverse(x, N, stack, F, X, R, FP):
+def traverse(x, N, stack, F, R, FP):
     stack.append(x)
     d = len(stack)
     N[x] = d
-    F[x] = FP(x)             # F(X) <- F'(x)
+    F[x] = FP[x]             # F(X) <- F'(x)
 
-    rel = R(x)               # Get y's related to x
-    for y in rel:
+    for y in R[x]:           # Get y's related to x
         if N[y] == 0:
-            traverse(y, N, stack, F, X, R, FP)
-        N[x] = min(N[x], N[y])
-        for a in F.get(y, []):
-            if a not in F[x]:
-                F[x].append(a)
+            traverse(y, N, stack, F, R, FP)
+        if N[y] < N[x]:
+            N[x] = N[y]
+        F[x] |= F[y]
     if N[x] == d:
-        N[stack[-1]] = MAXINT
-        F[stack[-1]] = F[x]
         element = stack.pop()
+        N[element] = MAXINT
+        F[element] = F[x]
         while element != x:
-            N[stack[-1]] = MAXINT
-            F[stack[-1]] = F[x]
             element = stack.pop()
+            N[element] = MAXINT
+            F[element] = F[x]
+
+# Return the list of names whose bits are set in the bitset bits
+def _bitset_members(bits, names):
+    members = []
+    while bits:
+        low = bits & -bits
+        members.append(names[low.bit_length() - 1])
+        bits ^= low
+    return members
 
 class LALRError(YaccError):
     pass
@@ -947,7 +1018,11 @@ class LRTable(object):
         self.lr_productions  = grammar.Productions    # Copy of grammar Production array
         self.lr_goto_cache = {}        # Cache of computed gotos
         self.lr0_cidhash   = {}        # Cache of closures
-        self._add_count    = 0         # Internal counter used to detect cycles
+        self.lr0_gotostate = {}        # Cache of (state, symbol) -> state number
+
+        # Terminals numbered for the bitsets used during LALR(1) lookahead computation
+        self.lr_terminals  = sorted(grammar.Terminals) + ['$end']
+        self.lr_terminal_index = { t: n for n, t in enumerate(self.lr_terminals) }
 
         # Diagonistic information filled in by the table generator
         self.state_descriptions = OrderedDict()
@@ -979,22 +1054,20 @@ class LRTable(object):
                 self.defaulted_states[state] = rules[0]
 
     # Compute the LR(0) closure operation on I, where I is a set of LR(0) items.
+    # Productions already added are marked in a bytearray indexed by production
+    # number.  J grows while it is being iterated, so one pass is enough.
     def lr0_closure(self, I):
-        self._add_count += 1
+        added = bytearray(len(self.grammar.Productions))
 
         # Add everything in I to J
         J = I[:]
-        didadd = True
-        while didadd:
-            didadd = False
-            for j in J:
-                for x in j.lr_after:
-                    if getattr(x, 'lr0_added', 0) == self._add_count:
-                        continue
-                    # Add B --> .G to J
-                    J.append(x.lr_next)
-                    x.lr0_added = self._add_count
-                    didadd = True
+        for j in J:
+            for x in j.lr_after:
+                if added[x.number]:
+                    continue
+                # Add B --> .G to J
+                J.append(x.lr_next)
+                added[x.number] = 1
 
         return J
 
@@ -1039,6 +1112,14 @@ class LRTable(object):
         self.lr_goto_cache[(id(I), x)] = g
         return g
 
+    # Return the state number reached from state number st on symbol x,
+    # or -1 if there is no such transition.
+    def lr0_goto_state(self, C, st, x):
+        j = self.lr0_gotostate.get((st, x))
+        if j is None:
+            j = self.lr0_gotostate[st, x] = self.lr0_cidhash.get(id(self.lr0_goto(C[st], x)), -1)
+        return j
+
     # Compute the LR(0) sets of item function
     def lr0_items(self):
         C = [self.lr0_closure([self.grammar.Productions[0].lr_next])]
@@ -1126,15 +1207,15 @@ class LRTable(object):
     # -----------------------------------------------------------------------------
 
     def find_nonterminal_transitions(self, C):
-        trans = []
+        trans = {}
+        Nonterminals = self.grammar.Nonterminals
         for stateno, state in enumerate(C):
             for p in state:
                 if p.lr_index < p.len - 1:
-                    t = (stateno, p.prod[p.lr_index+1])
-                    if t[1] in self.grammar.Nonterminals:
-                        if t not in trans:
-                            trans.append(t)
-        return trans
+                    N = p.prod[p.lr_index+1]
+                    if N in Nonterminals:
+                        trans[stateno, N] = None
+        return list(trans)
 
     # -----------------------------------------------------------------------------
     # dr_relation()
@@ -1142,35 +1223,36 @@ class LRTable(object):
     # Computes the DR(p,A) relationships for non-terminal transitions.  The input
     # is a tuple (state,N) where state is a number and N is a nonterminal symbol.
     #
-    # Returns a list of terminals.
+    # Returns a bitset of terminal numbers (see lr_terminal_index).
     # -----------------------------------------------------------------------------
 
     def dr_relation(self, C, trans, nullable):
-        dr_set = {}
         state, N = trans
-        terms = []
+        Terminals = self.grammar.Terminals
+        tindex = self.lr_terminal_index
+        terms = 0
 
         g = self.lr0_goto(C[state], N)
         for p in g:
             if p.lr_index < p.len - 1:
                 a = p.prod[p.lr_index+1]
-                if a in self.grammar.Terminals:
-                    if a not in terms:
-                        terms.append(a)
+                if a in Terminals:
+                    terms |= 1 << tindex[a]
 
         # This extra bit is to handle the start state
         if state == 0 and N == self.grammar.Productions[0].prod[0]:
-            terms.append('$end')
+            terms |= 1 << tindex['$end']
 
         return terms
 
     # -----------------------------------------------------------------------------
     # reads_relation()
     #
-    # Computes the READS() relation (p,A) READS (t,C).
+    # Computes the READS() relation (p,A) READS (t,C).  Transitions are given
+    # by their position in the list of non-terminal transitions (transindex).
     # -----------------------------------------------------------------------------
 
-    def reads_relation(self, C, trans, empty):
+    def reads_relation(self, C, trans, empty, transindex):
         # Look for empty transitions
         rel = []
         state, N = trans
@@ -1181,7 +1263,7 @@ class LRTable(object):
             if p.lr_index < p.len - 1:
                 a = p.prod[p.lr_index + 1]
                 if a in empty:
-                    rel.append((j, a))
+                    rel.append(transindex[j, a])
 
         return rel
 
@@ -1195,8 +1277,8 @@ class LRTable(object):
     # This relation is determined by running the LR(0) state machine forward.
     # For example, starting with a production "N : . A B C", we run it forward
     # to obtain "N : A B C ."   We then build a relationship between this final
-    # state and the starting state.   These relationships are stored in a dictionary
-    # lookdict.
+    # state and the starting state.   These relationships are stored in a list
+    # indexed by transition number.
     #
     # INCLUDES:
     #
@@ -1211,21 +1293,21 @@ class LRTable(object):
     # L is essentially a prefix (which may be empty), T is a suffix that must be
     # able to derive an empty string.  State p' must lead to state p with the string L.
     #
+    # Both relations are returned as lists indexed by transition number.
     # -----------------------------------------------------------------------------
 
     def compute_lookback_includes(self, C, trans, nullable):
-        lookdict = {}          # Dictionary of lookback relations
-        includedict = {}       # Dictionary of include relations
+        Terminals = self.grammar.Terminals
+        Productions = self.grammar.Productions
+        lookbacks = []                           # Lookback relations
+        includes = [[] for _ in trans]           # Include relations
 
-        # Make a dictionary of non-terminal transitions
-        dtrans = {}
-        for t in trans:
-            dtrans[t] = 1
+        # Map each non-terminal transition to its number
+        dtrans = { t: n for n, t in enumerate(trans) }
 
         # Loop over all transitions and compute lookbacks and includes
-        for state, N in trans:
+        for n, (state, N) in enumerate(trans):
             lookb = []
-            includes = []
             for p in C[state]:
                 if p.name != N:
                     continue
@@ -1240,46 +1322,31 @@ class LRTable(object):
                     t = p.prod[lr_index]
 
                     # Check to see if this symbol and state are a non-terminal transition
-                    if (j, t) in dtrans:
+                    i = dtrans.get((j, t))
+                    if i is not None:
                         # Yes.  Okay, there is some chance that this is an includes relation
                         # the only way to know for certain is whether the rest of the
                         # production derives empty
-
                         li = lr_index + 1
                         while li < p.len:
-                            if p.prod[li] in self.grammar.Terminals:
+                            if p.prod[li] in Terminals:
                                 break      # No forget it
                             if p.prod[li] not in nullable:
                                 break
                             li = li + 1
                         else:
                             # Appears to be a relation between (j,t) and (state,N)
-                            includes.append((j, t))
+                            includes[i].append(n)
 
-                    g = self.lr0_goto(C[j], t)               # Go to next set
-                    j = self.lr0_cidhash.get(id(g), -1)      # Go to next state
+                    j = self.lr0_goto_state(C, j, t)         # Go to next state
 
-                # When we get here, j is the final state, now we have to locate the production
-                for r in C[j]:
-                    if r.name != p.name:
-                        continue
-                    if r.len != p.len:
-                        continue
-                    i = 0
-                    # This look is comparing a production ". A B C" with "A B C ."
-                    while i < r.lr_index:
-                        if r.prod[i] != p.prod[i+1]:
-                            break
-                        i = i + 1
-                    else:
-                        lookb.append((j, r))
-            for i in includes:
-                if i not in includedict:
-                    includedict[i] = []
-                includedict[i].append((state, N))
-            lookdict[(state, N)] = lookb
+                # When we get here, j is the final state.  Only an item that started
+                # with the . at the far left ends up as the completed production "N : A B C ."
+                if p.lr_index == 0:
+                    lookb.append((j, Productions[p.number].lr_items[-1]))
+            lookbacks.append(lookb)
 
-        return lookdict, includedict
+        return lookbacks, includes
 
     # -----------------------------------------------------------------------------
     # compute_read_sets()
@@ -1290,14 +1357,14 @@ class LRTable(object):
     #          ntrans   = Set of nonterminal transitions
     #          nullable = Set of empty transitions
     #
-    # Returns a set containing the read sets
+    # Returns a list of bitsets indexed by transition number
     # -----------------------------------------------------------------------------
 
     def compute_read_sets(self, C, ntrans, nullable):
-        FP = lambda x: self.dr_relation(C, x, nullable)
-        R =  lambda x: self.reads_relation(C, x, nullable)
-        F = digraph(ntrans, R, FP)
-        return F
+        transindex = { t: n for n, t in enumerate(ntrans) }
+        FP = [ self.dr_relation(C, x, nullable) for x in ntrans ]
+        R = [ self.reads_relation(C, x, nullable, transindex) for x in ntrans ]
+        return digraph(len(ntrans), R, FP)
 
     # -----------------------------------------------------------------------------
     # compute_follow_sets()
@@ -1312,14 +1379,11 @@ class LRTable(object):
     #            readsets   = Readset (previously computed)
     #            inclsets   = Include sets (previously computed)
     #
-    # Returns a set containing the follow sets
+    # Returns a list of bitsets indexed by transition number
     # -----------------------------------------------------------------------------
 
     def compute_follow_sets(self, ntrans, readsets, inclsets):
-        FP = lambda x: readsets[x]
-        R  = lambda x: inclsets.get(x, [])
-        F = digraph(ntrans, R, FP)
-        return F
+        return digraph(len(ntrans), inclsets, readsets)
 
     # -----------------------------------------------------------------------------
     # add_lookaheads()
@@ -1330,19 +1394,28 @@ class LRTable(object):
     #            followset         -  Computed follow set
     #
     # This function directly attaches the lookaheads to productions contained
-    # in the lookbacks set
+    # in the lookbacks set.  The bitsets are turned back into lists of terminal
+    # names (in lr_terminals order) once everything has been merged.
     # -----------------------------------------------------------------------------
 
     def add_lookaheads(self, lookbacks, followset):
-        for trans, lb in lookbacks.items():
+        merged = {}
+        for n, lb in enumerate(lookbacks):
+            f = followset[n]
             # Loop over productions in lookback
             for state, p in lb:
-                if state not in p.lookaheads:
-                    p.lookaheads[state] = []
-                f = followset.get(trans, [])
-                for a in f:
-                    if a not in p.lookaheads[state]:
-                        p.lookaheads[state].append(a)
+                key = (id(p), state)
+                if key in merged:
+                    merged[key][2] |= f
+                else:
+                    merged[key] = [p, state, f]
+
+        names = {}
+        for p, state, bits in merged.values():
+            laheads = names.get(bits)
+            if laheads is None:
+                laheads = names[bits] = _bitset_members(bits, self.lr_terminals)
+            p.lookaheads[state] = list(laheads)
 
     # -----------------------------------------------------------------------------
     # add_lalr_lookaheads()
@@ -1566,6 +1639,440 @@ class LRTable(object):
 
         return '\n'.join(out)
 
+# -----------------------------------------------------------------------------
+#                           == CompactLRTable ==
+#
+# An alternate representation of the tables in an LRTable.  Terminals and
+# nonterminals are numbered and the tables are stored in flat arrays using
+# row-displacement ("comb") compression:
+#
+#   - Each state gets a default action.  This is the most common reduction in
+#     the state (if there is one), otherwise an error.  Only the actions that
+#     differ from the default are stored.  Actions on the 'error' token are
+#     always stored and never defaulted, so error recovery only reduces where
+#     the grammar really allows it.
+#
+#   - The remaining actions of state s are stored at action_value[action_base[s] + t]
+#     where t is the terminal number.  action_check[] holds the state number that
+#     owns each slot, so a lookup is
+#
+#         i = action_base[s] + t
+#         act = action_value[i] if action_check[i] == s else default_action[s]
+#
+#   - The goto table is stored the same way, but by nonterminal column, with the
+#     most common target state of each nonterminal as its default.
+#
+# Actions are encoded as in LRTable (shift > 0, reduce < 0, accept == 0)
+# with ACTION_ERROR marking a syntax error.
+# -----------------------------------------------------------------------------
+
+ACTION_ERROR = -2**31
+
+class CompactLRTable(object):
+    def __init__(self, lrtable, default_reductions=True):
+        grammar = lrtable.grammar
+
+        # Number the grammar symbols
+        self.terminals = list(lrtable.lr_terminals)
+        self.terminal_index = { t: n for n, t in enumerate(self.terminals) }
+        self.error_terminal = self.terminal_index['error']
+        # Token types that aren't terminals of the grammar get a column with no
+        # actions, so they are looked up like any terminal that isn't expected
+        self.unknown_terminal = len(self.terminals)
+        self.nonterminals = sorted(grammar.Nonterminals)
+        self.nonterminal_index = { n: i for i, n in enumerate(self.nonterminals) }
+
+        # Production lengths and left hand sides, indexed by production number
+        self.production_len = array('i', (p.len for p in grammar.Productions))
+        self.production_lhs = array('i', (self.nonterminal_index.get(p.name, -1)
+                                         for p in grammar.Productions))
+
+        nstates = len(lrtable.lr_action)
+
+        # Default actions.  States in 'defaulted' reduce without reading a lookahead
+        self.default_action = array('i', [ACTION_ERROR]) * nstates
+        self.defaulted = bytearray(nstates)
+        rows = []
+        for st in range(nstates):
+            actions = lrtable.lr_action[st]
+            default = ACTION_ERROR
+            if st in lrtable.defaulted_states:
+                default = lrtable.defaulted_states[st]
+                self.defaulted[st] = 1
+            elif default_reductions:
+                reductions = Counter(a for a in actions.values() if a is not None and a < 0)
+                if reductions:
+                    default = reductions.most_common(1)[0][0]
+            self.default_action[st] = default
+            row = { }
+            for name, a in actions.items():
+                if a is None:
+                    a = ACTION_ERROR
+                if a != default or name == 'error':
+                    row[self.terminal_index[name]] = a
+            rows.append(row)
+
+        self.action_base, self.action_check, self.action_value = \
+            _pack_rows(rows, len(self.terminals) + 1)
+
+        # Goto columns, one per nonterminal
+        columns = [ { } for _ in self.nonterminals ]
+        for st, gotos in lrtable.lr_goto.items():
+            for name, j in gotos.items():
+                columns[self.nonterminal_index[name]][st] = j
+
+        self.goto_default = array('i', [-1]) * len(columns)
+        for n, column in enumerate(columns):
+            if column:
+                default = Counter(column.values()).most_common(1)[0][0]
+                self.goto_default[n] = default
+                columns[n] = { st: j for st, j in column.items() if j != default }
+
+        self.goto_base, self.goto_check, self.goto_value = \
+            _pack_rows(columns, nstates)
+
+        # States that reduce without reading a lookahead, as in LRTable
+        self.defaulted_states = { st: self.default_action[st] for st in range(nstates) if self.defaulted[st] }
+
+    # Total size in bytes of the table arrays
+    def nbytes(self):
+        arrays = [ self.production_len, self.production_lhs, self.default_action,
+                   self.action_base, self.action_check, self.action_value,
+                   self.goto_default, self.goto_base, self.goto_check, self.goto_value ]
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.defaulted)
+
+# -----------------------------------------------------------------------------
+# _pack_rows()
+#
+# Pack a list of sparse rows (dicts mapping column -> value) into the
+# base/check/value arrays of a row-displacement table.  Rows are placed first-fit,
+# largest first.  The arrays are padded so that base[r] + width never runs off
+# the end, which lets lookups skip the bounds check.
+# -----------------------------------------------------------------------------
+
+def _pack_rows(rows, width):
+    base = array('i', [0]) * len(rows)
+    used = bytearray()
+    entries = {}
+    top = 0
+    for r in sorted(range(len(rows)), key=lambda r: -len(rows[r])):
+        row = rows[r]
+        if not row:
+            continue
+        cols = sorted(row)
+        b = 0
+        while True:
+            if len(used) < b + cols[-1] + 1:
+                used.extend(bytes(b + cols[-1] + 1 - len(used)))
+            if not any(used[b + c] for c in cols):
+                break
+            b += 1
+        base[r] = b
+        for c in cols:
+            used[b + c] = 1
+            entries[b + c] = (r, row[c])
+        top = max(top, b + cols[-1] + 1)
+
+    size = max(top, max(base, default=0) + width)
+    check = array('i', [-1]) * size
+    value = array('i', [0]) * size
+    for i, (r, v) in entries.items():
+        check[i] = r
+        value[i] = v
+    return base, check, value
+
+# -----------------------------------------------------------------------------
+#                           === Generated parse functions ===
+#
+# A Parser with generate_parse set parses with a function written for its grammar.
+# The function is the same algorithm as Parser.parse(), but production names,
+# lengths and pass-through flags are constants in its source, the goto column
+# of each production is found with the production, the state is kept in a local
+# variable, the _slice of the YaccProduction is set without going through its
+# __setattr__() and the position tracking code is only there when it is used.
+#
+# With a CompactLRTable, the arrays of the table are indexed in the function
+# itself, with the terminal number of each lookahead and the nonterminal number
+# of each production.
+#
+# Lines of the template below starting with a tag are kept only when:
+#
+#     T|   positions are tracked
+#     P|   the grammar has pass-through rules
+#     S|   subtrees are recorded (see Parser.subtree_symbols)
+#     D|   the tables are the dictionary tables of an LRTable
+#     C|   the tables are the arrays of a CompactLRTable
+#
+# and a line with several tags is kept when all of them apply.  The states
+# argument of the function is only used when subtrees are recorded.
+# -----------------------------------------------------------------------------
+
+_parse_template = '''\
+def parse(self, tokens, states=None):
+    lookahead = None
+    lookaheadstack = []
+    set_slice = SET_SLICE
+    errorcount = 0
+    self.tokens = tokens
+    self.statestack = statestack = []
+    self.symstack = symstack = []
+    pslices = [ p.accessor(None, symstack, p.namemap) for p in PRODUCTION ]
+    self.restart()
+    state = 0
+T|  positions = self._positions
+C|  action_base, action_check, action_value = ACTION_BASE, ACTION_CHECK, ACTION_VALUE
+C|  goto_base, goto_check, goto_value = GOTO_BASE, GOTO_CHECK, GOTO_VALUE
+C|  default_action, goto_default = DEFAULT_ACTION, GOTO_DEFAULT
+S|  self.subtrees = subtrees = [ ]
+S|  base = 0
+S|  top = None
+S|  if states:
+S|      # Parse a single subtree on top of the given states
+S|      statestack[:] = states
+S|      symstack.extend(YaccSymbol() for _ in states[1:])
+S|      state = statestack[-1]
+S|      base = len(states)
+    errtoken = None
+    while True:
+        t = DEFAULTED[state]
+        if t is None:
+            if lookahead is None:
+                if lookaheadstack:
+                    lookahead = lookaheadstack.pop()
+                else:
+                    lookahead = next(tokens, None)
+                    if lookahead is None:
+                        lookahead = YaccSymbol()
+                        lookahead.type = '$end'
+C|              terminal = TERMINALS.get(lookahead.type, UNKNOWN_TERMINAL)
+D|          t = ACTIONS[state].get(lookahead.type)
+C|          i = action_base[state] + terminal
+C|          if action_check[i] == state:
+C|              t = action_value[i]
+C|          elif terminal == ERROR_TERMINAL:
+C|              t = None
+C|          else:
+C|              t = default_action[state]
+
+        if t is not None:
+            if t > 0:
+                statestack.append(t)
+                state = t
+                symstack.append(lookahead)
+                lookahead = None
+                if errorcount:
+                    errorcount -= 1
+                continue
+
+            if t < 0:
+D|              self.production, pname, plen, func, gotos, passthrough = PRODUCTIONS[-t]
+C|              self.production, pname, plen, func, lhs, passthrough = PRODUCTIONS[-t]
+S|              # A single subtree ends when it's reduced into a symbol with the ones under it,
+S|              # or into a symbol that isn't recorded
+S|              if len(statestack) - plen <= base:
+S|                  if len(statestack) - plen < base or (top and pname not in RECORDED):
+S|                      return top
+P|              if passthrough:
+P|                  sym = symstack[-1]
+P|                  if sym.__class__ is not YaccSymbol:
+P|                      tok = sym
+P|                      sym = symstack[-1] = YaccSymbol()
+P|                      sym.value = tok.value
+PT|                     sym.first = tok
+PT|                     sym.index = tok.index
+PT|                     sym.end = tok.end
+PT|                     positions[id(sym.value)] = (sym.value, sym)
+P|                  sym.type = pname
+PS|                 if pname in RECORDED:
+PS|                     subtree = Subtree(pname, sym.value, sym.index, sym.end, tuple(statestack[:-1]))
+PS|                     subtrees.append(subtree)
+PS|                     if len(statestack) - 1 == base:
+PS|                         top = subtree
+PD|                 state = statestack[-1] = gotos[statestack[-2]]
+PC|                 i = goto_base[lhs] + statestack[-2]
+PC|                 state = statestack[-1] = goto_value[i] if goto_check[i] == lhs else goto_default[lhs]
+P|                  continue
+                pslice = pslices[-t]
+                set_slice(pslice, symstack[-plen:] if plen else [])
+                self.state = state
+                value = func(self, pslice)
+                if value is pslice:
+                    value = (pname, *(s.value for s in pslice._slice))
+                sym = YaccSymbol()
+                sym.type = pname
+                sym.value = value
+                if plen:
+T|                  first = symstack[-plen]
+T|                  sym.first = getattr(first, 'first', first)
+T|                  sym.index = first.index
+T|                  sym.end = symstack[-1].end
+                    del symstack[-plen:]
+                    del statestack[-plen:]
+T|              else:
+T|                  sym.first = sym.index = sym.end = None
+T|              positions[id(value)] = (value, sym)
+S|              if pname in RECORDED:
+S|                  subtree = Subtree(pname, value, sym.index, sym.end, tuple(statestack))
+S|                  subtrees.append(subtree)
+S|                  if len(statestack) == base:
+S|                      top = subtree
+                symstack.append(sym)
+D|              state = gotos[statestack[-1]]
+C|              i = goto_base[lhs] + statestack[-1]
+C|              state = goto_value[i] if goto_check[i] == lhs else goto_default[lhs]
+                statestack.append(state)
+                continue
+
+            return getattr(symstack[-1], 'value', None)
+
+        # Syntax error.  Error recovery is the same as in Parser.parse()
+S|      # A single subtree isn't recovered, the tokens don't start with one
+S|      if base:
+S|          return None
+        if errorcount == 0 or self.errorok:
+            errorcount = ERROR_COUNT
+            self.errorok = False
+            if lookahead.type == '$end':
+                errtoken = None
+            else:
+                errtoken = lookahead
+            self.state = state
+            tok = self.error(errtoken)
+            state = self.state
+            if tok:
+                lookahead = tok
+C|              terminal = TERMINALS.get(tok.type, UNKNOWN_TERMINAL)
+                self.errorok = True
+                continue
+            elif not errtoken:
+                return
+        else:
+            errorcount = ERROR_COUNT
+
+        if len(statestack) <= 1 and lookahead.type != '$end':
+            lookahead = None
+            self.state = state = 0
+            del lookaheadstack[:]
+            continue
+
+        if lookahead.type == '$end':
+            return
+
+        if lookahead.type != 'error':
+            sym = symstack[-1]
+            if sym.type == 'error':
+                lookahead = None
+                continue
+            t = YaccSymbol()
+            t.type = 'error'
+            if hasattr(lookahead, 'lineno'):
+                t.lineno = lookahead.lineno
+            if hasattr(lookahead, 'index'):
+                t.index = lookahead.index
+            if hasattr(lookahead, 'end'):
+                t.end = lookahead.end
+            t.value = lookahead
+            lookaheadstack.append(lookahead)
+            lookahead = t
+C|          terminal = ERROR_TERMINAL
+        else:
+            symstack.pop()
+            statestack.pop()
+            self.state = state = statestack[-1]
+'''
+
+def generate_parse_source(grammar, lrtable, track_positions=True, subtree_symbols=()):
+    '''
+    Return the Python source of a parse function for the given grammar and
+    tables, an LRTable or a CompactLRTable.  The function expects the tables
+    and helpers that compile_parse() puts in its globals.  The subtrees of the
+    nonterminals in subtree_symbols are recorded, which needs track_positions.
+    '''
+    productions = grammar.Productions
+    compact = isinstance(lrtable, CompactLRTable)
+    keep = { 'T': track_positions,
+             'S': bool(subtree_symbols),
+             'P': any(p.passthrough for p in productions[1:]),
+             'D': not compact,
+             'C': compact }
+    lines = [ ]
+    for line in _parse_template.splitlines():
+        tags, bar, code = line.partition('|')
+        if bar and tags.isupper():
+            if not all(keep[tag] for tag in tags):
+                continue
+            line = ' ' * len(tags + bar) + code
+        lines.append(line)
+
+    # States that reduce without reading a lookahead
+    nstates = len(lrtable.default_action) if compact else len(lrtable.lr_action)
+    defaulted = [ lrtable.defaulted_states.get(st) for st in range(nstates) ]
+
+    # One constant tuple per production, with the goto column of the production:
+    # a dictionary of the LRTable or the nonterminal number of the CompactLRTable
+    entries = [ '    None,' ]
+    for p in productions[1:]:
+        goto = lrtable.production_lhs[p.number] if compact else f'GOTOS[{p.name!r}]'
+        entries.append(f'    (PRODUCTION[{p.number}], {p.name!r}, {p.len}, FUNCTIONS[{p.number}], '
+                       f'{goto}, {bool(p.passthrough)}),   # {p}')
+
+    header = [ f'# Parse function for {len(productions)} productions and {len(defaulted)} states',
+               f'DEFAULTED = {defaulted!r}',
+               'PRODUCTIONS = (', *entries, ')',
+               '' ]
+    if subtree_symbols:
+        header[-1:-1] = [ f'RECORDED = frozenset({sorted(subtree_symbols)!r})' ]
+    return '\n'.join(header + lines) + '\n'
+
+def compile_parse(grammar, lrtable, track_positions=True, name='<sly parse>', subtree_symbols=()):
+    '''
+    Generate and compile a parse function for the given grammar and tables,
+    an LRTable or a CompactLRTable.
+    '''
+    productions = grammar.Productions
+    namespace = {
+        'YaccSymbol': YaccSymbol,
+        'YaccProduction': YaccProduction,
+        'Subtree': Subtree,
+        'ERROR_COUNT': ERROR_COUNT,
+        'SET_SLICE': YaccProduction._slice.__set__,
+        'PRODUCTION': productions,
+        'FUNCTIONS': [ p.func for p in productions ],
+        }
+    if isinstance(lrtable, CompactLRTable):
+        # The function indexes lists of the arrays, which is faster than indexing
+        # the arrays, with None for ACTION_ERROR like the dictionary tables
+        def actions(a):
+            return [ None if act == ACTION_ERROR else act for act in a ]
+
+        namespace.update({
+            'TERMINALS': lrtable.terminal_index,
+            'UNKNOWN_TERMINAL': lrtable.unknown_terminal,
+            'ERROR_TERMINAL': lrtable.error_terminal,
+            'ACTION_BASE': list(lrtable.action_base),
+            'ACTION_CHECK': list(lrtable.action_check),
+            'ACTION_VALUE': actions(lrtable.action_value),
+            'DEFAULT_ACTION': actions(lrtable.default_action),
+            'GOTO_BASE': list(lrtable.goto_base),
+            'GOTO_CHECK': list(lrtable.goto_check),
+            'GOTO_VALUE': list(lrtable.goto_value),
+            'GOTO_DEFAULT': list(lrtable.goto_default),
+            })
+    else:
+        gotos = defaultdict(dict)
+        for st, row in lrtable.lr_goto.items():
+            for nt, j in row.items():
+                gotos[nt][st] = j
+        namespace['ACTIONS'] = [ lrtable.lr_action[st] for st in range(len(lrtable.lr_action)) ]
+        namespace['GOTOS'] = gotos
+    source = generate_parse_source(grammar, lrtable, track_positions, subtree_symbols)
+    # Register the source so that tracebacks through the parse function show it
+    linecache.cache[name] = (len(source), None, source.splitlines(True), name)
+    exec(compile(source, name, 'exec'), namespace)
+    func = namespace['parse']
+    func.source = source
+    return func
+
 # Collect grammar rules from a function
 def _collect_grammar_rules(func):
     grammar = []
@@ -1574,8 +2081,10 @@ def _collect_grammar_rules(func):
         unwrapped = inspect.unwrap(func)
         filename = unwrapped.__code__.co_filename
         lineno = unwrapped.__code__.co_firstlineno
+        passthrough = getattr(func, 'passthrough', ())
         for rule, lineno in zip(func.rules, range(lineno+len(func.rules)-1, 0, -1)):
             syms = rule.split()
+            pt = rule in passthrough
             ebnf_prod = []
             while ('{' in syms) or ('[' in syms):
                 for s in syms:
@@ -1593,9 +2102,9 @@ def _collect_grammar_rules(func):
                         break
 
             if syms[1:2] == [':'] or syms[1:2] == ['::=']:
-                grammar.append((func, filename, lineno, syms[0], syms[2:]))
+                grammar.append((func, filename, lineno, syms[0], syms[2:], pt))
             else:
-                grammar.append((func, filename, lineno, prodname, syms))
+                grammar.append((func, filename, lineno, prodname, syms, pt))
             grammar.extend(ebnf_prod)
             
         func = getattr(func, 'next_func', None)
@@ -1779,7 +2288,7 @@ def _generate_choice_rules(symbols):
     def choice(self, p):
         return p[0]
     choice.__name__ = name
-    choice = _(*symbols)(choice)
+    choice = _(*symbols, passthrough=True)(choice)
     productions.extend(_collect_grammar_rules(choice))
     return name, productions
     
@@ -1800,10 +2309,12 @@ class ParserMetaDict(dict):
         else:
             return super().__getitem__(key)
 
-def _decorator(rule, *extra):
+def _decorator(rule, *extra, passthrough=False):
      rules = [rule, *extra]
      def decorate(func):
          func.rules = [ *getattr(func, 'rules', []), *rules[::-1] ]
+         if passthrough:
+             func.passthrough = { *getattr(func, 'passthrough', ()), *rules }
          return func
      return decorate
 
@@ -1821,7 +2332,9 @@ class ParserMeta(type):
         return cls
 
 class Parser(metaclass=ParserMeta):
-    # Automatic tracking of position information
+    # Automatic tracking of position information.  When False, nonterminals get
+    # no position attributes and line_position()/index_position() are unavailable.
+    # p.lineno and p.index then only see the tokens of a rule.
     track_positions = True
     
     # Logging object where debugging/diagnostic messages are sent
@@ -1830,6 +2343,19 @@ class Parser(metaclass=ParserMeta):
     # Debugging filename where parsetab.out data can be written
     debugfile = None
 
+    # Parse with the array based CompactLRTable instead of the dictionary tables.
+    # Because of its default reductions, a syntax error may be reported after
+    # some extra reductions have been made.
+    compact_tables = False
+
+    # Parse with a parse function generated and compiled for this grammar
+    generate_parse = False
+
+    # Nonterminals whose subtrees parse() records in self.subtrees, so that
+    # parse_subtree() can parse one of them again after an edit of its tokens.
+    # Recording parses with a generated parse function that tracks positions.
+    subtree_symbols = ()
+
     @classmethod
     def __validate_tokens(cls):
         if not hasattr(cls, 'tokens'):
@@ -1910,9 +2436,9 @@ class Parser(metaclass=ParserMeta):
         for name, func in rules:
             try:
                 parsed_rule = _collect_grammar_rules(func)
-                for pfunc, rulefile, ruleline, prodname, syms in parsed_rule:
+                for pfunc, rulefile, ruleline, prodname, syms, passthrough in parsed_rule:
                     try:
-                        grammar.add_production(prodname, syms, pfunc, rulefile, ruleline)
+                        grammar.add_production(prodname, syms, pfunc, rulefile, ruleline, passthrough)
                     except GrammarError as e:
                         errors += f'{e}\n'
             except SyntaxError as e:
@@ -2027,6 +2553,11 @@ class Parser(metaclass=ParserMeta):
                 f.write(str(cls._lrtable))
             cls.log.info('Parser debugging for %s written to %s', cls.__qualname__, cls.debugfile)
 
+        # Replace the dictionary tables with their compact form
+        if cls.compact_tables:
+            cls._compact_lrtable = CompactLRTable(cls._lrtable)
+            cls._lrtable = None
+
     # ----------------------------------------------------------------------
     # Parsing Support.  This is the parsing runtime that users use to
     # ----------------------------------------------------------------------
@@ -2063,29 +2594,58 @@ class Parser(metaclass=ParserMeta):
 
     def parse(self, tokens):
         '''
-        Parse the given input tokens.
+        Parse the given input tokens.  tokens is an iterator or any other
+        iterable of tokens, such as the TokenBuffer of Lexer.tokenize_all().
         '''
+        tokens = iter(tokens)
+        # Positions are recorded for the values of this parse only
+        self._positions = { }
+        try:
+            if self.subtree_symbols:
+                return self._subtree_parse()(self, tokens)
+            if self.generate_parse:
+                compact_lrtable = self._compact_lrtable if self.compact_tables else None
+                return self._generated_parse(self.track_positions, compact_lrtable=compact_lrtable)(self, tokens)
+            return self._parse_tokens(tokens)
+        finally:
+            self._positions.clear()
+
+    # The generic parse loop, for any grammar and either kind of tables
+    def _parse_tokens(self, tokens):
+        compact = self.compact_tables
         lookahead = None                                  # Current lookahead symbol
         lookaheadstack = []                               # Stack of lookahead symbols
-        actions = self._lrtable.lr_action                 # Local reference to action table (to avoid lookup on self.)
-        goto    = self._lrtable.lr_goto                   # Local reference to goto table (to avoid lookup on self.)
         prod    = self._grammar.Productions               # Local reference to production list (to avoid lookup on self.)
-        defaulted_states = self._lrtable.defaulted_states # Local reference to defaulted states
-        pslice  = YaccProduction(None)                    # Production object passed to grammar rules
+        if compact:
+            # The compact tables are indexed with the terminal number of the lookahead,
+            # which is looked up once per lookahead, and the nonterminal number of
+            # the production (see CompactLRTable)
+            lrtable = self._compact_lrtable
+            terminal_index = lrtable.terminal_index
+            unknown_terminal = lrtable.unknown_terminal
+            error_terminal = lrtable.error_terminal
+            action_base, action_check, action_value = lrtable.action_base, lrtable.action_check, lrtable.action_value
+            default_action = lrtable.default_action
+            goto_base, goto_check, goto_value = lrtable.goto_base, lrtable.goto_check, lrtable.goto_value
+            goto_default, production_lhs = lrtable.goto_default, lrtable.production_lhs
+        else:
+            lrtable = self._lrtable
+            actions = lrtable.lr_action                   # Local reference to action table (to avoid lookup on self.)
+            goto    = lrtable.lr_goto                     # Local reference to goto table (to avoid lookup on self.)
+        defaulted_states = lrtable.defaulted_states       # Local reference to defaulted states
         errorcount = 0                                    # Used during error recovery
 
         # Set up the state and symbol stacks
         self.tokens = tokens
         self.statestack = statestack = []                 # Stack of parsing states
         self.symstack = symstack = []                     # Stack of grammar symbols
-        pslice._stack = symstack                          # Associate the stack with the production
+        pslices = [ p.accessor(None, symstack, p.namemap) # Production objects passed to grammar rules
+                    for p in prod ]
         self.restart()
 
-        # Set up position tracking
+        # Set up position tracking.  Positions only live for the current parse
         track_positions = self.track_positions
-        if not hasattr(self, '_line_positions'):
-            self._line_positions = { }           # id: -> lineno
-            self._index_positions = { }          # id: -> (start, end)
+        positions = self._positions                       # id(value) -> (value, symbol)
 
         errtoken   = None                                 # Err token
         while True:
@@ -2101,10 +2661,23 @@ class Parser(metaclass=ParserMeta):
                     if not lookahead:
                         lookahead = YaccSymbol()
                         lookahead.type = '$end'
+                    if compact:
+                        terminal = terminal_index.get(lookahead.type, unknown_terminal)
                     
                 # Check the action table
-                ltype = lookahead.type
-                t = actions[self.state].get(ltype)
+                if compact:
+                    state = self.state
+                    i = action_base[state] + terminal
+                    if action_check[i] == state:
+                        t = action_value[i]
+                    elif terminal == error_terminal:
+                        t = None
+                    else:
+                        t = default_action[state]
+                    if t == ACTION_ERROR:
+                        t = None
+                else:
+                    t = actions[self.state].get(lookahead.type)
             else:
                 t = defaulted_states[self.state]
 
@@ -2127,7 +2700,32 @@ class Parser(metaclass=ParserMeta):
                     self.production = p = prod[-t]
                     pname = p.name
                     plen  = p.len
-                    pslice._namemap = p.namemap
+
+                    if p.passthrough:
+                        # A pass-through rule (A -> B) only relabels the symbol on top
+                        # of the stack.  Its value and positions are those of B.
+                        sym = symstack[-1]
+                        if sym.__class__ is not YaccSymbol:
+                            tok = sym
+                            sym = symstack[-1] = YaccSymbol()
+                            sym.value = tok.value
+                            if track_positions:
+                                sym.first = tok
+                                sym.index = tok.index
+                                sym.end = tok.end
+                                positions[id(sym.value)] = (sym.value, sym)
+                        sym.type = pname
+                        del statestack[-1]
+                        if compact:
+                            n = production_lhs[-t]
+                            i = goto_base[n] + statestack[-1]
+                            self.state = goto_value[i] if goto_check[i] == n else goto_default[n]
+                        else:
+                            self.state = goto[statestack[-1]][pname]
+                        statestack.append(self.state)
+                        continue
+
+                    pslice = pslices[-t]
 
                     # Call the production function
                     pslice._slice = symstack[-plen:] if plen else []
@@ -2143,23 +2741,30 @@ class Parser(metaclass=ParserMeta):
                     # Record positions
                     if track_positions:
                         if plen:
-                            sym.lineno = symstack[-plen].lineno
-                            sym.index = symstack[-plen].index
+                            # A symbol's first token, not a symbol, so that reading
+                            # its line number doesn't go down the whole tree
+                            first = symstack[-plen]
+                            sym.first = getattr(first, 'first', first)
+                            sym.index = first.index
                             sym.end = symstack[-1].end
                         else:
                             # A zero-length production  (what to put here?)
-                            sym.lineno = None
+                            sym.first = None
                             sym.index = None
                             sym.end = None
-                        self._line_positions[id(value)] = sym.lineno
-                        self._index_positions[id(value)] = (sym.index, sym.end)
+                        positions[id(value)] = (value, sym)
                             
                     if plen:
                         del symstack[-plen:]
                         del statestack[-plen:]
 
                     symstack.append(sym)
-                    self.state = goto[statestack[-1]][pname]
+                    if compact:
+                        n = production_lhs[-t]
+                        i = goto_base[n] + statestack[-1]
+                        self.state = goto_value[i] if goto_check[i] == n else goto_default[n]
+                    else:
+                        self.state = goto[statestack[-1]][pname]
                     statestack.append(self.state)
                     continue
 
@@ -2193,6 +2798,8 @@ class Parser(metaclass=ParserMeta):
                         # mode recovery on their own.  The
                         # returned token is the next lookahead
                         lookahead = tok
+                        if compact:
+                            terminal = terminal_index.get(tok.type, unknown_terminal)
                         self.errorok = True
                         continue
                     else:
@@ -2243,6 +2850,8 @@ class Parser(metaclass=ParserMeta):
                     t.value = lookahead
                     lookaheadstack.append(lookahead)
                     lookahead = t
+                    if compact:
+                        terminal = error_terminal
                 else:
                     sym = symstack.pop()
                     statestack.pop()
@@ -2252,10 +2861,61 @@ class Parser(metaclass=ParserMeta):
             # Call an error function here
             raise RuntimeError('sly: internal parser error!!!\n')
 
-    # Return position tracking information
+    def parse_subtree(self, tokens, states):
+        '''
+        Parse a single subtree of one of the subtree_symbols from tokens,
+        on top of the parser states of a Subtree recorded by an earlier
+        parse.  Returns the new Subtree, or None if the tokens don't start
+        with a subtree that fits there.  Syntax errors aren't reported and
+        grammar rules that use the symbols under the subtree aren't called.
+        '''
+        self._positions = { }
+        try:
+            return self._subtree_parse()(self, iter(tokens), states)
+        finally:
+            self._positions.clear()
+
+    # Return the parse function that records the subtrees of the subtree_symbols
+    def _subtree_parse(self):
+        if self.compact_tables:
+            raise YaccError('subtree_symbols needs the dictionary tables and can\'t be used with compact_tables')
+        return self._generated_parse(True, frozenset(self.subtree_symbols))
+
+    # Return the generated parse function of the class, compiling it on first use.
+    # There is one function with and one without position tracking, one for
+    # every set of recorded subtree symbols and one for a CompactLRTable.
+    @classmethod
+    def _generated_parse(cls, track_positions, subtree_symbols=frozenset(), compact_lrtable=None):
+        functions = vars(cls).get('_parse_functions')
+        if functions is None:
+            functions = cls._parse_functions = { }
+        key = (track_positions, subtree_symbols, compact_lrtable)
+        func = functions.get(key)
+        if func is None:
+            lrtable = cls._lrtable if compact_lrtable is None else compact_lrtable
+            func = functions[key] = compile_parse(cls._grammar, lrtable, track_positions,
+                                                  f'<{cls.__qualname__}.parse>', subtree_symbols)
+        return func
+
+    # Return position tracking information for a value.  While parse() runs, the
+    # symbol of every value that a rule returned is recorded, with the value
+    # so that its id() can't be reused by another object.  They are dropped when
+    # parse() returns, and then only the result, which is left on the parser
+    # stack, has positions.
     def line_position(self, value):
-        return self._line_positions[id(value)]
+        return self._position(value).lineno
 
     def index_position(self, value):
-        return self._index_positions[id(value)]
-    
+        sym = self._position(value)
+        return (sym.index, sym.end)
+
+    # The symbol (or token) of a value
+    def _position(self, value):
+        entry = getattr(self, '_positions', { }).get(id(value))
+        if entry is not None:
+            return entry[1]
+        if self.track_positions:
+            for sym in reversed(getattr(self, 'symstack', ())):
+                if hasattr(sym, 'value') and sym.value is value:
+                    return sym
+        raise KeyError(value)
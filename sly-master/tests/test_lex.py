@@ -92,6 +92,16 @@ def test_ignored():
     assert linenos == [4,5]
     assert lexer.lineno == 6
 
+# Runs of ignored characters are skipped, also at the end of the text
+def test_ignored_runs():
+    lexer = CalcLexer()
+    text = '\t\t  abc \t 123\n        x   '
+    toks = [ (t.type, t.value, t.index) for t in lexer.tokenize(text) ]
+    assert toks == [('ID', 'ABC', 4), ('NUMBER', 123, 10), ('ID', 'X', 22)]
+    toks = [ (t.type, t.value, t.index) for t in lexer.tokenize(text.encode()) ]
+    assert toks == [('ID', 'ABC', 4), ('NUMBER', 123, 10), ('ID', 'X', 22)]
+    assert list(lexer.tokenize('    ')) == []
+
 # Test error handling
 def test_error():
     lexer = CalcLexer()
@@ -206,3 +216,212 @@ def test_modern_error_return():
 
 
 
+
+# tokenize_all() stores the same tokens as tokenize() gives
+def test_tokenize_all():
+    text = 'abc 123 + - * / = < <= ( ) # comment\n x_1 <=< 2'
+    expected = [ (t.type, t.value, t.lineno, t.index, t.end) for t in CalcLexer().tokenize(text) ]
+    buffer = CalcLexer().tokenize_all(text)
+    assert len(buffer) == len(expected)
+    assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in buffer ] == expected
+    # Only the values changed by token functions are stored
+    assert buffer.values == { 0: 'ABC', 1: 123, 11: 'X_1', 14: 2 }
+    assert (buffer.type(12), buffer.value(12)) == ('LE', '<=')
+    assert buffer[-1].value == 2
+    assert [ t.type for t in buffer.tokens(12, 14) ] == ['LE', 'LT']
+
+# tokenize_buffered() fills the buffer as the tokens are generated
+def test_tokenize_buffered():
+    text = 'abc 123 + x_1'
+    buffer, tokens = CalcLexer().tokenize_buffered(text)
+    assert len(buffer) == 0
+    assert next(tokens).value == 'ABC'
+    assert [ t.value for t in buffer ] == ['ABC']
+    assert [ t.value for t in tokens ] == [123, '+', 'X_1']
+    assert [ t.value for t in buffer ] == [ t.value for t in CalcLexer().tokenize_all(text) ]
+
+class CommentLexer(Lexer):
+    tokens = { NAME }
+    ignore = ' \t'
+    NAME = r'[a-z]+'
+
+    @_(r'/\*')
+    def comment_start(self, t):
+        self.begin(CommentBodyLexer)
+
+    @_(r'\n+')
+    def ignore_newline(self, t):
+        self.lineno += t.value.count('\n')
+
+class CommentBodyLexer(Lexer):
+    tokens = { }
+
+    @_(r'\*/')
+    def comment_end(self, t):
+        self.begin(CommentLexer)
+
+    @_(r'[^*]+|\*')
+    def ignore_body(self, t):
+        self.lineno += t.value.count('\n')
+
+# relex() gives the same tokens as tokenizing the edited text, and only
+# tokenizes again around the edit
+def test_relex():
+    text = 'abc 123 + - * / = < <= ( ) # comment\n x_1 <=< 2\n' * 20
+    lexer = CalcLexer()
+    buffer = lexer.tokenize_all(text)
+    for offset, deleted, inserted in [ (500, 3, ''), (10, 0, 'xy\n'), (900, 1, '  #'), (40, 0, '7 8') ]:
+        changed = lexer.relex(buffer, offset, deleted, inserted)
+        assert len(changed) < 20
+        text = text[:offset] + inserted + text[offset + deleted:]
+        expected = CalcLexer().tokenize_all(text)
+        assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in buffer ] == \
+               [ (t.type, t.value, t.lineno, t.index, t.end) for t in expected ]
+        assert buffer.values == expected.values
+
+# Tokenizing again starts in the lexer state after the last kept token
+def test_relex_states():
+    text = 'a /* b\n c */ d\ne /* f */ g\n'
+    lexer = CommentLexer()
+    buffer = lexer.tokenize_all(text)
+    end = text.index('*/')
+    # The comment runs to the next */, then is closed again, then starts at the beginning
+    for offset, deleted, inserted, values in [ (end, 2, '', ['a', 'g']),
+                                               (end, 0, '*/', ['a', 'd', 'e', 'g']),
+                                               (0, 0, '/*', ['d', 'e', 'g']) ]:
+        lexer.relex(buffer, offset, deleted, inserted)
+        text = text[:offset] + inserted + text[offset + deleted:]
+        expected = CommentLexer().tokenize_all(text)
+        assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in buffer ] == \
+               [ (t.type, t.value, t.lineno, t.index, t.end) for t in expected ]
+        assert [ t.value for t in buffer ] == values
+    assert type(lexer) is CommentLexer
+
+# Bytes-like text gives the same tokens, with values decoded when they're read
+def test_tokenize_bytes():
+    import mmap
+    text = 'abc 123 + - * / = < <= ( ) # comment\n x_1 <=< 2 $ y\n\n'
+    expected = [ (t.type, t.value, t.lineno, t.index, t.end) for t in CalcLexer().tokenize(text) ]
+    lexer = CalcLexer()
+    tokens = list(lexer.tokenize(text.encode()))
+    assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in tokens ] == expected
+    # The value of an error is only the illegal character
+    assert lexer.errors == ['$']
+    buffer = CalcLexer().tokenize_all(text.encode())
+    assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in buffer ] == expected
+    assert buffer.values == CalcLexer().tokenize_all(text).values
+
+    data = mmap.mmap(-1, len(text))
+    data.write(text.encode())
+    tok = next(t for t in CalcLexer().tokenize(data) if t.type == 'LE')
+    assert tok.text is data
+    assert tok.value == '<='
+
+class SkippingLexer(CalcLexer):
+    tokens = CalcLexer.tokens
+
+    def error(self, t):
+        self.errors.append((t.value[0], t.index, t.end))
+        self.index = t.end
+
+# An illegal non-ASCII character in bytes is one error, whose value is the whole
+# character and whose end is after its UTF-8 sequence.  Bytes that aren't UTF-8
+# are an error each
+def test_tokenize_bytes_error():
+    text = 'a é b € c \U0001f600 d'
+    lexer = SkippingLexer()
+    tokens = [ t.value for t in lexer.tokenize(text.encode()) ]
+    assert tokens == [ t.value for t in SkippingLexer().tokenize(text) ] == ['A', 'B', 'C', 'D']
+    assert lexer.errors == [ ('é', 2, 4), ('€', 7, 10), ('\U0001f600', 13, 17) ]
+
+    lexer = SkippingLexer()
+    assert [ t.value for t in lexer.tokenize(b'a \xe9\xff b \xe2\x82') ] == ['A', 'B']
+    assert lexer.errors == [ ('\ufffd', 2, 3), ('\ufffd', 3, 4), ('\ufffd', 7, 8), ('\ufffd', 8, 9) ]
+
+class LazyLinesLexer(CalcLexer):
+    tokens = CalcLexer.tokens
+    lazy_lineno = True
+    ignore = ' \t\n'
+
+    def error(self, t):
+        self.errors.append((self.lineno, t.lineno))
+        self.index += 1
+
+# With lazy_lineno the line numbers are computed from the index when they're read
+def test_lazy_lineno():
+    text = 'abc 123 + # comment\n\n x_1 <=\n $ 2\n' * 5
+    def expect(text):
+        return [ (t.type, t.value, t.lineno, t.index, t.end) for t in CalcLexer().tokenize(text) ]
+    lexer = LazyLinesLexer()
+    tokens = list(lexer.tokenize(text))
+    assert tokens[-1].lines is lexer.lines
+    assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in tokens ] == expect(text)
+    assert lexer.errors == [ (n, n) for n in range(4, 21, 4) ]
+    assert [ t.lineno for t in LazyLinesLexer().tokenize(text.encode()) ] == [ t[2] for t in expect(text) ]
+
+    buffer = lexer.tokenize_all(text)
+    assert buffer.lineno is None
+    for offset, deleted, inserted in [ (50, 3, ''), (10, 0, 'xy\n\n'), (90, 1, '\n#'), (40, 0, '7 8') ]:
+        lexer.relex(buffer, offset, deleted, inserted)
+        text = text[:offset] + inserted + text[offset + deleted:]
+        assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in buffer ] == expect(text)
+        assert buffer.position(-1)[2] == expect(text)[-1][2]
+    # relex() updates the LineIndex of the buffer for the edit instead of making a new one
+    assert buffer.lines is lexer.lines
+
+# LineIndex.edit() gives the line numbers of a new LineIndex of the edited text
+def test_line_index_edit():
+    import random
+    from sly.lex import LineIndex
+    rand = random.Random(0)
+    for origin in [ (0, 1), (5, 3) ]:
+        text = 'ab\ncd\n\nefg\n' * 10
+        lines = LineIndex(text, *origin)
+        lines.line(0)
+        for _ in range(200):
+            offset = rand.randrange(len(text) + 1)
+            deleted = rand.randrange(min(6, len(text) - offset) + 1)
+            inserted = rand.choice([ '', 'x', '\n', 'y\n\nz', '\n\n\n' ])
+            text = text[:offset] + inserted + text[offset + deleted:]
+            lines.edit(text, offset, deleted, inserted)
+            expected = LineIndex(text, *origin)
+            assert [ lines.line(n) for n in range(origin[0], len(text) + 1) ] == \
+                   [ expected.line(n) for n in range(origin[0], len(text) + 1) ]
+
+# The DFA engine gives the same tokens as re
+def test_dfa_tokens():
+    from sly import dfa
+
+    class DFACalcLexer(CalcLexer):
+        tokens = CalcLexer.tokens
+        regex_module = dfa
+
+    assert 'ID' in DFACalcLexer._master_re.dfa_rules
+    text = 'abc 123 + - * / = < <= ( ) # comment\n x_1 <=< 2 $ y\n\n'
+    expected = [ (t.type, t.value, t.lineno, t.index, t.end) for t in CalcLexer().tokenize(text) ]
+    lexer = DFACalcLexer()
+    assert [ (t.type, t.value, t.lineno, t.index, t.end) for t in lexer.tokenize(text) ] == expected
+    assert lexer.errors == ['$ y\n\n']
+
+# Rules with lookahead are matched with re, and the DFA has no backtracking
+def test_dfa_fallback():
+    from sly import dfa
+
+    class FallbackLexer(Lexer):
+        tokens = { 'KEY', 'NAME', 'REPEAT' }
+        regex_module = dfa
+        literals = { ':' }
+        ignore = ' '
+        KEY = r'[a-z]+(?=:)'
+        REPEAT = r'(x|xx)*y'
+        NAME = r'[a-z]+'
+
+    assert FallbackLexer._master_re.re_rules == ['KEY']
+    toks = list(FallbackLexer().tokenize('ab: cd xxxy'))
+    assert [ (t.type, t.value) for t in toks ] == [('KEY', 'ab'), (':', ':'), ('NAME', 'cd'), ('REPEAT', 'xxxy')]
+    # re would take exponential time to fail here
+    assert dfa.compile(r'(x|xx)*y').match('x' * 100) is None
+    m = FallbackLexer._master_re.match('ab: cd', 4)
+    assert (m.lastgroup, m.group(), m.end()) == ('NAME', 'cd', 6)
+    m = FallbackLexer._master_re.match('ab: cd')
+    assert (m.lastgroup, m.group(), m.end()) == ('KEY', 'ab', 2)
@@ -118,6 +118,14 @@ def test_simple():
     result = parser.parse(lexer.tokenize('3 + 4 * (5 + 6)'))
     assert result == 47
 
+# The parser takes the TokenBuffer of tokenize_all()
+def test_parse_buffer():
+    parser = CalcParser()
+    buffer = CalcLexer().tokenize_all('a = 3 + 4 * (5 + 6)')
+    assert parser.parse(buffer) == None
+    assert parser.names['a'] == 47
+    assert parser.parse(buffer) == None
+
 def test_ebnf():
     lexer = CalcLexer()
     parser = CalcParser()
@@ -140,6 +148,253 @@ def test_parse_error():
     assert parser.errors[0].type == 'NUMBER'
     assert parser.errors[0].value == 123
 
+# Rebuilding the tables for an existing grammar gives the same tables
+def test_lrtable_rebuild():
+    from sly.yacc import LRTable
+    table = LRTable(CalcParser._grammar)
+    assert table.lr_action == CalcParser._lrtable.lr_action
+    assert table.lr_goto == CalcParser._lrtable.lr_goto
+    assert table.defaulted_states == CalcParser._lrtable.defaulted_states
+
+# Parsing with the compressed array tables gives the same results, with parse()
+# and with the generated parse function
+def test_compact_tables():
+    from sly.yacc import CompactLRTable
+    lexer = CalcLexer()
+    table = CompactLRTable(CalcParser._lrtable)
+    for generate in (False, True):
+        parser = CalcParser()
+        parser._compact_lrtable = table
+        parser.compact_tables = True
+        parser.generate_parse = generate
+
+        assert parser.parse(lexer.tokenize('3 + 4 * (5 + 6)')) == 47
+        result = parser.parse(lexer.tokenize('a(2+3, 4+5)'))
+        assert result == ('a', [5, 9])
+        assert parser.index_position(result) == (0, 11)
+        # With default reductions 'a' is reduced to an expr before the error is seen
+        result = parser.parse(lexer.tokenize('a 123 4 + 5'))
+        assert result == 9
+        assert parser.errors == [('undefined', 'a'), parser.errors[1]]
+        assert parser.errors[1].value == 123
+    assert 'ACTIONS[' not in CalcParser._generated_parse(True, compact_lrtable=table).source
+
+class CompactPassthroughParser(Parser):
+    tokens = CalcLexer.tokens
+    compact_tables = True
+    generate_parse = True
+
+    @_('expr PLUS term')
+    def expr(self, p):
+        return p.expr + p.term
+
+    @_('term', passthrough=True)
+    def expr(self, p):
+        raise AssertionError('pass-through rule called')
+
+    @_('NUMBER', passthrough=True)
+    def term(self, p):
+        raise AssertionError('pass-through rule called')
+
+    def error(self, token):
+        self.errors.append(token)
+
+# A class with compact tables can generate its parse function
+def test_compact_generated_parse():
+    lexer = CalcLexer()
+    parser = CompactPassthroughParser()
+    assert CompactPassthroughParser._lrtable is None
+    parser.errors = []
+    assert parser.parse(lexer.tokenize('1 + 2 + 3')) == 6
+    assert parser.index_position(6) == (0, 9)
+    # Error recovery drops the tokens up to the 3, like with the dictionary tables
+    assert parser.parse(lexer.tokenize('1 + + 3')) == 3
+    assert [token.type for token in parser.errors] == ['PLUS']
+
+class PassthroughParser(Parser):
+    tokens = CalcLexer.tokens
+
+    @_('expr PLUS term')
+    def expr(self, p):
+        return p.expr + p.term
+
+    @_('term', passthrough=True)
+    def expr(self, p):
+        raise AssertionError('pass-through rule called')
+
+    @_('NUMBER', passthrough=True)
+    def term(self, p):
+        raise AssertionError('pass-through rule called')
+
+# Pass-through rules are reduced without calling their functions
+def test_passthrough():
+    lexer = CalcLexer()
+    parser = PassthroughParser()
+    assert parser.parse(lexer.tokenize('1 + 2 + 3')) == 6
+    assert parser.index_position(6) == (0, 9)
+    assert parser.parse(lexer.tokenize('4')) == 4
+    assert parser.index_position(4) == (0, 1)
+
+# The generated parse function gives the same results as parse()
+def test_generated_parse():
+    lexer = CalcLexer()
+    parser = CalcParser()
+    parser.generate_parse = True
+    assert parser.parse(lexer.tokenize('3 + 4 * (5 + 6)')) == 47
+    result = parser.parse(lexer.tokenize('a(2+3, 4+5)'))
+    assert result == ('a', [5, 9])
+    assert parser.index_position(result) == (0, 11)
+
+    result = parser.parse(lexer.tokenize('a 123 4 + 5'))
+    assert result == 9
+    assert len(parser.errors) == 1
+    assert parser.errors[0].value == 123
+
+    parser = PassthroughParser()
+    parser.generate_parse = True
+    parser.track_positions = False
+    assert parser.parse(lexer.tokenize('1 + 2 + 3')) == 6
+    assert 'positions[' not in PassthroughParser._generated_parse(False).source
+
+# Without position tracking the results are the same, and no positions are kept
+def test_no_track_positions():
+    lexer = CalcLexer()
+    for generate in (False, True):
+        tracked = CalcParser()
+        untracked = CalcParser()
+        untracked.track_positions = False
+        tracked.generate_parse = untracked.generate_parse = generate
+        for text in ('3 + 4 * (5 + 6)', 'a(2+3, 4+5)', 'a 123 4 + 5', 'b = 2 * -3', '1 + b'):
+            assert untracked.parse(lexer.tokenize(text)) == tracked.parse(lexer.tokenize(text))
+        assert untracked.names == tracked.names
+        assert [getattr(e, 'value', e) for e in untracked.errors] == \
+               [getattr(e, 'value', e) for e in tracked.errors]
+
+        result = tracked.parse(lexer.tokenize('1 + 2'))
+        assert tracked.index_position(result) == (0, 5)
+        result = untracked.parse(lexer.tokenize('1 + 2'))
+        assert not hasattr(untracked.symstack[-1], 'lineno')
+        with pytest.raises(KeyError):
+            untracked.index_position(result)
+
+class TreeParser(Parser):
+    tokens = CalcLexer.tokens
+
+    @_('expr')
+    def statement(self, p):
+        # The values inside the tree were reduced earlier, and aren't on the stack
+        self.seen = []
+        node = p.expr
+        while isinstance(node, tuple):
+            self.seen.append((node[2], self.index_position(node[2])))
+            node = node[1]
+        self.seen.append((node, self.index_position(node)))
+        return p.expr
+
+    @_('expr PLUS term')
+    def expr(self, p):
+        return ('+', p.expr, p.term)
+
+    @_('term')
+    def expr(self, p):
+        return p.term
+
+    @_('NUMBER')
+    def term(self, p):
+        return [p.NUMBER]
+
+# While parse() runs, the positions of all of the values of the parse can be looked
+# up.  When it returns, they are dropped and only the result has positions
+def test_positions_of_one_parse():
+    lexer = CalcLexer()
+    for generate in (False, True):
+        parser = TreeParser()
+        parser.generate_parse = generate
+        result = parser.parse(lexer.tokenize('1 + 22 + 333'))
+        assert [position for _, position in parser.seen] == [(9, 12), (4, 6), (0, 1)]
+        assert parser.index_position(result) == (0, 12)
+        assert parser.line_position(result) == 1
+        assert parser._positions == { }
+        with pytest.raises(KeyError):
+            parser.index_position(parser.seen[0][0])
+
+class LazyLinesLexer(CalcLexer):
+    tokens = CalcLexer.tokens
+    lazy_lineno = True
+
+# Tracking positions doesn't read the line numbers of the tokens, which a lexer
+# with lazy_lineno finds in the text.  A line number is found when it's asked for
+def test_lazy_line_positions():
+    for generate in (False, True):
+        lexer = LazyLinesLexer()
+        parser = TreeParser()
+        parser.generate_parse = generate
+        result = parser.parse(lexer.tokenize('\n\n1 +\n 22 + 333'))
+        assert lexer.lines._starts is None
+        assert parser.line_position(result) == 3
+        assert parser.index_position(result) == (2, 15)
+
+class SumParser(Parser):
+    tokens = CalcLexer.tokens
+    subtree_symbols = ('term',)
+
+    @_('sum PLUS term')
+    def sum(self, p):
+        return p.sum + p.term
+
+    @_('term', passthrough=True)
+    def sum(self, p):
+        raise AssertionError('pass-through rule called')
+
+    @_('term TIMES factor')
+    def term(self, p):
+        return p.term * p.factor
+
+    @_('factor', passthrough=True)
+    def term(self, p):
+        raise AssertionError('pass-through rule called')
+
+    @_('NUMBER')
+    def factor(self, p):
+        return p.NUMBER
+
+# Subtrees of the subtree_symbols are recorded and can be parsed again after an edit
+def test_parse_subtree():
+    lexer = CalcLexer()
+    parser = SumParser()
+    buffer = lexer.tokenize_all('2 * 3 + 4 + 5 * 6')
+    assert parser.parse(buffer) == 40
+    assert [(s.value, s.index, s.end) for s in parser.subtrees] == \
+        [(2, 0, 1), (6, 0, 5), (4, 8, 9), (5, 12, 13), (30, 12, 17)]
+    states = parser.subtrees[2].states
+
+    # Replace the 4 with 7 * 2 and parse its term again, up to the PLUS after it
+    lexer.relex(buffer, 8, 1, '7 * 2')
+    assert buffer.find(8) == 4
+    subtree = parser.parse_subtree(buffer.tokens(4), states)
+    assert (subtree.type, subtree.value, subtree.index, subtree.end) == ('term', 14, 8, 13)
+    assert buffer.find(subtree.end) == 7 and buffer.type(7) == 'PLUS'
+    assert [s.value for s in parser.subtrees] == [7, 14]
+    assert parser.parse_subtree(buffer.tokens(7), states) is None
+    assert parser.parse(buffer) == 50
+
+# Symbol names are properties of a YaccProduction class made for each production
+def test_production_accessor():
+    from sly.yacc import YaccProduction, YaccSymbol
+    prod = next(p for p in CalcParser._grammar.Productions if p.prod == ('expr', 'PLUS', 'expr'))
+    assert issubclass(prod.accessor, YaccProduction)
+    assert 'expr0' in vars(prod.accessor)
+    symbols = [YaccSymbol(), YaccSymbol(), YaccSymbol()]
+    for n, sym in enumerate(symbols):
+        sym.value = n
+    p = prod.accessor(symbols, None, prod.namemap)
+    assert (p.expr0, p.PLUS, p.expr1, p[2]) == (0, 1, 2, 2)
+    try:
+        p.expr
+        assert False
+    except AttributeError as e:
+        assert 'expr0' in str(e)
+
 # TO DO:  Add tests
 # - error productions
 # - embedded actions
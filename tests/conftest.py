@@ -0,0 +1,13 @@
+""" pytest setup for the tests of the compiler and the QUAD runtime.
+    The tests run against the sly copy under 'sly-master' and the compiler under 'cpq-code', like the
+    benchmarks, so we put both of them on the path here
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (os.path.join(ROOT, "cpq-code"), os.path.join(ROOT, "sly-master", "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
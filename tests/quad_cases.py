@@ -0,0 +1,167 @@
+""" The QUAD programs that the tests of the QUAD machines run, and helpers to run them.
+    Every machine is checked against QuadMachine: it runs the same programs with the same input, and
+    its output, its error and the number of instructions that ran should be the same
+"""
+
+import io
+import os
+import random
+import re
+
+from compiler import Compiler
+from quad import QuadError, load_quad
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+# small QUAD programs for the corner cases of the machines, as (name, QUAD code, input)
+QUAD_PROGRAMS = [
+    ("empty", "", ""),
+    ("halt", "HALT\n", ""),
+    ("jump to the end", "JUMP L1\nL1:\nHALT\n", ""),
+    ("int division by zero", "IINP a\nIDIV b 7 a\nIPRT b\n", "0"),
+    ("float division by zero", "RINP x\nRDIV y 1.5 x\nRPRT y\n", "0"),
+    (
+        "truncation",
+        "RTOI a -7.9\nIPRT a\nRTOI b 7.9\nIPRT b\nIDIV c -7 2\nIPRT c\nIDIV d 7 -2\nIPRT d\n"
+        "ITOR x -3\nRPRT x\nRDIV y 7.0 2.0\nRPRT y\nRINP z\nRTOI e z\nIPRT e\n",
+        "-0.5",
+    ),
+    ("input ended", "IINP a\nIPRT a\nIINP b\nIPRT b\n", "5"),
+    ("float input into an int", "IINP a\nIPRT a\n", "2.5"),
+    ("int input into a float", "RINP x\nRPRT x\n", "3"),
+    ("infinity to an int", "RMLT x 1e300 1e300\nRPRT x\nRTOI a x\nIPRT a\n", ""),
+    ("loop", "IASN i 0\nL1:\nILSS t i 5\nJMPZ L2 t\nIPRT i\nIADD i i 1\nJUMP L1\nL2:\nHALT\n", ""),
+    (
+        "jmpz on a number",
+        "IASN a 0\nL1:\nIADD a a 1\nJMPZ L2 1\nIEQL t a 100\nJMPZ L1 t\nL2:\nIPRT a\nHALT\n",
+        "",
+    ),
+    (
+        "error in a loop",
+        "IASN i 5\nL1:\nIDIV q 100 i\nIPRT q\nISUB i i 1\nJUMP L1\n",
+        "",
+    ),
+]
+
+# QUAD programs with ints that don't fit in 64 bits, which only the machines with python's ints run
+LARGE_INT_PROGRAMS = [
+    ("large int", "IASN a 99999999999999999999\nIMLT a a a\nIPRT a\n", ""),
+    ("large int to a float", "IASN a 10\n" + "IMLT a a a\n" * 9 + "ITOR x a\n", ""),
+]
+
+# the sample cpl programs of this folder, with their input
+SAMPLE_PROGRAMS = [
+    ("test1.ou", "3 4"),
+    ("test1.ou", "5 7.5"),
+    ("test2.ou", "1.5 2 " + " ".join(str(n) for n in range(200))),
+]
+
+INT_VARIABLES, FLOAT_VARIABLES = ["i", "j", "k"], ["x", "y"]
+
+
+# returns a random cpl expression of kind 'int' or 'float'
+def random_expression(rnd, depth: int, kind: str):
+    if depth == 0 or rnd.random() < 0.3:
+        if kind == "int" or rnd.random() < 0.3:
+            return rnd.choice(INT_VARIABLES + [str(rnd.randint(0, 9))])
+        return rnd.choice(FLOAT_VARIABLES + [f"{rnd.randint(0, 9)}.{rnd.randint(0, 9)}"])
+    if rnd.random() < 0.15:
+        if kind == "int":
+            return f"static_cast<int>({random_expression(rnd, depth - 1, 'float')})"
+        return f"static_cast<float>({random_expression(rnd, depth - 1, 'int')})"
+    op = rnd.choice("+-*/")
+    right = random_expression(rnd, depth - 1, kind)
+    if op == "*":
+        # small factors, so that the ints stay in 64 bits
+        right = str(rnd.randint(0, 3))
+    elif op == "/" and rnd.random() < 0.9:
+        right = str(rnd.randint(1, 9))
+    return f"({random_expression(rnd, depth - 1, kind)} {op} {right})"
+
+
+# returns a random cpl condition
+def random_condition(rnd, depth: int):
+    kind = rnd.choice(["int", "float"])
+    relop = rnd.choice(["<", ">", "<=", ">=", "==", "!="])
+    condition = f"{random_expression(rnd, 1, kind)} {relop} {random_expression(rnd, 1, kind)}"
+    r = rnd.random()
+    if depth and r < 0.2:
+        return f"{condition} && {random_condition(rnd, depth - 1)}"
+    if depth and r < 0.4:
+        return f"{condition} || {random_condition(rnd, depth - 1)}"
+    return f"!({condition})" if r < 0.5 else condition
+
+
+# returns random cpl statements, with bounded loops
+def random_statements(rnd, depth: int, count: int):
+    statements = []
+    for _ in range(count):
+        r = rnd.random()
+        if r < 0.4:
+            variable = rnd.choice(INT_VARIABLES + FLOAT_VARIABLES)
+            kind = "int" if variable in INT_VARIABLES else "float"
+            statements.append(f"{variable} = {random_expression(rnd, 2, kind)};")
+        elif r < 0.5:
+            statements.append(f"output({random_expression(rnd, 2, rnd.choice(['int', 'float']))});")
+        elif r < 0.6:
+            statements.append(f"input({rnd.choice(INT_VARIABLES + FLOAT_VARIABLES)});")
+        elif r < 0.75 and depth:
+            body = " ".join(random_statements(rnd, depth - 1, 2))
+            other = " ".join(random_statements(rnd, depth - 1, 2))
+            statements.append(f"if ({random_condition(rnd, 1)}) {{ {body} }} else {{ {other} }}")
+        elif depth:
+            counter = f"w{rnd.randint(0, 10**6)}"
+            body = " ".join(random_statements(rnd, depth - 1, 3))
+            statements.append(
+                f"{counter} = 0; while ({counter} < {rnd.randint(0, 8)}) {{ {counter} = {counter} + 1; {body} }}"
+            )
+    return statements
+
+
+# returns a random cpl program and an input for it
+def random_program(seed: int):
+    rnd = random.Random(seed)
+    body = "\n".join(random_statements(rnd, 3, rnd.randint(3, 10)))
+    counters = "".join(f", {counter}" for counter in sorted(set(re.findall(r"w\d+", body))))
+    text = f"i, j, k{counters}: int;\nx, y: float;\n{{\n{body}\n}}\n"
+    numbers = [rnd.randint(-5, 9) if rnd.random() < 0.97 else rnd.randint(-5, 9) + 0.5 for _ in range(40)]
+    return text, " ".join(map(str, numbers[: rnd.randint(0, 40)]))
+
+
+# returns the QUAD program of a cpl program
+def compile_cpl(text: str):
+    code = Compiler().compile(text)
+    assert code is not None, "the cpl program has errors"
+    return load_quad(code)
+
+
+# returns the programs that the machines are tested with, as (name, QuadProgram, input). with 'large_ints'
+# it also has the programs with ints that don't fit in 64 bits
+def program_cases(large_ints: bool = True, random_programs: int = 40):
+    cases = [(name, load_quad(code), stdin) for name, code, stdin in QUAD_PROGRAMS]
+    if large_ints:
+        cases += [(name, load_quad(code), stdin) for name, code, stdin in LARGE_INT_PROGRAMS]
+    for filename, stdin in SAMPLE_PROGRAMS:
+        with open(os.path.join(TESTS, filename), "r") as file:
+            cases.append((f"{filename} < {stdin[:10]}", compile_cpl(file.read()), stdin))
+    for seed in range(random_programs):
+        text, stdin = random_program(seed)
+        cases.append((f"random {seed}", compile_cpl(text), stdin))
+    return cases
+
+
+# runs a machine that writes to an io.StringIO, and returns its output and the message of its error or None
+def finish(machine):
+    try:
+        machine.run()
+        error = None
+    except QuadError as e:
+        error = str(e)
+    return machine.stdout.getvalue(), error
+
+
+# runs a program with a machine of 'machine_class', and returns its output, the message of its error
+# or None, and the number of instructions that ran
+def run_machine(machine_class, program, stdin: str, **options):
+    machine = machine_class(program, io.StringIO(stdin), io.StringIO(), **options)
+    return (*finish(machine), machine.steps)
@@ -0,0 +1,41 @@
+import subprocess
+
+import pytest
+
+from c_backend import c_compiler, compile_c, generate_c
+from cpq import run_c_backend
+from quad import QuadError, QuadMachine, load_quad
+from quad_cases import program_cases, run_machine
+from utils import C_GENERATION_ERROR
+
+# the C programs' ints are 64 bit, so they don't run the programs with larger ints
+CASES = program_cases(large_ints=False, random_programs=10)
+
+needs_c_compiler = pytest.mark.skipif(c_compiler() is None, reason="no C compiler")
+
+
+# The executable gives the same output as QuadMachine, and prints the same error to stderr
+@needs_c_compiler
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+def test_c_backend(name, program, stdin, tmp_path):
+    c_filename, executable = tmp_path / "program.c", tmp_path / "program"
+    c_filename.write_text(generate_c(program, "program.qud"))
+    assert compile_c(str(c_filename), str(executable)) is None
+    result = subprocess.run([str(executable)], input=stdin, capture_output=True, text=True)
+    output, error, _ = run_machine(QuadMachine, program, stdin)
+    assert result.stdout == output
+    assert result.stderr == ("" if error is None else f"Error in QUAD program program.qud, {error}\n")
+    assert result.returncode == (0 if error is None else 1)
+
+
+# An int number that doesn't fit in 64 bits can't be translated, and cpq reports it without a C file
+def test_large_int_number(tmp_path, capsys):
+    code = "IASN a 99999999999999999999\nIPRT a\n"
+    with pytest.raises(QuadError) as e:
+        generate_c(load_quad(code), "big.qud")
+    assert str(e.value) == "the number 99999999999999999999 is too large for 64 bits"
+
+    filename = tmp_path / "big.ou"
+    run_c_backend(str(filename), code, native=True)
+    assert capsys.readouterr().err == f"{C_GENERATION_ERROR}\n{e.value}\n"
+    assert not (tmp_path / "big.c").exists()
@@ -0,0 +1,101 @@
+import pytest
+
+from cpq_lexer import CpqLexer
+from symbol_table import SymbolTable
+
+TEXT = "a = 1;\n/* b = 2;\nc = 3;\n" + "".join(f"x{n} = {n};\n" for n in range(50)) + "d = 4;\n"
+
+
+# returns the type, value, index and line of each token of a TokenBuffer
+def token_list(buffer):
+    return [(tok.type, tok.value, tok.index, tok.lineno) for tok in buffer]
+
+
+# relex gives the tokens of the edited text when an unterminated comment is closed, opened or removed
+# far from the edit. relex starts at the line of the edit, so it's right only because an unterminated
+# comment runs to the end of the text: a closing */ that's inserted later is then inside its token. if
+# the comment was lexed as ordinary tokens, the tokens of "b = 2; c = 3; ..." before the edit would
+# have to change too, and relex wouldn't lex them again
+def test_relex_unterminated_comment(capsys):
+    lexer = CpqLexer(SymbolTable())
+    buffer = lexer.tokenize_all(TEXT)
+    # the comment isn't a token, and nothing after it is lexed
+    assert [tok.value for tok in buffer] == ["a", "=", "1", ";"]
+    text = TEXT
+    edits = [
+        (text.index("d = 4;"), 0, "*/ "),  # closes the comment, 50 lines after it started
+        (text.index("x3 = 3;"), 0, "/* "),  # a comment inside the comment
+        (text.index("/* b"), 2, ""),  # removes the first /*, so the */ is illegal
+        (text.index("x3 = 3;"), 3, ""),
+    ]
+    for offset, deleted, inserted in edits:
+        lexer.relex(buffer, offset, deleted, inserted)
+        text = text[:offset] + inserted + text[offset + deleted :]
+        assert buffer.text == text
+        assert token_list(buffer) == token_list(CpqLexer(SymbolTable()).tokenize_all(text))
+    capsys.readouterr()
+
+
+# returns the types and values of the tokens of a text
+def lex(text: str):
+    return [(tok.type, tok.value) for tok in CpqLexer(SymbolTable()).tokenize(text)]
+
+
+# A name that starts with a keyword is a single ID, and the keywords themselves are still keywords
+@pytest.mark.parametrize("name", ["iffy", "integer", "whilex", "elsewhere", "inputs", "floats", "breaks", "if1"])
+def test_keyword_prefix(name):
+    assert lex(name) == [("ID", name)]
+    assert lex(f"{name} = 1;") == [("ID", name), ("ASSIGN", "="), ("NUM", "1"), ("SEMICOLON", ";")]
+
+
+@pytest.mark.parametrize(
+    "keyword, token_type",
+    [
+        ("if", "IF"),
+        ("int", "INT"),
+        ("while", "WHILE"),
+        ("else", "ELSE"),
+        ("float", "FLOAT"),
+        ("input", "INPUT"),
+        ("output", "OUTPUT"),
+        ("switch", "SWITCH"),
+        ("case", "CASE"),
+        ("default", "DEFAULT"),
+        ("break", "BREAK"),
+    ],
+)
+def test_keywords(keyword, token_type):
+    assert lex(keyword) == [(token_type, keyword)]
+    assert lex(f"{keyword}(") == [(token_type, keyword), ("LPAREN", "(")]
+
+
+# Keywords aren't names, so they aren't added to the symbol table
+def test_keywords_in_symbol_table():
+    symbol_table = SymbolTable()
+    list(CpqLexer(symbol_table).tokenize("while (iffy < integer) if"))
+    assert sorted(symbol_table.table) == ["iffy", "integer"]
+
+
+# An illegal non-ASCII character is one error, also when the text is lexed as bytes
+@pytest.mark.parametrize("encode", [False, True])
+def test_illegal_non_ascii_character(encode, capsys):
+    text = "x = é 1;\ny = 2;"
+    lexer = CpqLexer(SymbolTable())
+    tokens = [tok.value for tok in lexer.tokenize(text.encode() if encode else text)]
+    assert tokens == ["x", "=", "1", ";", "y", "=", "2", ";"]
+    assert lexer.errors_detected
+    assert capsys.readouterr().err == "Error in lexical analysis on line 1: Illegal character 'é'\n"
+
+
+# An unterminated comment or string at the end of the text is a single error. lexing stops there, so the
+# illegal characters inside it aren't reported, also when the text is lexed as bytes
+@pytest.mark.parametrize("opening", ["/*", '"'])
+@pytest.mark.parametrize("encode", [False, True])
+def test_unterminated_comment_at_end(opening, encode, capsys):
+    text = f"x = 1;\n{opening} y = @ 2;\n$ é \\"
+    lexer = CpqLexer(SymbolTable())
+    tokens = [tok.value for tok in lexer.tokenize(text.encode() if encode else text)]
+    assert tokens == ["x", "=", "1", ";"]
+    assert lexer.errors_detected
+    assert lexer.index == len(text.encode() if encode else text)
+    assert capsys.readouterr().err == "Error in lexical analysis on line 2: Unterminated comment\n"
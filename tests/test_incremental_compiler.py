@@ -0,0 +1,119 @@
+import contextlib
+import io
+import os
+import re
+
+import pytest
+
+from compiler import Compiler
+from incremental_compiler import IncrementalCompiler
+from utils import PARSING_ERROR_MSG, error_print
+
+HERE = os.path.dirname(__file__)
+
+
+# returns the text of a program in the tests directory
+def program(name: str):
+    with open(os.path.join(HERE, name), "r") as file:
+        return file.read()
+
+
+PROGRAMS = {
+    "test1": program("test1.ou"),
+    "test2": program("test2.ou"),
+    # the semantic error comes out before the lexical error on the next line
+    "errors in order": "a: int;\n{\n    b = 1;\n    a = @;\n    c = 2.5;\n}\n",
+    # the lexer counted the braces of the whole text before the parser got to the error at '}', so the
+    # error was reported again
+    "error before a brace": "a: int;\n{\nb = 1; if (a < 1) }\n}\n",
+    "unterminated comment": "a: int;\n{\n    a = 1;\n    /* a = 2;\n}\n",
+    "no end": "a: int;\n{\n    a = 1;\n",
+}
+
+
+# returns what a compile function returns and everything that it prints, in order. like run_on_file, a
+# runtime error while parsing is reported with PARSING_ERROR_MSG
+def run(function, *args):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            code = function(*args)
+        except Exception:
+            error_print(PARSING_ERROR_MSG)
+            code = None
+    return code, out.getvalue()
+
+
+# returns QUAD code with its temporary variables and labels renumbered in the order they first appear.
+# edit() numbers the new ones after those of the code that it reuses. the names of the program's
+# variables, which may look like temporary variables, are left as they are
+def canonical(code, text: str):
+    if code is None:
+        return None
+    variables = set(re.findall(r"[a-zA-Z][a-zA-Z0-9]*", text))
+    names = {}
+
+    def rename(match):
+        name = match.group(0)
+        if name in variables:
+            return name
+        if name not in names:
+            kind = match.group(1)
+            names[name] = f"{kind}{sum(new.startswith(kind) for new in names.values())}"
+        return names[name]
+
+    return re.sub(r"\b(L|ti|tf)[0-9]+\b", rename, code)
+
+
+# compile() gives the code and the error messages of Compiler.compile, with the lexer's messages in between
+# the parser's
+@pytest.mark.parametrize("text", PROGRAMS.values(), ids=PROGRAMS.keys())
+def test_compile(text):
+    assert run(IncrementalCompiler().compile, text) == run(Compiler().compile, text)
+
+
+# edit() gives the code and the error messages that Compiler.compile gives for the edited text, when it parses
+# only the edited stmts again and when it compiles the whole program again
+def test_edit():
+    text = PROGRAMS["test2"]
+    compiler = IncrementalCompiler()
+    compiler.compile(text)
+    edits = [
+        ("output(3);", 10, "output(4);"),  # a stmt is replaced
+        ("    b = 5", 0, "    c = 1;\n"),  # a stmt is added
+        ("a = b / 2;", 10, "a = b / 2; output(c);"),
+        ("c = c + 1;", 10, "c = 2.5;"),  # a semantic error
+        ("c = 2.5;", 8, "c = 3;"),
+        ("output(7.6);", 0, "output(@);\n    "),  # a lexical error
+        ("output(@);", 10, "d = 1; output(@);"),  # a semantic error before it
+        ("d = 1; output(@);", 17, "output(1);"),
+        ("a = 7;", 6, "a = ;"),  # a syntax error
+        ("a = ;", 5, "a = 7;"),
+        ("c: int;", 7, "c: float;"),  # the declarations
+        ("input(a);", 9, "/* input(a);"),  # an unterminated comment
+        ("/* input(a);", 3, ""),
+        ("\n}", 2, ""),  # the end of the block
+        ("\n    }\n", 7, "\n    }\n\n}"),
+    ]
+    for before, deleted, inserted in edits:
+        offset = text.index(before)
+        text = text[:offset] + inserted + text[offset + deleted :]
+        code, messages = run(compiler.edit, offset, deleted, inserted)
+        expected_code, expected_messages = run(Compiler().compile, text)
+        assert messages == expected_messages, inserted
+        assert canonical(code, text) == canonical(expected_code, text), inserted
+
+
+# without errors or a source map the line numbers of the tokens aren't read, so the lexer never finds the lines
+# of the text, which an edit would then have to update
+def test_edit_without_lines():
+    text = PROGRAMS["test2"]
+    compiler = IncrementalCompiler()
+    compiler.compile(text)
+    offset = text.index("output(3);")
+    assert compiler.edit(offset, 10, "output(4);") is not None
+    assert compiler.buffer.lines._starts is None
+    # a semantic error reads the line number of its stmt
+    with contextlib.redirect_stderr(io.StringIO()):
+        assert compiler.edit(offset, 10, "d = 4;") is None
+    assert compiler.buffer.lines._starts is not None
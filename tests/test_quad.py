@@ -0,0 +1,288 @@
+import io
+
+import pytest
+
+from quad import (
+    BYTECODE_HEADER,
+    HALT,
+    IASN,
+    NumberSink,
+    NumberSource,
+    QuadError,
+    QuadInput,
+    QuadMachine,
+    QuadOutput,
+    ThreadedQuadMachine,
+    dump_bytecode,
+    dump_bytecode_file,
+    load_bytecode,
+    load_quad,
+    load_quad_file,
+)
+from quad_cases import compile_cpl, program_cases, run_machine
+
+CASES = program_cases()
+
+
+# Loading decodes the instructions, with a slot for every variable and number
+def test_load_quad():
+    program = load_quad("IASN a 5\nL1:\nIADD a a 5\nRASN x 2.5\nJUMP L1\n")
+    assert program.code[0] == (IASN, program.variables["a"], program.numbers[("i", "5")], 0)
+    assert program.labels == {"L1": 1}
+    assert program.code[3][1] == 1
+    assert program.code[-1] == (HALT, 0, 0, 0)
+    assert program.lines == [1, 3, 4, 5, 5]
+    assert program.memory == [0, 5, 0.0, 2.5]
+
+
+@pytest.mark.parametrize(
+    "code, message",
+    [
+        ("IADD a b\n", "line 1: IADD takes 3 operands"),
+        ("IASN a 1\nFOO a\n", "line 2: unknown instruction FOO"),
+        ("JUMP L2\n", "line 1: the label L2 isn't defined"),
+        ("L1:\nL1:\n", "line 2: the label L1 is defined twice"),
+        ("IASN a 1\nRASN a 1.5\n", "line 2: the variable a is used as an int and as a float"),
+        ("IASN 5 a\n", "line 1: can't set the number 5"),
+        ("IASN a 1.5\n", "line 1: 1.5 isn't an int number"),
+    ],
+)
+def test_load_errors(code, message):
+    with pytest.raises(QuadError) as e:
+        load_quad(code)
+    assert str(e.value) == message
+
+
+# An empty program only runs the HALT at its end
+def test_empty_program():
+    assert run_machine(QuadMachine, load_quad(""), "") == ("", None, 1)
+    assert run_machine(QuadMachine, compile_cpl("{ }"), "") == ("", None, 1)
+
+
+def test_division_by_zero():
+    program = load_quad("IINP a\nIDIV b 7 a\nIPRT b\n")
+    assert run_machine(QuadMachine, program, "2") == ("3\n", None, 4)
+    assert run_machine(QuadMachine, program, "0") == ("", "line 2: division by zero", 2)
+    program = load_quad("RINP x\nRDIV y 1.5 x\nRPRT y\n")
+    assert run_machine(QuadMachine, program, "0.0") == ("", "line 2: division by zero", 2)
+
+
+# Int division and float to int conversions truncate toward zero, like in C
+def test_truncation():
+    name, program, stdin = next(case for case in CASES if case[0] == "truncation")
+    assert run_machine(QuadMachine, program, stdin) == ("-7\n7\n-3\n-3\n-3.0\n3.5\n0\n", None, 16)
+
+
+def test_runtime_errors():
+    expected = {
+        "input ended": ("5\n", "line 3: the input ended", 3),
+        "float input into an int": ("", "line 1: '2.5' in the input isn't a number of the right type", 1),
+        "int input into a float": ("3.0\n", None, 3),
+        "infinity to an int": ("inf\n", "line 3: can't convert inf to an int", 3),
+        "large int to a float": ("", "line 11: the int is too large to convert to a float", 11),
+        "error in a loop": ("20\n25\n33\n50\n100\n", "line 3: division by zero", 22),
+    }
+    for name, program, stdin in CASES:
+        if name in expected:
+            assert run_machine(QuadMachine, program, stdin) == expected[name], name
+
+
+# The steps of a loop are counted when it jumps
+def test_steps():
+    name, program, stdin = next(case for case in CASES if case[0] == "loop")
+    assert run_machine(QuadMachine, program, stdin) == ("0\n1\n2\n3\n4\n", None, 29)
+
+
+def test_sample_programs():
+    outputs = {
+        "test1.ou < 3 4": ("-1.0\n3.0\n", None, 17),
+        "test1.ou < 5 7.5": ("7.5\n", None, 11),
+    }
+    for name, program, stdin in CASES:
+        if name in outputs:
+            assert run_machine(QuadMachine, program, stdin) == outputs[name], name
+
+
+# The machine ends with the values of the variables in its memory
+def test_memory():
+    machine = QuadMachine(compile_cpl("a: int; b: float; { a = 7 / 2; b = a * 1.5; }"))
+    machine.run()
+    assert machine.value("a") == 3
+    assert machine.value("b") == 4.5
+
+
+# The threaded machine gives the same outputs, errors and steps as QuadMachine
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+def test_threaded_machine(name, program, stdin):
+    assert run_machine(ThreadedQuadMachine, program, stdin) == run_machine(QuadMachine, program, stdin)
+
+
+# The bytecode gives back the same program, which runs like the program that was dumped
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+def test_bytecode(name, program, stdin):
+    loaded = load_bytecode(dump_bytecode(program))
+    for field in ("code", "lines", "names", "variables", "numbers", "labels"):
+        assert getattr(loaded, field) == getattr(program, field), field
+    assert repr(loaded.memory) == repr(program.memory)
+    assert run_machine(QuadMachine, loaded, stdin) == run_machine(QuadMachine, program, stdin)
+
+
+# A .qbc file is loaded as bytecode, from the mapped file
+def test_bytecode_file(tmp_path):
+    name, program, stdin = next(case for case in CASES if case[0] == "loop")
+    filename = str(tmp_path / "loop.qbc")
+    dump_bytecode_file(program, filename)
+    assert run_machine(QuadMachine, load_quad_file(filename), stdin) == ("0\n1\n2\n3\n4\n", None, 29)
+
+
+@pytest.mark.parametrize(
+    "change, message",
+    [
+        (lambda data: data[:10], "the bytecode is truncated"),
+        (lambda data: data[:-1], "the bytecode is truncated"),
+        (lambda data: data + b"\0", "the bytecode is truncated"),
+        (lambda data: b"QUAD" + data[4:], "the file isn't QUAD bytecode of version 1"),
+        (lambda data: data[:4] + b"\2" + data[5:], "the file isn't QUAD bytecode of version 1"),
+    ],
+)
+def test_bytecode_errors(change, message):
+    name, program, stdin = next(case for case in CASES if case[0] == "loop")
+    with pytest.raises(QuadError) as e:
+        load_bytecode(change(dump_bytecode(program)))
+    assert str(e.value) == message
+
+
+# The instructions of the bytecode are checked before it runs
+def test_bytecode_instructions():
+    data = dump_bytecode(load_quad(""))
+    with pytest.raises(QuadError) as e:
+        load_bytecode(data[:BYTECODE_HEADER.size] + bytes([HALT + 1]) + data[BYTECODE_HEADER.size + 1 :])
+    assert str(e.value) == "the bytecode has an instruction that isn't valid"
+    with pytest.raises(QuadError) as e:
+        load_bytecode(data[:BYTECODE_HEADER.size] + bytes([IASN]) + data[BYTECODE_HEADER.size + 1 :])
+    assert str(e.value) == "the bytecode doesn't end with HALT"
+
+
+def test_empty_bytecode_file(tmp_path):
+    filename = tmp_path / "empty.qbc"
+    filename.write_bytes(b"")
+    with pytest.raises(QuadError) as e:
+        load_quad_file(str(filename))
+    assert str(e.value) == "the bytecode is truncated"
+
+
+# a sink that keeps each text that was written to it, and counts its flushes
+class RecordingSink:
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+
+    def write(self, text: str):
+        self.writes.append(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+# The words that a chunk cuts are completed by the next chunk, and a chunk size of 0 reads lines
+@pytest.mark.parametrize("chunk_size", [0, 1, 2, 3, 5, 100])
+def test_input_chunks(chunk_size):
+    reads = []
+    quad_input = QuadInput(io.StringIO("12 345\n\n-6.5  7"), chunk_size, lambda: reads.append(1))
+    numbers = [quad_input.read_number(int), quad_input.read_number(int)]
+    numbers += [quad_input.read_number(float), quad_input.read_number(float)]
+    assert numbers == [12, 345, -6.5, 7.0]
+    with pytest.raises(QuadError) as e:
+        quad_input.read_number(int)
+    assert str(e.value) == "the input ended"
+    assert len(reads) >= 2
+
+
+def test_output_buffer():
+    sink = RecordingSink()
+    output = QuadOutput(sink, 0)
+    output.write("1\n")
+    output.write("2\n")
+    assert (sink.writes, sink.flushes) == (["1\n", "2\n"], 2)
+
+    sink = RecordingSink()
+    output = QuadOutput(sink, 2)
+    for line in ["1\n", "2\n", "3\n"]:
+        output.write(line)
+    assert sink.writes == ["1\n2\n"]
+    output.flush()
+    output.flush()
+    assert (sink.writes, sink.flushes) == (["1\n2\n", "3\n"], 2)
+
+    sink = RecordingSink()
+    output = QuadOutput(sink, None)
+    for n in range(10000):
+        output.write(f"{n}\n")
+    assert sink.writes == []
+    output.flush()
+    assert sink.writes == ["".join(f"{n}\n" for n in range(10000))]
+
+
+# The output that a machine keeps is written when it halts and when it fails
+@pytest.mark.parametrize("machine_class", [QuadMachine, ThreadedQuadMachine])
+def test_flush_on_end(machine_class):
+    for code, output in [("IPRT 1\nIPRT 2\n", "1\n2\n"), ("IPRT 1\nIDIV a 1 0\n", "1\n")]:
+        sink = RecordingSink()
+        machine = machine_class(load_quad(code), io.StringIO(), sink, buffer_size=None)
+        try:
+            machine.run()
+        except QuadError:
+            pass
+        assert sink.writes == [output]
+
+
+# With flush_on_input the output is written before the input is read, so whoever writes the input has
+# seen the output before it
+@pytest.mark.parametrize("machine_class", [QuadMachine, ThreadedQuadMachine])
+@pytest.mark.parametrize("flush_on_input", [True, False])
+def test_flush_on_input(machine_class, flush_on_input):
+    sink = RecordingSink()
+
+    class Source(io.StringIO):
+        def readline(self):
+            seen.append("".join(sink.writes))
+            return super().readline()
+
+    seen = []
+    program = load_quad("IPRT 1\nIINP a\nIPRT a\nIINP b\nIPRT b\n")
+    machine = machine_class(program, Source("2\n3\n"), sink, chunk_size=0, flush_on_input=flush_on_input)
+    machine.run()
+    assert "".join(sink.writes) == "1\n2\n3\n"
+    assert seen == (["1\n", "1\n2\n"] if flush_on_input else ["", ""])
+
+
+# The numbers of a NumberSource are read lazily, and a NumberSink keeps the numbers that were written
+def test_number_source_and_sink():
+    name, program, stdin = next(case for case in CASES if case[0] == "test1.ou < 3 4")
+    sink = NumberSink()
+    QuadMachine(program, NumberSource([3, 4]), sink).run()
+    assert sink.numbers == [-1.0, 3.0]
+    assert all(type(number) is float for number in sink.numbers)
+
+    def numbers():
+        n = 0
+        while True:
+            yield n
+            n += 1
+
+    source = NumberSource(numbers())
+    assert source.read(64) == "0\n1\n2\n3\n"
+    assert source.readline() == "4\n"
+    sink = NumberSink()
+    sink.write("-3\n2.5\ninf\n")
+    assert sink.numbers == [-3, 2.5, float("inf")]
+
+
+# The sizes of the input chunks and of the output buffer don't change what the machines do
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+@pytest.mark.parametrize("machine_class", [QuadMachine, ThreadedQuadMachine])
+def test_io_options(name, program, stdin, machine_class):
+    result = run_machine(QuadMachine, program, stdin)
+    for chunk_size, buffer_size in [(0, 0), (1, 1), (3, None), (7, 2)]:
+        options = {"chunk_size": chunk_size, "buffer_size": buffer_size, "flush_on_input": True}
+        assert run_machine(machine_class, program, stdin, **options) == result, options
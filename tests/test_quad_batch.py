@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from compiler import Compiler
+from quad import QuadMachine, load_quad
+from quad_batch import OVERFLOW_MESSAGE, BatchQuadMachine
+from quad_cases import program_cases, run_machine
+
+# the batch machine's ints are 64 bit, so it doesn't run the programs with larger ints
+CASES = program_cases(large_ints=False)
+
+
+# returns the records of the lanes of a case: its input, the input backwards, half of it and no input
+def lane_records(stdin: str):
+    numbers = [float(word) if "." in word else int(word) for word in stdin.split()]
+    return [numbers, numbers[::-1], numbers[: len(numbers) // 2], []]
+
+
+# Each lane gives the same output, error and steps as QuadMachine with the lane's input. A lane whose
+# int overflowed 64 bits stops with an error, after the output that it had until then
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+def test_batch_machine(name, program, stdin):
+    records = lane_records(stdin)
+    width = max(len(record) for record in records)
+    kind = np.float64 if any(isinstance(number, float) for number in records[0]) else np.int64
+    inputs = np.array([record + [0] * (width - len(record)) for record in records], dtype=kind).reshape(4, width)
+    machine = BatchQuadMachine(program, inputs, [len(record) for record in records])
+    machine.run()
+    for lane, record in enumerate(records):
+        output, error, steps = run_machine(QuadMachine, program, " ".join(map(str, record)))
+        lane_error = str(machine.errors[lane]) if lane in machine.errors else None
+        if lane_error is not None and lane_error.endswith(OVERFLOW_MESSAGE):
+            assert output.startswith(machine.output(lane))
+            continue
+        assert (machine.output(lane), lane_error, int(machine.steps[lane])) == (output, error, steps)
+
+
+# Programs without any slots only run their jumps and their HALT
+@pytest.mark.parametrize(
+    "code", ["", "HALT\n", "JUMP L1\nL1:\nHALT\n", Compiler().compile("{ }")], ids=["empty", "halt", "jump", "cpl"]
+)
+def test_program_without_slots(code):
+    program = load_quad(code)
+    machine = BatchQuadMachine(program, np.zeros((2, 1), dtype=int))
+    machine.run()
+    steps = run_machine(QuadMachine, program, "")[2]
+    assert machine.steps.tolist() == [steps, steps]
+    assert machine.errors == {}
+    assert machine.lane_outputs() == [[], []]
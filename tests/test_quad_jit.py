@@ -0,0 +1,29 @@
+import io
+
+import pytest
+
+import quad_jit
+from quad import QuadMachine, load_quad
+from quad_cases import QUAD_PROGRAMS, program_cases, run_machine
+from quad_jit import TracingQuadMachine
+
+CASES = program_cases()
+
+
+# The tracing machine gives the same outputs, errors and steps as QuadMachine. With a threshold of 1 the
+# loops of the small programs are traced too, and their traces run from the second iteration
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+@pytest.mark.parametrize("threshold", [quad_jit.TRACE_THRESHOLD, 1])
+def test_tracing_machine(name, program, stdin, threshold, monkeypatch):
+    monkeypatch.setattr(quad_jit, "TRACE_THRESHOLD", threshold)
+    assert run_machine(TracingQuadMachine, program, stdin) == run_machine(QuadMachine, program, stdin)
+
+
+# A JMPZ on a number is guarded by the number, which has no local in the trace
+def test_jmpz_on_a_number():
+    code = next(code for name, code, stdin in QUAD_PROGRAMS if name == "jmpz on a number")
+    machine = TracingQuadMachine(load_quad(code), io.StringIO(), io.StringIO())
+    machine.run()
+    assert machine.stdout.getvalue() == "100\n"
+    assert list(machine.traces) == [1]
+    assert "if not 1:" in machine.traces[1].source
@@ -0,0 +1,62 @@
+import io
+import itertools
+import os
+
+import pytest
+
+from compiler import Compiler
+from quad import QuadMachine, load_quad
+from quad_cases import TESTS, finish, program_cases, run_machine
+from quad_profiler import ProfilingQuadMachine, load_source_map
+
+CASES = program_cases()
+
+
+# returns a clock for the profiler that moves a microsecond each time it's read
+def fake_clock():
+    return itertools.count(0, 1000).__next__
+
+
+# The profiling machine gives the same outputs, errors and steps as QuadMachine, and its profile counts
+# each instruction that ran, also when the program failed
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+def test_profiling_machine(name, program, stdin):
+    machine = ProfilingQuadMachine(program, io.StringIO(stdin), io.StringIO(), clock=fake_clock())
+    output, error, steps = run_machine(QuadMachine, program, stdin)
+    assert (*finish(machine), machine.steps) == (output, error, steps)
+    profile = machine.profile
+    assert sum(profile.instruction_counts()) == machine.steps
+    assert profile.report().startswith(f"{machine.steps} instructions in {sum(profile.counts)} blocks")
+    stacks = profile.collapsed_stacks().splitlines()
+    assert len(stacks) == sum(1 for count in profile.counts if count)
+    assert all(stack.startswith("program;") for stack in stacks)
+
+
+# The loop is found by its jump back, with an iteration for each time it jumped back
+def test_loops():
+    name, program, stdin = next(case for case in CASES if case[0] == "loop")
+    machine = ProfilingQuadMachine(program, io.StringIO(), io.StringIO(), clock=fake_clock())
+    machine.run()
+    [loop] = machine.profile.loops()
+    assert (loop.iterations, loop.entries) == (5, 1)
+    assert "hot loops:" in machine.profile.report()
+    assert machine.profile.collapsed_stacks() == (
+        "program;block 1-1 1\nprogram;loop 3-7;block 3-4 6\nprogram;loop 3-7;block 5-7 5\nprogram;block 9-9 1\n"
+    )
+
+
+# The report has the hot cpl lines of a program with a source map, which cpq writes next to the program
+def test_source_map(tmp_path):
+    with open(os.path.join(TESTS, "test1.ou"), "r") as file:
+        code, source_map = Compiler().compile_with_source_map(file.read())
+    machine = ProfilingQuadMachine(load_quad(code), io.StringIO("3 4"), io.StringIO(), clock=fake_clock())
+    machine.run()
+    machine.profile.source_map = source_map
+    report = machine.profile.report()
+    assert "hot cpl lines:" in report
+    assert "(cpl 6-8)" in report
+
+    (tmp_path / "test1.qud").write_text(code)
+    assert load_source_map(str(tmp_path / "test1.qud")) is None
+    (tmp_path / "test1.map").write_text("".join(f"{line}\n" for line in source_map))
+    assert load_source_map(str(tmp_path / "test1.qud")) == source_map
@@ -0,0 +1,41 @@
+import io
+import os
+
+import pytest
+
+from quad import QuadMachine
+from quad_cases import finish, program_cases, run_machine
+from quad_transpiler import TranspiledQuad, TranspiledQuadMachine, load_transpiled_file, transpile
+
+CASES = program_cases()
+
+
+# The transpiled function gives the same outputs and errors as QuadMachine, with structured code and
+# with the dispatch loop, and ends with the same values of the variables that it has
+@pytest.mark.parametrize("name, program, stdin", CASES, ids=[case[0] for case in CASES])
+@pytest.mark.parametrize("structured", [True, False])
+def test_transpiled_machine(name, program, stdin, structured):
+    machine = QuadMachine(program, io.StringIO(stdin), io.StringIO())
+    output, error = finish(machine)
+    transpiled = transpile(program, structured)
+    transpiled_machine = TranspiledQuadMachine(transpiled, io.StringIO(stdin), io.StringIO())
+    assert finish(transpiled_machine) == (output, error)
+    if error is None:
+        for variable in transpiled.names:
+            assert repr(transpiled_machine.value(variable)) == repr(machine.value(variable)), variable
+
+
+# The transpiled code is marshalled, and cached next to the program file
+def test_transpiled_cache(tmp_path):
+    name, program, stdin = next(case for case in CASES if case[0] == "loop")
+    loaded = TranspiledQuad.loads(transpile(program).dumps())
+    assert run_machine(TranspiledQuadMachine, loaded, stdin)[:2] == ("0\n1\n2\n3\n4\n", None)
+
+    filename = tmp_path / "test1.ou"
+    with open(os.path.join(os.path.dirname(__file__), "test1.ou"), "r") as file:
+        filename.write_text(file.read())
+    first = load_transpiled_file(str(filename))
+    assert os.listdir(tmp_path / "__pycache__")
+    second = load_transpiled_file(str(filename))
+    assert first.source is not None and second.source is None
+    assert run_machine(TranspiledQuadMachine, second, "3 4")[:2] == ("-1.0\n3.0\n", None)